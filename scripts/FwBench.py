@@ -0,0 +1,1518 @@
+""" Benchmarks for the code generator scripts.
+This script builds synthetic json models in the format created by the
+FW Profile Editor and measures the time taken by the functions which
+process them.
+
+The benchmark script is called as follows:
+
+> python FwBench.py [--sizes N,...] [--shapes S,...] [--report File] [BenchmarkName ...]
+
+If no benchmark name is given, all benchmarks are run. The options
+override the configuration parameters of the benchmark suite ('suite'), 
+which writes its results in json format to the report file so that they
+can be compared across releases.
+"""
+
+__author__ = 'Alessandro Pasetti, P&P software GmbH'
+
+import gc
+import copy
+import argparse
+import os
+import json
+import math
+import sys
+import time
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import tracemalloc
+
+import FwGenCode
+import FwGenSmCode
+import FwGenBatch
+import FwDesc
+import FwPrSim
+import FwPrTrace
+import FwPrWcet
+from FwDesc import get_pr_desc, load_model, StateGrid
+import Utilities
+from Utilities import MemorySink, stripTimestamp
+
+""" Width and height of the action nodes in synthetic models """
+node_size = (100, 50)
+""" Seed of the random generator used to build synthetic models """
+rnd_seed = 1
+""" Shapes of the synthetic models of the benchmark suite (see make_suite_model) """
+suite_shapes = ('chain', 'fan', 'diamonds', 'nested', 'notes')
+""" Approximate number of nodes of the synthetic models of the benchmark suite """
+suite_sizes = (10, 100, 1000, 10000, 100000)
+""" Maximum number of timed runs of each phase in the benchmark suite (the
+    shortest is reported; a phase is not re-run after one second) """
+suite_repeat = 3
+""" Name of the json file holding the report of the benchmark suite """
+suite_report_name = 'FwBenchSuite.json'
+""" Number of nodes of the chain without guards of benchmark 'deep' """
+deep_size = 50000
+""" Maximum time in seconds allowed for generating the code of the chain
+    of benchmark 'deep' """
+deep_budget = 5.0
+""" Number of descriptions in the corpus of benchmark 'wrap' and fraction 
+    of them which repeat an earlier description """
+wrap_corpus_size = 5000
+wrap_repeat_ratio = 0.3
+""" Words from which the descriptions of benchmark 'wrap' are built """
+wrap_vocabulary = ('the', 'a', 'of', 'to', 'is', 'if', 'and', 'when', 'node', 'procedure',
+                   'guard', 'action', 'command', 'telecommand', 'telemetry', 'packet', 
+                   'service', 'parameter', 'monitoring', 'limit', 'check', 'counter',
+                   'exceeds', 'threshold', 'reported', 'event', 'OBC', 'FDIR', 'mode',
+                   'transition', 'SAFE', 'NOMINAL', 'executed', 'acknowledge', '(PUS-5)',
+                   'success;', 'failure,', 'sequence', 'timeout', 'cycles.', 'reset')
+
+def make_state(item_id, item_type, x, y, name=None, desc=''):
+    """ Return a json state item as created by the editor """
+    width, height = node_size
+    if item_type in ('init', 'final'):
+        width, height = 30, 30
+    elif item_type == 'choice':
+        width, height = 24, 24
+    fwprop = {'type': item_type, 'note': ''}
+    if name is not None:
+        fwprop['identifier'] = name
+    if item_type == 'state':
+        fwprop['entryDesc'] = desc
+    if item_type == 'note':
+        fwprop['note'] = desc
+    if item_type == 'notedot':
+        width, height = 4, 4
+    return {'id': item_id,
+            'attrs': {'x': x, 'y': y, 'width': width, 'height': height,
+                      'fill': '#fff', 'stroke': '#666', 'stroke-width': 1},
+            'fwprop': fwprop,
+            'selected': False}
+
+
+def make_connection(from_id, to_id, order=1, guard_desc=''):
+    """ Return a json connection item as created by the editor """
+    return {'attrs': {'fill': 'none', 'stroke': '#000', 'path': []},
+            'fwprop': {'order': order, 'guardDesc': guard_desc},
+            'stateFromID': from_id,
+            'stateToID': to_id,
+            'selected': False}
+
+
+def make_model(pr_name, states, connections):
+    """ Return a json procedure model holding the argument states and connections """
+    return {'editorVersion': '5.29',
+            'states': states,
+            'connections': connections,
+            'globals': {'fwprop': {'smName': pr_name, 'editorType': 'Pr'}}}
+
+
+def make_sm_model(sm_name, states, connections):
+    """ Return a json state machine model holding the argument states and 
+        connections (see make_model)
+    """
+    json_obj = make_model(sm_name, states, connections)
+    json_obj['globals']['fwprop']['editorType'] = 'Sm'
+    return json_obj
+
+
+def make_grid_model(n_states, n_notedots):
+    """ Return a procedure model with n_states action nodes laid out on a
+        square grid and n_notedots notedots scattered over the diagram.
+        About half of the notedots fall inside an action node.
+    """
+    rnd = random.Random(rnd_seed)
+    width, height = node_size
+    n_cols = max(int(n_states**0.5), 1)
+    states = [make_state(0, 'init', 0, 0)]
+    for i in range(n_states):
+        x = (i % n_cols)*2*width
+        y = (i // n_cols)*2*height
+        states.append(make_state(i+1, 'state', x, y, 'N'+str(i), 'Action '+str(i)))
+    n_rows = (n_states + n_cols - 1)//n_cols
+    for i in range(n_notedots):
+        x = rnd.uniform(0, n_cols*2*width)
+        y = rnd.uniform(0, n_rows*2*height)
+        states.append(make_state(n_states+1+i, 'notedot', x, y))
+    return make_model('Grid', states, [])
+
+
+def make_chain_model(n_nodes, note_every=10, guard_every=2):
+    """ Return a procedure model with a linear chain of n_nodes action nodes
+        between the initial and final node. One connection in guard_every 
+        carries a guard (none if guard_every is 0). One node in note_every 
+        has a note attached to it.
+    """
+    width, height = node_size
+    n_cols = max(int(n_nodes**0.5), 1)
+    states = [make_state(1, 'init', -2*width, 0)]
+    connections = []
+    prev_id = 1
+    next_id = 2
+    for i in range(n_nodes):
+        x = (i % n_cols)*2*width
+        y = (i // n_cols)*2*height
+        node_id = next_id
+        states.append(make_state(node_id, 'state', x, y, 'N'+str(i), 'Action '+str(i)))
+        is_guarded = guard_every > 0 and i % guard_every == guard_every-1
+        guard_desc = 'Guard '+str(i) if is_guarded else ''
+        connections.append(make_connection(prev_id, node_id, 1, guard_desc))
+        next_id += 1
+        if note_every > 0 and i % note_every == 0:
+            note_id, dot_id = next_id, next_id+1
+            states.append(make_state(note_id, 'note', x, y+height, None, 'Note '+str(i)))
+            states.append(make_state(dot_id, 'notedot', x+width/2, y+height/2))
+            connections.append(make_connection(note_id, dot_id))
+            next_id += 2
+        prev_id = node_id
+    states.append(make_state(next_id, 'final', -2*width, 2*height))
+    connections.append(make_connection(prev_id, next_id))
+    return make_model('Chain', states, connections)
+
+
+def make_diamond_model(n_diamonds):
+    """ Return a procedure model made of a chain of n_diamonds diamonds.
+        Each diamond is a decision node with two branches (a guarded one
+        and an else one) leading to two action nodes which re-converge on 
+        the decision node of the next diamond. 
+    """
+    width, height = node_size
+    states = [make_state(1, 'init', 0, 0)]
+    connections = []
+    prev_id = 1
+    next_id = 2
+    for i in range(n_diamonds):
+        y = (i+1)*4*height
+        dec_id, left_id, right_id = next_id, next_id+1, next_id+2
+        states.append(make_state(dec_id, 'choice', width, y, 'Decision'+str(i)))
+        states.append(make_state(left_id, 'state', 0, y+2*height, 'L'+str(i), 'Left '+str(i)))
+        states.append(make_state(right_id, 'state', 2*width, y+2*height, 'R'+str(i), 'Right '+str(i)))
+        connections.append(make_connection(prev_id, dec_id))
+        if prev_id != 1:
+            connections.append(make_connection(prev_id+1, dec_id))
+        connections.append(make_connection(dec_id, left_id, 1, 'Flag '+str(i)))
+        connections.append(make_connection(dec_id, right_id, 2, 'Else'))
+        prev_id = left_id
+        next_id += 3
+    states.append(make_state(next_id, 'final', width, (n_diamonds+1)*4*height))
+    connections.append(make_connection(prev_id, next_id))
+    if prev_id != 1:
+        connections.append(make_connection(prev_id+1, next_id))
+    return make_model('Diamonds', states, connections)
+
+
+def make_fan_model(n_branches):
+    """ Return a procedure model made of a decision node with n_branches 
+        out-going connections (the last one with the else guard) leading
+        to n_branches action nodes which all lead to the final node.
+    """
+    width, height = node_size
+    states = [make_state(1, 'init', n_branches*width, 0),
+              make_state(2, 'choice', n_branches*width, 2*height, 'Decision'),
+              make_state(3, 'final', n_branches*width, 6*height)]
+    connections = [make_connection(1, 2)]
+    for i in range(n_branches):
+        node_id = 4+i
+        states.append(make_state(node_id, 'state', i*2*width, 4*height, 'N'+str(i), 'Action '+str(i)))
+        guard_desc = 'Flag '+str(i) if i < n_branches-1 else 'Else'
+        connections.append(make_connection(2, node_id, i+1, guard_desc))
+        connections.append(make_connection(node_id, 3))
+    return make_model('Fan', states, connections)
+
+
+def make_nested_diamond_model(depth):
+    """ Return a procedure model made of diamonds nested to the argument depth.
+        A diamond of depth d is a decision node with two branches, each
+        holding a diamond of depth d-1, which re-converge on a join action
+        node. A diamond of depth 0 is an action node. The model holds about
+        3*2**depth nodes.
+    """
+    width, height = node_size
+    states = [make_state(1, 'init', 0, 0)]
+    connections = []
+    ids = [2]
+
+    def new_state(item_type, prefix, desc=''):
+        """ Add a state to the model and return its identifier """
+        item_id = ids[0]
+        ids[0] += 1
+        x = (item_id % 256)*2*width
+        y = (item_id // 256)*2*height
+        states.append(make_state(item_id, item_type, x, y, prefix+str(item_id), desc))
+        return item_id
+
+    def add_diamond(d, from_id, order=1, guard_desc=''):
+        """ Add a diamond of depth d after node from_id (the connection from
+            node from_id has the argument order and guard) and return the 
+            identifier of the last node of the diamond
+        """
+        if d == 0:
+            node_id = new_state('state', 'N', 'Action')
+            connections.append(make_connection(from_id, node_id, order, guard_desc))
+            return node_id
+        dec_id = new_state('choice', 'Decision')
+        connections.append(make_connection(from_id, dec_id, order, guard_desc))
+        left_id = add_diamond(d-1, dec_id, 1, 'Flag '+str(dec_id))
+        right_id = add_diamond(d-1, dec_id, 2, 'Else')
+        join_id = new_state('state', 'J', 'Join')
+        connections.append(make_connection(left_id, join_id))
+        connections.append(make_connection(right_id, join_id))
+        return join_id
+
+    last_id = add_diamond(depth, 1)
+    final_id = new_state('final', 'Final')
+    connections.append(make_connection(last_id, final_id))
+    return make_model('Nested', states, connections)
+
+
+def make_decision_model(guard_descs):
+    """ Return a procedure model made of a decision node with one out-going
+        connection per argument guard description (an empty description
+        is a connection without guard) leading to action nodes which all
+        lead to the final node
+    """
+    width, height = node_size
+    states = [make_state(1, 'init', 0, 0),
+              make_state(2, 'choice', 0, 2*height, 'Decision'),
+              make_state(3, 'final', 0, 6*height)]
+    connections = [make_connection(1, 2)]
+    for i, guard_desc in enumerate(guard_descs):
+        states.append(make_state(4+i, 'state', i*2*width, 4*height, 'N'+str(i), 'Action '+str(i)))
+        connections.append(make_connection(2, 4+i, i+1, guard_desc))
+        connections.append(make_connection(4+i, 3))
+    return make_model('Decision', states, connections)
+
+
+def attach_notedots_linear(pr_desc, notedots):
+    """ Reference implementation of the attachment of notedots to states
+        through a linear scan of all states (used to measure the speedup).
+    """
+    states_by_notedot_id = {}
+    for notedot in notedots:
+        x, y = notedot['attrs']['x'], notedot['attrs']['y']
+        for key, state in pr_desc['states'].items():
+            if (x > state.x and x < state.x + state.width and
+                y > state.y and y < state.y + state.height):
+                states_by_notedot_id[notedot['id']] = state
+    return states_by_notedot_id
+
+
+def timed(fnc, *args):
+    """ Call fnc with the argument args and return its duration in seconds
+        and its return value. As in the timeit module, the garbage collector
+        is disabled while fnc runs.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = fnc(*args)
+        return time.perf_counter() - start, result
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def bench_notedots():
+    """ Compare the notedot attachment in get_pr_desc with a linear scan """
+    json_obj = make_grid_model(10000, 5000)
+    notedots = [s for s in json_obj['states'] if s['fwprop']['type'] == 'notedot']
+    t_desc, pr_desc = timed(get_pr_desc, json_obj)
+    t_linear, expected = timed(attach_notedots_linear, pr_desc, notedots)
+    grid = StateGrid(pr_desc['states'].values())
+    for notedot in notedots:
+        state = grid.find(notedot['attrs']['x'], notedot['attrs']['y'])
+        assert(state is expected.get(notedot['id']))
+    print('notedots: 10000 states, 5000 notedots')
+    print('    get_pr_desc (indexed):  %8.3f s' % t_desc)
+    print('    linear scan only:       %8.3f s' % t_linear)
+
+
+def bench_scaling():
+    """ Check that get_pr_desc scales linearly with the number of connections.
+        The model size is doubled from 2500 to 20000 connections and the 
+        time is measured (best of at least 7 runs lasting at least 1 s in
+        total) for each size. The exponent k of the time n**k for n 
+        connections is fitted (least squares in log-log scale) over the 
+        whole series: it is about 1 for a linear cost (slightly above, due
+        to cache effects) and 2 for a quadratic cost, and it must be below
+        1.5.
+    """
+    print('scaling: get_pr_desc on linear chains')
+    points = []
+    for n_nodes in (2500, 5000, 10000, 20000):
+        json_obj = make_chain_model(n_nodes)
+        n_conn = len(json_obj['connections'])
+        durations = [timed(get_pr_desc, json_obj)[0]]
+        while len(durations) < 7 or sum(durations) < 1.0:
+            durations.append(timed(get_pr_desc, json_obj)[0])
+        t_desc = min(durations)
+        points.append((math.log(n_conn), math.log(t_desc)))
+        print('    %6d connections: %8.3f s (%6.2f us per connection)' % 
+              (n_conn, t_desc, 1e6*t_desc/n_conn))
+    mean_x = sum(x for x, y in points)/len(points)
+    mean_y = sum(y for x, y in points)/len(points)
+    exponent = sum((x-mean_x)*(y-mean_y) for x, y in points) / \
+               sum((x-mean_x)**2 for x, y in points)
+    print('    fitted exponent: %.2f' % exponent)
+    assert(exponent < 1.5), 'get_pr_desc does not scale linearly'
+
+
+def bench_diamonds():
+    """ Compare the inlined and the shared generation of the procedure body
+        on chains of diamonds (the inlined body grows exponentially)
+    """
+    print('diamonds: pr_create_body on chains of diamonds')
+    share_nodes = FwGenCode.share_nodes
+    try:
+        with tempfile.TemporaryDirectory() as dir_path:
+            file_name = os.path.join(dir_path, 'FwPrDiamonds.c')
+            for n_diamonds in (2, 4, 6, 8, 10, 1000):
+                pr_desc = get_pr_desc(make_diamond_model(n_diamonds))
+                for mode in (False, True):
+                    if not mode and n_diamonds > 10:
+                        continue
+                    FwGenCode.share_nodes = mode
+                    t_body = timed(FwGenCode.pr_create_body, pr_desc, dir_path)[0]
+                    print('    %4d diamonds, %-7s: %8.3f s, %10d bytes' % 
+                          (n_diamonds, 'shared' if mode else 'inlined',
+                           t_body, os.path.getsize(file_name)))
+    finally:
+        FwGenCode.share_nodes = share_nodes
+
+
+def measure(fnc, *args):
+    """ Call fnc with the argument args and return its duration in seconds
+        and the peak of the memory allocated while it runs in bytes
+    """
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        fnc(*args)
+        duration = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return duration, peak
+
+
+class ConcatEmitter(Utilities.Emitter):
+    """ Emitter which accumulates the generated code in one string through
+        's +=' as the generator did before Utilities.Emitter was introduced
+        (baseline of bench_emit)
+    """
+    def __init__(self, ind='    '):
+        Utilities.Emitter.__init__(self, ind)
+        self.s = ''
+
+    def write(self, text):
+        self.s += text
+
+    def line(self, text, end='\n'):
+        self.s += self.prefixes[self.level] + text + end
+
+    def endswith(self, text):
+        return self.s.endswith(text)
+
+    def getvalue(self):
+        return self.s
+
+    def getparts(self):
+        return [self.s]
+
+
+def bench_emit():
+    """ Measure time and peak memory of the pr_create_* functions when the
+        code is built through Utilities.Emitter and when it is built by 
+        string concatenation (see ConcatEmitter) and check that both give
+        the same code
+    """
+    print('emit: pr_create_* functions (time, peak memory: Emitter / string concatenation)')
+    share_nodes = FwGenCode.share_nodes
+    models = (('chain 20000', make_chain_model(20000), False),
+              ('diamonds 9', make_diamond_model(9), False),
+              ('diamonds 5000', make_diamond_model(5000), True))
+    try:
+        for model_name, json_obj, mode in models:
+            FwGenCode.share_nodes = mode
+            pr_desc = get_pr_desc(json_obj)
+            # Build the symbol table before measuring (it is cached and would 
+            # otherwise be counted only for the first emitter)
+            FwGenCode.get_pr_symbols(pr_desc)
+            for fnc in (FwGenCode.pr_create_header, FwGenCode.pr_create_user_header,
+                        FwGenCode.pr_create_body):
+                results = []
+                for emitter in (Utilities.Emitter, ConcatEmitter):
+                    sink = MemorySink()
+                    FwGenCode.Emitter = emitter
+                    try:
+                        results.append(measure(fnc, pr_desc, sink) + (sink.files,))
+                    finally:
+                        FwGenCode.Emitter = Utilities.Emitter
+                assert([stripTimestamp(text) for text in results[0][2].values()] ==
+                       [stripTimestamp(text) for text in results[1][2].values()])
+                print('    %-14s %-22s: %8.3f s, %6.1f MB / %8.3f s, %6.1f MB' % 
+                      (model_name, fnc.__name__, results[0][0], results[0][1]/1e6, 
+                       results[1][0], results[1][1]/1e6))
+    finally:
+        FwGenCode.share_nodes = share_nodes
+
+
+def bench_load():
+    """ Compare time and peak memory of json.load and of load_model (with
+        and without the ijson module) on a large model file. The durations
+        are the best of 3 runs without tracemalloc, which slows down the 
+        event-based parser of ijson much more than json.load. The ijson path trades 
+        time for memory: it is about 2.6 times slower than json.load and
+        its peak memory is about half of that of json.load.
+    """
+    def json_load(json_file_name):
+        with open(json_file_name) as fd:
+            return json.load(fd)
+    ijson = FwDesc.ijson
+    print('load: loading a 50000-node model (time, peak memory)')
+    try:
+        with tempfile.TemporaryDirectory() as dir_path:
+            json_file_name = os.path.join(dir_path, 'Chain.json')
+            with open(json_file_name, 'w') as fd:
+                json.dump(make_chain_model(50000), fd, indent=5)
+            print('    file size:              %8.1f MB' % (os.path.getsize(json_file_name)/1e6))
+            t_json = min(timed(json_load, json_file_name)[0] for i in range(3))
+            peak = measure(json_load, json_file_name)[1]
+            print('    json.load:              %8.3f s, %8.1f MB' % (t_json, peak/1e6))
+            if ijson is not None:
+                duration = min(timed(load_model, json_file_name)[0] for i in range(3))
+                peak = measure(load_model, json_file_name)[1]
+                print('    load_model (ijson):     %8.3f s, %8.1f MB (%.1f times slower than json.load)' % 
+                      (duration, peak/1e6, duration/t_json))
+            FwDesc.ijson = None
+            duration = min(timed(load_model, json_file_name)[0] for i in range(3))
+            peak = measure(load_model, json_file_name)[1]
+            print('    load_model (json):      %8.3f s, %8.1f MB' % (duration, peak/1e6))
+    finally:
+        FwDesc.ijson = ijson
+
+
+def make_suite_model(shape, n_nodes):
+    """ Return a synthetic procedure model of the argument shape with about
+        n_nodes nodes. The shapes are: 'chain' (linear chain of action nodes),
+        'fan' (one decision node with n_nodes branches), 'diamonds' (chain of
+        diamonds), 'nested' (nested diamonds) and 'notes' (linear chain of
+        action nodes each with a note attached through a notedot).
+    """
+    if shape == 'chain':
+        return make_chain_model(n_nodes, 0)
+    if shape == 'fan':
+        return make_fan_model(n_nodes)
+    if shape == 'diamonds':
+        return make_diamond_model(max(n_nodes//3, 1))
+    if shape == 'nested':
+        return make_nested_diamond_model(max(int(math.log2(max(n_nodes/3, 1))), 1))
+    if shape == 'notes':
+        return make_chain_model(n_nodes, 1)
+    raise ValueError('unknown model shape: '+shape)
+
+
+def bench_suite():
+    """ Measure time and peak memory of get_pr_desc, of the pr_create_* 
+        functions and of the end-to-end generation (gen_pr_code) on synthetic
+        models of each shape in suite_shapes and each size in suite_sizes.
+        Shared nodes are enabled for the diamond shapes (the size of the 
+        inlined code is exponential in the number of diamonds).
+        The results are written in json format to file suite_report_name.
+    """
+    print('suite: synthetic models (time, peak memory)')
+    results = []
+    config = FwGenCode.get_config()
+    try:
+        with tempfile.TemporaryDirectory() as dir_path:
+            for shape in suite_shapes:
+                for n_nodes in suite_sizes:
+                    FwGenCode.set_config(dict(config, share_nodes=config['share_nodes'] or 
+                                              shape in ('diamonds', 'nested')))
+                    json_obj = make_suite_model(shape, n_nodes)
+                    json_file_name = os.path.join(dir_path, 'Model.json')
+                    with open(json_file_name, 'w') as fd:
+                        json.dump(json_obj, fd)
+                    pr_desc = get_pr_desc(json_obj)
+                    phases = [('get_pr_desc', get_pr_desc, json_obj)]
+                    for fnc in (FwGenCode.pr_create_header, FwGenCode.pr_create_user_header,
+                                FwGenCode.pr_create_body):
+                        phases.append((fnc.__name__, fnc, pr_desc, dir_path))
+                    phases.append(('gen_pr_code', FwGenCode.gen_pr_code, json_file_name, dir_path))
+                    for phase in phases:
+                        durations = [timed(*phase[1:])[0]]
+                        while len(durations) < suite_repeat and sum(durations) < 1.0:
+                            durations.append(timed(*phase[1:])[0])
+                        duration = min(durations)
+                        peak = measure(*phase[1:])[1]
+                        results.append({'shape': shape, 'size': n_nodes, 
+                                        'states': len(json_obj['states']),
+                                        'connections': len(json_obj['connections']),
+                                        'phase': phase[0], 'time': duration, 'peak': peak})
+                        print('    %-8s %6d  %-22s: %8.3f s, %8.1f MB' % 
+                              (shape, n_nodes, phase[0], duration, peak/1e6))
+    finally:
+        FwGenCode.set_config(config)
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': sys.version.split()[0],
+              'generator_hash': FwGenCode.get_generator_hash(),
+              'config': config,
+              'results': results}
+    with open(suite_report_name, 'w') as fd:
+        json.dump(report, fd, indent=1)
+    print('    report written to '+suite_report_name)
+
+
+def apply_json_delta(json_obj, delta):
+    """ Reference implementation of FwDesc.apply_pr_delta on the json model:
+        return a copy of the argument json model with the delta applied
+    """
+    json_obj = copy.deepcopy(json_obj)
+    state_delta = delta.get('states', {})
+    removed = set(state_delta.get('removed', []))
+    changed = {item['id']: item for item in state_delta.get('changed', [])}
+    json_obj['states'] = [changed.get(item['id'], item) for item in json_obj['states']
+                          if item['id'] not in removed] + state_delta.get('added', [])
+    conn_delta = delta.get('connections', {})
+    removed = set(tuple(ends) for ends in conn_delta.get('removed', []))
+    changed = {(item['stateFromID'], item['stateToID']): item 
+               for item in conn_delta.get('changed', [])}
+    json_obj['connections'] = [changed.get((item['stateFromID'], item['stateToID']), item) 
+                               for item in json_obj['connections'] 
+                               if (item['stateFromID'], item['stateToID']) not in removed]
+    json_obj['connections'] += conn_delta.get('added', [])
+    return json_obj
+
+
+def gen_files(pr_desc):
+    """ Return the files generated for the argument procedure descriptor
+        without their timestamp
+    """
+    sink = MemorySink()
+    for fnc in (FwGenCode.pr_create_user_header, FwGenCode.pr_create_header,
+                FwGenCode.pr_create_body):
+        fnc(pr_desc, sink)
+    return {name: stripTimestamp(text) for name, text in sink.files.items()}
+
+
+def bench_delta():
+    """ Compare the incremental update of a descriptor (FwGenCode.gen_pr_delta)
+        with the full re-generation on a chain of 20000 nodes and check that
+        both give the same code and that only the affected files change.
+        Check that a delta leaving a dangling connection is rejected.
+    """
+    print('delta: incremental update vs. full re-generation (chain of 20000 nodes)')
+    json_obj = make_chain_model(20000)
+    items = {item['id']: item for item in json_obj['states']}
+    conns = {(c['stateFromID'], c['stateToID']): c for c in json_obj['connections']}
+
+    def changed(item, **fwprop):
+        """ Return a copy of a json item with changed fwprop fields """
+        item = copy.deepcopy(item)
+        item['fwprop'].update(fwprop)
+        return item
+
+    moved = copy.deepcopy(items[5])     # N1 is moved over the notedot of N0
+    moved['attrs']['x'], moved['attrs']['y'] = items[4]['attrs']['x']-10, items[4]['attrs']['y']-10
+    new_node = make_state(999999, 'state', -1000, -1000, 'NNew', 'New action')
+    deltas = [
+        ('action description', {'states': {'changed': [changed(items[2], entryDesc='New')]}}),
+        ('do nothing action', {'states': {'changed': [changed(items[2], entryDesc='Do nothing')]}}),
+        ('guard description', {'connections': {'changed': [changed(conns[(2, 5)], guardDesc='New')]}}),
+        ('else guard', {'connections': {'changed': [changed(conns[(2, 5)], guardDesc='Else')]}}),
+        ('move node', {'states': {'changed': [moved]}}),
+        ('rename node', {'states': {'changed': [changed(moved, identifier='NRenamed')]}}),
+        ('remove note', {'states': {'removed': [3]}, 'connections': {'removed': [[3, 4]]}}),
+        ('insert node', {'states': {'added': [new_node]},
+                         'connections': {'removed': [[5, 6]],
+                                         'added': [make_connection(5, 999999, 1, 'G'),
+                                                   make_connection(999999, 6)]}}),
+    ]
+    pr_desc = get_pr_desc(json_obj)
+    files = gen_files(pr_desc)
+    for delta_name, delta in deltas:
+        json_obj = apply_json_delta(json_obj, delta)
+        sink = MemorySink()
+        t_delta, affected = timed(FwGenCode.gen_pr_delta, pr_desc, delta, sink)
+        t_full, full_files = timed(lambda: gen_files(get_pr_desc(json_obj)))
+        for name, text in sink.files.items():
+            files[name] = stripTimestamp(text)
+        assert(files == full_files), 'incremental update differs for: '+delta_name
+        assert(set(sink.files) == set(affected))
+        print('    %-20s: %8.3f s (full: %8.3f s) %s' % 
+              (delta_name, t_delta, t_full, 
+               ', '.join(name+': '+' '.join(fncs) for name, fncs in affected.items())))
+    sink = MemorySink()
+    try:
+        FwGenCode.gen_pr_delta(pr_desc, {'states': {'removed': [items[6]['id']]}}, sink)
+        assert(False), 'dangling connection not rejected'
+    except ValueError as e:
+        assert('unknown end point' in str(e))
+    assert(sink.files == {})
+    print('    dangling connection : rejected')
+
+
+def bench_validate():
+    """ Measure the time taken by the validation of large procedures and 
+        check that a procedure with a cycle without guards, decision nodes
+        without else branch and clashes between generated identifiers are 
+        rejected
+    """
+    print('validate: validate_pr_desc on chains of 100000 nodes')
+    json_obj = make_chain_model(100000, 0, 0)
+    t_valid, diagnostics = timed(FwGenCode.validate_pr_desc, get_pr_desc(json_obj))
+    assert(diagnostics == [])
+    print('    valid chain:            %8.3f s' % t_valid)
+    json_obj['connections'][-1]['stateToID'] = 2     # Loop back to the first node
+    t_cycle, diagnostics = timed(FwGenCode.validate_pr_desc, get_pr_desc(json_obj))
+    assert(any('cycle without guards' in message for level, message in diagnostics))
+    print('    chain with a cycle:     %8.3f s' % t_cycle)
+    pr_desc = get_pr_desc(make_decision_model(['Flag']))     # One guarded branch
+    decision = pr_desc['states']['Decision']
+    assert(FwGenCode.is_node_transient(pr_desc, decision))
+    assert(FwGenCode.get_pr_symbols(pr_desc)['transient'][decision.id])
+    FwGenCode.pr_create_body(pr_desc, MemorySink())
+    print('    decision node with one guarded branch: transient')
+    with tempfile.TemporaryDirectory() as dir_path:
+        for guard_descs in (['Flag'], ['Flag 1', 'Flag 2']):
+            json_file_name = os.path.join(dir_path, 'Decision.json')
+            with open(json_file_name, 'w') as fd:
+                json.dump(make_decision_model(guard_descs), fd)
+            try:
+                FwGenCode.gen_pr_code(json_file_name, MemorySink())
+            except ValueError as e:
+                assert('has no else branch' in str(e))
+            else:
+                assert False, 'a decision node without else branch is accepted'
+    print('    decision nodes without else branch: rejected')
+    for name, clash in (('DecisionToN0', 'FwPrDecisionDecisionToN0'), 
+                        ('Stopped', 'eDecisionStopped'), ('Start', 'FwPrDecisionStart')):
+        json_obj = make_decision_model(['Flag', ''])
+        json_obj['states'][4]['fwprop']['identifier'] = name
+        diagnostics = FwGenCode.validate_pr_desc(get_pr_desc(json_obj))
+        assert(any(level == 'error' and 'identifier '+clash+' is generated' in message
+                   for level, message in diagnostics)), 'clash not found: '+clash
+    print('    clashes between generated identifiers: rejected')
+
+
+def bench_deep():
+    """ Check that the code of a long chain of transient nodes (all of which
+        are processed within one call to the Execute function) is generated 
+        within the time budget deep_budget
+    """
+    print('deep: code generation for a chain of %d nodes without guards' % deep_size)
+    pr_desc = get_pr_desc(make_chain_model(deep_size, 0, 0))
+    duration, files = timed(gen_files, pr_desc)
+    n_bytes = sum(len(text) for text in files.values())
+    print('    generation:             %8.3f s, %10d bytes' % (duration, n_bytes))
+    assert duration <= deep_budget, 'generation exceeds the budget of %.1f s' % deep_budget
+    body = files[FwGenCode.fn_pr_prefix+'Chain.c']
+    assert body.count('ChainN') >= 2*deep_size    # Each node is set and executed
+
+
+def make_wrap_corpus():
+    """ Return a list of wrap_corpus_size descriptions of 3 to 120 words 
+        (a fraction wrap_repeat_ratio of which repeat an earlier description)
+    """
+    rnd = random.Random(rnd_seed)
+    corpus = []
+    for i in range(wrap_corpus_size):
+        if len(corpus) > 0 and rnd.random() < wrap_repeat_ratio:
+            corpus.append(rnd.choice(corpus))
+        else:
+            n_words = rnd.randint(3, 120)
+            corpus.append(' '.join(rnd.choice(wrap_vocabulary) for j in range(n_words)))
+    return corpus
+
+
+def bench_wrap():
+    """ Measure the time taken by the comment formatting functions on a
+        corpus of descriptions, with an empty and with a full wrap cache, 
+        and check that no comment line is longer than MAX_LINE_LENGTH
+    """
+    corpus = make_wrap_corpus()
+    print('wrap: %d descriptions, %.0f%% repeated' % (len(corpus), 100*wrap_repeat_ratio))
+    def write_doxy():
+        return [Utilities.writeDoxy(['Function implementing the action', text]) for text in corpus]
+    def format_comment():
+        return [Utilities.formatAsPartOfComment(text) for text in corpus]
+    def fill():
+        return [textwrap.fill(text, Utilities.MAX_LINE_LENGTH, initial_indent=' * ',
+                              subsequent_indent=' * ') for text in corpus]
+    for label, fnc in (('writeDoxy', write_doxy), ('formatAsPartOfComment', format_comment)):
+        Utilities.wrapText.cache_clear()
+        t_cold, comments = timed(fnc)
+        t_warm, comments = timed(fnc)
+        print('    %-22s: %8.3f s (empty cache), %8.3f s (full cache)' % (label, t_cold, t_warm))
+        n_long = sum(1 for comment in comments for line in comment.split('\n') 
+                     if len(line) > Utilities.MAX_LINE_LENGTH)
+        assert n_long == 0, '%d lines are longer than %d' % (n_long, Utilities.MAX_LINE_LENGTH)
+    print('    %-22s: %8.3f s' % ('textwrap.fill', timed(fill)[0]))
+
+
+def check_reproducible():
+    """ Check that, in reproducible mode, the files generated twice for the 
+        same model, and for the same model with its nodes and connections 
+        in a different order, are byte-identical
+    """
+    print('reproducible: byte-identical output in reproducible mode')
+    json_obj = make_diamond_model(20)
+    shuffled = copy.deepcopy(json_obj)
+    rnd = random.Random(rnd_seed)
+    rnd.shuffle(shuffled['states'])
+    rnd.shuffle(shuffled['connections'])
+    def gen_raw(json_obj):
+        sink = MemorySink()
+        for fnc in (FwGenCode.pr_create_user_header, FwGenCode.pr_create_header,
+                    FwGenCode.pr_create_body):
+            fnc(get_pr_desc(copy.deepcopy(json_obj)), sink)
+        return sink.files
+    config = FwGenCode.get_config()
+    epoch = os.environ.pop('SOURCE_DATE_EPOCH', None)
+    try:
+        FwGenCode.set_config({'reproducible': True})
+        for label in ('model hash', 'SOURCE_DATE_EPOCH'):
+            if label == 'SOURCE_DATE_EPOCH':
+                os.environ['SOURCE_DATE_EPOCH'] = '1700000000'
+            files = gen_raw(json_obj)
+            assert gen_raw(json_obj) == files, 'two runs differ'
+            assert gen_raw(shuffled) == files, 'the order of the json model changes the output'
+            stamps = set(re.findall(r'generated on  (.*)', ''.join(files.values())))
+            print('    %-18s: identical (timestamp: %s)' % (label, ', '.join(stamps)))
+    finally:
+        FwGenCode.set_config(config)
+        os.environ.pop('SOURCE_DATE_EPOCH', None)
+        if epoch is not None:
+            os.environ['SOURCE_DATE_EPOCH'] = epoch
+
+
+def bench_sim():
+    """ Measure the number of procedure executions per second of the 
+        simulator (one instance and a batch of instances, with and without 
+        NumPy) on a chain with random guards
+    """
+    print('sim: simulation of a chain of 100 nodes with random guards')
+    pr_desc = get_pr_desc(make_chain_model(100))
+    rnd = random.Random(rnd_seed)
+    model = FwPrSim.PrModel(pr_desc, default_guard=lambda sim: rnd.random() < 0.5)
+    sim = FwPrSim.PrSimulator(model)
+    def run_single(n_ticks):
+        for tick in range(n_ticks):
+            sim.start()
+            sim.execute()
+    duration = timed(run_single, 100000)[0]
+    print('    %-26s: %10.0f executions/s' % ('1 instance', 100000/duration))
+    has_numpy = FwPrSim.numpy
+    for label, use_numpy in (('10000 instances', True), ('10000 instances, no NumPy', False)):
+        if use_numpy and has_numpy is None:
+            continue
+        FwPrSim.numpy = has_numpy if use_numpy else None
+        try:
+            model = FwPrSim.PrModel(pr_desc, default_guard=FwPrSim.random_guard(rnd, 0.5))
+            batch = FwPrSim.PrBatch(model, 10000)
+            def run_batch(n_ticks):
+                for tick in range(n_ticks):
+                    batch.start()
+                    batch.execute()
+            duration = timed(run_batch, 20)[0]
+        finally:
+            FwPrSim.numpy = has_numpy
+        print('    %-26s: %10.0f executions/s' % (label, 20*10000/duration))
+
+
+""" Body of the C main program used by bench_backend (the procedure is
+    restarted whenever it terminates) """
+driver_template = """#include <stdio.h>
+#include <time.h>
+#include "%(header)s"
+#if defined(__x86_64__) || defined(__i386__)
+#include <x86intrin.h>
+#define CYCLES() __rdtsc()
+#else
+#define CYCLES() 0
+#endif
+
+int main(void) {
+    unsigned long i, n = %(n_calls)d;
+    unsigned long long c0, c1;
+    struct timespec t0, t1;
+    clock_gettime(CLOCK_MONOTONIC, &t0);
+    c0 = CYCLES();
+    for (i = 0; i < n; i++) {
+        if (!%(prefix)sIsStarted())
+            %(prefix)sStart();
+        %(prefix)sExecute();
+    }
+    c1 = CYCLES();
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    printf("%%f %%f\\n", (double)(c1 - c0)/n,
+           ((t1.tv_sec - t0.tv_sec)*1e9 + (t1.tv_nsec - t0.tv_nsec))/n);
+    return 0;
+}
+"""
+
+def make_stubs(user_header_name):
+    """ Return the C code of a dummy implementation of the actions and
+        guards declared in the argument user header file. A guard is
+        true three times out of four.
+    """
+    lines = ['static volatile unsigned long actionCnt = 0;',
+             'static unsigned long guardCnt = 0;']
+    with open(user_header_name) as fd:
+        text = fd.read()
+    for ret_type, fnc, params in re.findall(r'^(void|int) (\w+)\(([\w ]*)\);$', text, re.M):
+        if ret_type == 'void':
+            lines.append('void '+fnc+'('+params+') { actionCnt++; }')
+        else:
+            lines.append('int '+fnc+'('+params+') { return (++guardCnt % 4) != 0; }')
+    return '\n'.join(lines) + '\n'
+
+
+def run_backend(json_file_name, dir_path, backend, n_calls):
+    """ Generate the code of a procedure with the argument backend, compile
+        it with the host C compiler together with dummy actions and guards
+        and a driver program, and return the number of cycles and of
+        nanoseconds per call to the Execute function.
+    """
+    pr_backend = FwGenCode.pr_backend
+    try:
+        FwGenCode.pr_backend = backend
+        FwGenCode.gen_pr_code(json_file_name, dir_path)
+    finally:
+        FwGenCode.pr_backend = pr_backend
+    pr_name = load_model(json_file_name)['globals']['fwprop']['smName']
+    prefix = FwGenCode.fn_pr_prefix + pr_name
+    stubs_name = os.path.join(dir_path, 'stubs.c')
+    with open(stubs_name, 'w') as fd:
+        fd.write(make_stubs(os.path.join(dir_path, prefix+FwGenCode.uh_pr_suffix+'.h')))
+    driver_name = os.path.join(dir_path, 'main.c')
+    with open(driver_name, 'w') as fd:
+        fd.write(driver_template % {'header': prefix+'.h', 'n_calls': n_calls,
+                                    'prefix': FwGenCode.fnc_pr_prefix+pr_name})
+    exe_name = os.path.join(dir_path, 'bench')
+    subprocess.run([os.environ.get('CC', 'cc'), '-O2', '-o', exe_name, '-I', dir_path, 
+                    os.path.join(dir_path, prefix+'.c'), stubs_name, driver_name], check=True)
+    output = subprocess.run([exe_name], check=True, capture_output=True, text=True).stdout
+    cycles, nsecs = output.split()
+    return float(cycles), float(nsecs)
+
+
+def bench_backend():
+    """ Compare the cost of the Execute function generated with the 'if'
+        and with the 'switch' backend (see FwGenCode.pr_backend) on the test 
+        models and on chains of action nodes. The code is compiled with the 
+        host C compiler (environment variable CC, default: cc).
+    """
+    if shutil.which(os.environ.get('CC', 'cc')) is None:
+        print('backend: skipped (no C compiler found)')
+        return
+    print('backend: cycles (ns) per Execute call')
+    test_models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_models')
+    with tempfile.TemporaryDirectory() as dir_path:
+        models = [('TestCase1', os.path.join(test_models_dir, 'TestCase1.json')),
+                  ('TestCase2', os.path.join(test_models_dir, 'TestCase2.json'))]
+        for n_nodes in (20, 200, 2000):
+            json_file_name = os.path.join(dir_path, 'Chain%d.json' % n_nodes)
+            with open(json_file_name, 'w') as fd:
+                json.dump(make_chain_model(n_nodes), fd)
+            models.append(('chain %d' % n_nodes, json_file_name))
+        for model_name, json_file_name in models:
+            results = []
+            for backend in ('if', 'switch'):
+                code_dir = os.path.join(dir_path, backend)
+                os.makedirs(code_dir, exist_ok=True)
+                results.append('%-6s %8.1f (%7.1f)' % 
+                               ((backend,) + run_backend(json_file_name, code_dir, backend, 2000000)))
+            print('    %-12s %s   %s' % (model_name, results[0], results[1]))
+
+
+""" Body of the C main program used by bench_instances (the instances are
+    restarted whenever they terminate) """
+instances_template = """#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include "%(header)s"
+
+static double now(void) {
+    struct timespec t;
+    clock_gettime(CLOCK_MONOTONIC, &t);
+    return t.tv_sec*1e9 + t.tv_nsec;
+}
+
+int main(void) {
+    unsigned int i, tick, n = %(n_instances)d, n_ticks = %(n_ticks)d;
+    double t0, t_single = 0, t_all = 0;
+    %(prefix)sInst_t set;
+    set.curNode = calloc(n, sizeof(set.curNode[0]));
+    set.n = n;
+    for (tick = 0; tick < n_ticks; tick++) {
+        for (i = 0; i < n; i++)
+            if (set.curNode[i] == 0)
+                %(prefix)sStart(&set, i);
+        t0 = now();
+        if (tick %% 2 == 0) {
+            for (i = 0; i < n; i++)
+                %(prefix)sExecute(&set, i);
+            t_single += now() - t0;
+        } else {
+            %(prefix)sExecuteAll(&set);
+            t_all += now() - t0;
+        }
+    }
+    printf("%%f %%f\\n", 2*t_single/n/n_ticks, 2*t_all/n/n_ticks);
+    return 0;
+}
+"""
+
+def run_instances(json_file_name, dir_path, n_instances, n_ticks):
+    """ Generate the code of a procedure in multi-instance mode (without 
+        counters), compile it
+        with the host C compiler together with dummy actions and guards
+        and a driver program, and return the number of nanoseconds per
+        instance execution when the instances are executed one by one and
+        when they are executed by function ExecuteAll
+    """
+    config = FwGenCode.get_config()
+    try:
+        FwGenCode.set_config({'multi_instance': True, 'no_cnt': True})
+        FwGenCode.gen_pr_code(json_file_name, dir_path)
+    finally:
+        FwGenCode.set_config(config)
+    pr_name = load_model(json_file_name)['globals']['fwprop']['smName']
+    prefix = FwGenCode.fn_pr_prefix + pr_name
+    stubs_name = os.path.join(dir_path, 'stubs.c')
+    with open(stubs_name, 'w') as fd:
+        fd.write(make_stubs(os.path.join(dir_path, prefix+FwGenCode.uh_pr_suffix+'.h')))
+    driver_name = os.path.join(dir_path, 'main.c')
+    with open(driver_name, 'w') as fd:
+        fd.write(instances_template % {'header': prefix+'.h', 'n_instances': n_instances,
+                                       'n_ticks': n_ticks,
+                                       'prefix': FwGenCode.fnc_pr_prefix+pr_name})
+    exe_name = os.path.join(dir_path, 'bench')
+    subprocess.run([os.environ.get('CC', 'cc'), '-O2', '-o', exe_name, '-I', dir_path, 
+                    os.path.join(dir_path, prefix+'.c'), stubs_name, driver_name], check=True)
+    output = subprocess.run([exe_name], check=True, capture_output=True, text=True).stdout
+    single, batched = output.split()
+    return float(single), float(batched)
+
+
+def bench_instances():
+    """ Compare the cost of executing many instances of a procedure generated
+        in multi-instance mode (see FwGenCode.multi_instance) one by one and 
+        through function ExecuteAll. The code is compiled with the host C 
+        compiler (environment variable CC, default: cc).
+    """
+    if shutil.which(os.environ.get('CC', 'cc')) is None:
+        print('instances: skipped (no C compiler found)')
+        return
+    print('instances: ns per instance execution (one by one, ExecuteAll)')
+    test_models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_models')
+    with tempfile.TemporaryDirectory() as dir_path:
+        models = [('TestCase1', os.path.join(test_models_dir, 'TestCase1.json'))]
+        for n_nodes in (20, 200):
+            json_file_name = os.path.join(dir_path, 'Chain%d.json' % n_nodes)
+            with open(json_file_name, 'w') as fd:
+                json.dump(make_chain_model(n_nodes), fd)
+            models.append(('chain %d' % n_nodes, json_file_name))
+        for model_name, json_file_name in models:
+            for n_instances in (16, 1024, 65536):
+                single, batched = run_instances(json_file_name, dir_path, n_instances, 
+                                                max(4, 4000000//n_instances))
+                print('    %-12s %6d instances: %7.1f %7.1f' % 
+                      (model_name, n_instances, single, batched))
+
+
+""" Body of the C main program used by bench_trace: the procedure is executed
+    as in driver_template and, if tracing is enabled, the trace buffer is
+    written to file trace.bin and the trace counter is printed """
+trace_template = """#include <stdio.h>
+#include <time.h>
+#include "%(header)s"
+
+int main(void) {
+    unsigned long i, n = %(n_calls)d;
+    struct timespec t0, t1;
+    clock_gettime(CLOCK_MONOTONIC, &t0);
+    for (i = 0; i < n; i++) {
+        if (!%(prefix)sIsStarted())
+            %(prefix)sStart();
+        %(prefix)sExecute();
+    }
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    printf("%%f", ((t1.tv_sec - t0.tv_sec)*1e9 + (t1.tv_nsec - t0.tv_nsec))/n);
+#ifdef %(macro)s
+    {
+        FILE* fd = fopen("%(trace_file)s", "wb");
+        fwrite(%(prefix)sTraceBuf, sizeof(%(prefix)sTraceBuf), 1, fd);
+        fclose(fd);
+        printf(" %%lu", (unsigned long)%(prefix)sTraceCnt);
+    }
+#endif
+    printf("\\n");
+    return 0;
+}
+"""
+
+def run_trace(json_file_name, dir_path, trace, cflags, n_calls):
+    """ Generate the code of a procedure with the argument value of the trace 
+        configuration parameter, compile it with the host C compiler and the
+        argument flags together with dummy actions and guards (see make_stubs)
+        and a driver program, and return the number of nanoseconds per call 
+        to the Execute function, the assembly code of the procedure and, if
+        tracing is enabled, the trace counter (otherwise: None)
+    """
+    config = FwGenCode.get_config()
+    try:
+        FwGenCode.set_config({'trace': trace})
+        FwGenCode.gen_pr_code(json_file_name, dir_path)
+        pr_desc = get_pr_desc(load_model(json_file_name))
+        macro = FwGenCode.get_trace_macro(pr_desc)
+    finally:
+        FwGenCode.set_config(config)
+    prefix = FwGenCode.fn_pr_prefix + pr_desc['name']
+    stubs_name = os.path.join(dir_path, 'stubs.c')
+    with open(stubs_name, 'w') as fd:
+        fd.write(make_stubs(os.path.join(dir_path, prefix+FwGenCode.uh_pr_suffix+'.h')))
+    driver_name = os.path.join(dir_path, 'main.c')
+    with open(driver_name, 'w') as fd:
+        fd.write(trace_template % {'header': prefix+'.h', 'n_calls': n_calls, 'macro': macro,
+                                   'trace_file': os.path.join(dir_path, 'trace.bin'),
+                                   'prefix': FwGenCode.fnc_pr_prefix+pr_desc['name']})
+    cc = [os.environ.get('CC', 'cc'), '-O2'] + list(cflags) + ['-I', dir_path]
+    body_name = os.path.join(dir_path, prefix+'.c')
+    asm = subprocess.run(cc + ['-S', '-o', '-', body_name], check=True, 
+                         capture_output=True, text=True).stdout
+    exe_name = os.path.join(dir_path, 'bench')
+    subprocess.run(cc + ['-o', exe_name, body_name, stubs_name, driver_name], check=True)
+    output = subprocess.run([exe_name], check=True, capture_output=True, text=True).stdout.split()
+    return float(output[0]), asm, (int(output[1]) if len(output) > 1 else None)
+
+
+""" Body of the C main program used by check_trace_instances: two instances
+    of a set of %(n_instances)d instances are started and executed once and 
+    the trace buffer is written to file trace.bin """
+trace_instances_template = """#include <stdio.h>
+#include <stdlib.h>
+#include "%(header)s"
+
+int main(void) {
+    %(inst_type)s set;
+    unsigned int inst[2] = {1, %(n_instances)d-1};
+    int i;
+    set.n = %(n_instances)d;
+    set.curNode = calloc(set.n, sizeof(set.curNode[0]));
+    for (i = 0; i < 2; i++) {
+        %(prefix)sStart(&set, inst[i]);
+        %(prefix)sExecute(&set, inst[i]);
+    }
+    {
+        FILE* fd = fopen("%(trace_file)s", "wb");
+        fwrite(%(prefix)sTraceBuf, sizeof(%(prefix)sTraceBuf), 1, fd);
+        fclose(fd);
+        printf("%%lu\\n", (unsigned long)%(prefix)sTraceCnt);
+    }
+    free(set.curNode);
+    return 0;
+}
+"""
+
+def check_trace_instances(json_file_name, dir_path, n_instances):
+    """ Generate the code of a procedure in multi-instance mode with trace
+        points, compile it with the host C compiler together with dummy 
+        actions and guards and a driver program executing the instances 1
+        and n_instances-1, and return the set of the instance indexes in the
+        decoded trace (see FwPrTrace)
+    """
+    config = FwGenCode.get_config()
+    try:
+        FwGenCode.set_config({'multi_instance': True, 'no_cnt': True, 'trace': True})
+        FwGenCode.gen_pr_code(json_file_name, dir_path)
+        pr_desc = get_pr_desc(load_model(json_file_name))
+        macro = FwGenCode.get_trace_macro(pr_desc)
+        inst_type = FwGenCode.get_inst_type(pr_desc)
+    finally:
+        FwGenCode.set_config(config)
+    prefix = FwGenCode.fn_pr_prefix + pr_desc['name']
+    stubs_name = os.path.join(dir_path, 'stubs.c')
+    with open(stubs_name, 'w') as fd:
+        fd.write(make_stubs(os.path.join(dir_path, prefix+FwGenCode.uh_pr_suffix+'.h')))
+    driver_name = os.path.join(dir_path, 'main.c')
+    trace_file_name = os.path.join(dir_path, 'trace.bin')
+    with open(driver_name, 'w') as fd:
+        fd.write(trace_instances_template % {'header': prefix+'.h', 'inst_type': inst_type,
+                                             'n_instances': n_instances, 
+                                             'trace_file': trace_file_name,
+                                             'prefix': FwGenCode.fnc_pr_prefix+pr_desc['name']})
+    exe_name = os.path.join(dir_path, 'bench')
+    subprocess.run([os.environ.get('CC', 'cc'), '-O2', '-D'+macro, '-o', exe_name, '-I', dir_path,
+                    os.path.join(dir_path, prefix+'.c'), stubs_name, driver_name], check=True)
+    count = int(subprocess.run([exe_name], check=True, capture_output=True, text=True).stdout)
+    with open(trace_file_name, 'rb') as fd:
+        records = FwPrTrace.get_records(fd.read(), count, multi_instance=True)
+    return set(inst for tick, inst, kind, name, value in FwPrTrace.decode(pr_desc, records))
+
+
+def get_expected_trace(pr_desc, n_calls):
+    """ Simulate the code run by run_trace (see FwPrSim and make_stubs) and
+        return the list of the guard evaluations and of the entries into 
+        nodes with an action in the order in which they occur
+    """
+    events = []
+    guard_cnt = [0]
+    def make_guard(key):
+        def guard(sim):
+            guard_cnt[0] += 1
+            events.append(('guard', key, int(guard_cnt[0] % 4 != 0)))
+            return events[-1][2]
+        return guard
+    def make_action(name):
+        return lambda sim: events.append(('node', name, None))
+    node_names, guard_names = FwGenCode.get_trace_names(pr_desc)
+    model = FwPrSim.PrModel(pr_desc, dict((key, make_guard(key)) for key in guard_names),
+                            dict((name, make_action(name)) for name in node_names[2:]))
+    sim = FwPrSim.PrSimulator(model)
+    for i in range(n_calls):
+        if not sim.is_started():
+            sim.start()
+        sim.execute()
+    return events
+
+
+def bench_trace():
+    """ Measure the cost of the trace points (see FwGenCode.trace) when they
+        are compiled out and when they are enabled, check that the code
+        compiled without the trace macro is identical to the code generated
+        without trace points, and check that the decoded trace (see 
+        FwPrTrace) matches the simulated execution of the procedure.
+        Check that the generation is refused for procedures whose node or
+        guard identifiers do not fit in the trace records and that the 
+        instance indexes above 65535 are recorded in multi-instance mode.
+    """
+    config = FwGenCode.get_config()
+    try:
+        FwGenCode.set_config({'trace': True})
+        for n_nodes, guard_every, accepted in ((0x7FFE, 0, True), (0x7FFF, 0, False),
+                                               (0x4001, 1, True), (0x4002, 1, False)):
+            json_obj = make_chain_model(n_nodes, 0, guard_every)
+            json_obj['connections'][0]['fwprop']['guardDesc'] = ''  # No guard on the initial node
+            pr_desc = get_pr_desc(json_obj)
+            for fnc in (FwGenCode.pr_create_header, FwGenCode.pr_create_body):
+                try:
+                    fnc(pr_desc, MemorySink())
+                    assert(accepted), 'trace identifiers out of range not rejected'
+                except ValueError as e:
+                    assert(not accepted and 'trace records' in str(e))
+    finally:
+        FwGenCode.set_config(config)
+    print('trace: node and guard identifiers out of range: rejected')
+    if shutil.which(os.environ.get('CC', 'cc')) is None:
+        print('trace: skipped (no C compiler found)')
+        return
+    print('trace: ns per Execute call (no trace points, compiled out, enabled)')
+    test_models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_models')
+    with tempfile.TemporaryDirectory() as dir_path:
+        models = [('TestCase1', os.path.join(test_models_dir, 'TestCase1.json')),
+                  ('TestCase2', os.path.join(test_models_dir, 'TestCase2.json'))]
+        json_file_name = os.path.join(dir_path, 'Chain200.json')
+        with open(json_file_name, 'w') as fd:
+            json.dump(make_chain_model(200), fd)
+        models.append(('chain 200', json_file_name))
+        for model_name, json_file_name in models:
+            pr_desc = get_pr_desc(load_model(json_file_name))
+            macro = FwGenCode.get_trace_macro(pr_desc)
+            runs = []
+            for trace, cflags in ((False, ()), (True, ()), (True, ('-D'+macro,))):
+                code_dir = os.path.join(dir_path, str(len(runs)))
+                os.makedirs(code_dir, exist_ok=True)
+                runs.append(run_trace(json_file_name, code_dir, trace, cflags, 500000))
+            with open(os.path.join(code_dir, 'trace.bin'), 'rb') as fd:
+                records = FwPrTrace.get_records(fd.read(), runs[2][2])
+            decoded = [(kind, name, value) for tick, inst, kind, name, value in 
+                       FwPrTrace.decode(pr_desc, records)]
+            with_action = set(state.name for state in pr_desc['states'].values() 
+                              if state.type == 'state' and not state.is_do_nothing)
+            decoded = [event for event in decoded if event[0] == 'guard' or event[1] in with_action]
+            expected = get_expected_trace(pr_desc, 500000)
+            print('    %-12s %7.1f %7.1f %7.1f   identical code: %-3s  trace: %s' % 
+                  (model_name, runs[0][0], runs[1][0], runs[2][0], 
+                   'yes' if runs[0][1] == runs[1][1] else 'no',
+                   'ok' if expected[-len(decoded):] == decoded else 'MISMATCH'))
+        n_instances = 70000
+        insts = check_trace_instances(models[0][1], dir_path, n_instances)
+        assert(insts == set([1, n_instances-1])), 'instance indexes differ: '+str(insts)
+        print('    instance indexes in a set of %d instances: ok' % n_instances)
+
+
+def check_sm():
+    """ Check that a notedot inside nested states is attached to the innermost
+        state, that choice pseudo-states without identifier get unique names
+        and that the code generation is refused for a state machine with a
+        transition out of a proper state without a trigger. Check that the
+        batch generator (see FwGenBatch) generates a state machine model 
+        without editor type as a state machine.
+    """
+    print('sm: state machine descriptor and code generation')
+    # S21 is drawn inside S2 but comes first in the json model
+    states = [make_state(1, 'init', 0, 0), make_state(2, 'state', 100, 0, 'S1'),
+              make_state(3, 'state', 320, 20, 'S21'), make_state(4, 'state', 300, 0, 'S2'),
+              make_state(5, 'init', 440, 100), make_state(6, 'choice', 200, 200),
+              make_state(7, 'choice', 200, 300), make_state(8, 'note', 500, 200, None, 'Note'),
+              make_state(9, 'notedot', 330, 30)]
+    states[3]['attrs']['width'], states[3]['attrs']['height'] = 200, 150
+    connections = [make_connection(1, 2), make_connection(2, 6), make_connection(6, 4, 1, 'G1'),
+                   make_connection(6, 2, 2, 'Else'), make_connection(4, 7), 
+                   make_connection(7, 2, 1, 'G2'), make_connection(7, 4, 2, 'Else'),
+                   make_connection(5, 3), make_connection(8, 9)]
+    connections[1]['fwprop']['identifier'] = 'Go'
+    connections[4]['fwprop']['identifier'] = 'Back'
+    sm_desc = FwDesc.get_sm_desc(make_sm_model('Sm', states, connections))
+    assert([note.description for note in sm_desc['states']['S21'].to_notes] == ['Note'])
+    assert(sm_desc['states']['S2'].to_notes == [])
+    print('    notedot inside nested states: attached to the innermost state')
+    assert(sorted(name for name in sm_desc['states'] if name.startswith('Choice')) == 
+           ['Choice6', 'Choice7'])
+    files = {}
+    for fnc in (FwGenSmCode.sm_create_user_header, FwGenSmCode.sm_create_header, 
+                FwGenSmCode.sm_create_body):
+        sink = MemorySink()
+        fnc(sm_desc, sink)
+        files.update(sink.files)
+    fncs = re.findall(r'^int (\w+)\(', files['FwSmSmUser.h'], re.M)
+    assert(len(fncs) == 2 and len(set(fncs)) == 2), 'guard functions: '+str(fncs)
+    print('    unnamed choices: ' + ', '.join(sorted(fncs)))
+    json_obj = make_sm_model('Sm', states, connections)
+    del json_obj['globals']['fwprop']['editorType']
+    assert(FwDesc.get_model_type(json_obj) == 'Sm' and get_pr_desc(json_obj) is None)
+    with tempfile.TemporaryDirectory() as dir_path:
+        json_file_name = os.path.join(dir_path, 'Sm.json')
+        with open(json_file_name, 'w') as fd:
+            json.dump(json_obj, fd)
+        assert(FwGenBatch.gen_code(json_file_name, dir_path))
+        assert(os.path.exists(os.path.join(dir_path, 'FwSmSm.c')))
+    print('    model without editor type: generated as a state machine')
+    connections[4]['fwprop']['identifier'] = ''
+    with tempfile.TemporaryDirectory() as dir_path:
+        json_file_name = os.path.join(dir_path, 'Sm.json')
+        with open(json_file_name, 'w') as fd:
+            json.dump(make_sm_model('Sm', states, connections), fd)
+        try:
+            FwGenSmCode.gen_sm_files(json_file_name)
+            assert(False), 'empty trigger not rejected'
+        except ValueError as e:
+            assert('trigger identifier cannot be empty on the transition from S2 to Choice7' in str(e))
+    print('    transition without trigger: rejected')
+
+
+def enumerate_wcet(pr_desc, costs):
+    """ Return the worst-case cost of one call to the Execute function from 
+        each waiting node of an acyclic procedure (as a dictionary indexed by 
+        node name) found by enumerating all the paths (see FwPrWcet.get_wcet);
+        the paths go on through the non-transient nodes whose guard is true
+    """
+    symbols = FwGenCode.get_pr_symbols(pr_desc)
+    transient = symbols['transient']
+    def get_cost(fnc):
+        return costs.get(fnc, 1)
+    wcet = {}
+    for node in symbols['states']:
+        if transient[node.id] or node.type not in ('init', 'state'):
+            continue
+        best = 0
+        stack = [(node, 0)]
+        while len(stack) > 0:
+            succ, cost = stack.pop()
+            if succ.type == 'final':
+                best = max(best, cost)
+            elif succ.type in ('init', 'state'):
+                if succ is not node and not succ.is_do_nothing:
+                    cost += get_cost(symbols['node_fncs'][succ.id])
+                connection = succ.outgoing_connections[0]
+                guard_fnc = symbols['guard_fncs'][connection]
+                if guard_fnc != None:
+                    cost += get_cost(guard_fnc)
+                    best = max(best, cost)      # The guard is false
+                stack.append((connection.to_state, cost))
+            else:
+                for branch in sorted(succ.outgoing_connections, key=lambda c: c.order):
+                    if symbols['guard_fncs'][branch] != None:
+                        cost += get_cost(symbols['guard_fncs'][branch])
+                    stack.append((branch.to_state, cost))
+        wcet[node.name] = best
+    return wcet
+
+
+def bench_wcet():
+    """ Measure the time taken by the worst-case execution path analysis
+        (see FwPrWcet) on chains of diamonds (the number of paths grows
+        exponentially with the number of diamonds), check its results 
+        against the enumeration of all paths on small procedures with 
+        random costs and check that cycles of transient nodes are reported
+    """
+    print('wcet: worst-case execution path analysis of chains of diamonds')
+    for n_diamonds in (1000, 10000, 30000):
+        pr_desc = get_pr_desc(make_diamond_model(n_diamonds))
+        duration, (wcet, hazards) = timed(FwPrWcet.get_wcet, pr_desc)
+        assert(hazards == [] and wcet[0][1] == 2*n_diamonds)
+        print('    %6d diamonds (2**%d paths): %8.3f s' % (n_diamonds, n_diamonds, duration))
+    rnd = random.Random(rnd_seed)
+    for json_obj in (make_diamond_model(12), make_nested_diamond_model(6), make_fan_model(20),
+                     make_chain_model(200, note_every=0, guard_every=3)):
+        pr_desc = get_pr_desc(json_obj)
+        symbols = FwGenCode.get_pr_symbols(pr_desc)
+        fncs = set(symbols['node_fncs'].values()) | \
+               set(fnc for fnc in symbols['guard_fncs'].values() if fnc != None)
+        costs = dict((fnc, rnd.randint(0, 100)) for fnc in fncs)
+        wcet = FwPrWcet.get_wcet(pr_desc, costs)[0]
+        assert(dict((name, cost) for name, cost, sequence, hazard in wcet) == 
+               enumerate_wcet(pr_desc, costs))
+        for name, cost, sequence, hazard in wcet:
+            assert(sum(costs[fnc] for kind, fnc, value in sequence) == cost)
+    print('    bounds of %d procedures match the enumeration of their paths' % 4)
+    json_obj = make_chain_model(100, 0, 0)
+    json_obj['connections'][-1]['stateToID'] = 2     # Loop back to the first node
+    hazards = FwPrWcet.get_wcet(get_pr_desc(json_obj))[1]
+    assert(len(hazards) == 1 and 'cycle without guards' in hazards[0])
+    json_obj = make_chain_model(100, 0, 0)
+    states = json_obj['states']
+    states.append(make_state(len(states)+1, 'choice', 0, 0, 'Loop'))
+    json_obj['connections'][-1]['stateToID'] = len(states)
+    json_obj['connections'].append(make_connection(len(states), 2, 1, 'Again'))
+    json_obj['connections'].append(make_connection(len(states), states[-2]['id'], 2, 'Else'))
+    hazards = FwPrWcet.get_wcet(get_pr_desc(json_obj))[1]
+    assert(len(hazards) == 1 and 'cycle through guards' in hazards[0])
+    json_obj = make_chain_model(100, 0, 2)
+    json_obj['connections'][-1]['stateToID'] = 2     # Loop through non-transient nodes
+    hazards = FwPrWcet.get_wcet(get_pr_desc(json_obj))[1]
+    assert(len(hazards) == 1 and 'cycle through guards' in hazards[0])
+    print('    cycles without and through guards are reported')
+
+
+""" Number of action nodes of the chain used by bench_order """
+order_chain_size = 40
+""" Number of nodes at the end of the chain of bench_order where the procedure
+    spends most of its time (the guards on their out-going connections are
+    rarely true) """
+order_hot_size = 6
+
+def simulate_residency(pr_desc, probabilities, n_instances, n_ticks, seed):
+    """ Simulate the argument procedure with random guards which are true 
+        with the argument probabilities (indexed by (source name, target name)
+        pair) and return the number of ticks spent in each node as a
+        dictionary indexed by node name (see FwPrSim.simulate)
+    """
+    rnd = random.Random(seed)
+    guards = dict((key, FwPrSim.random_guard(rnd, p)) for key, p in probabilities.items())
+    model = FwPrSim.PrModel(pr_desc, guards)
+    batch = FwPrSim.PrBatch(model, n_instances)
+    counts = [0]*len(model.names)
+    for tick in range(n_ticks):
+        batch.start()
+        batch.execute()
+        for node, count in enumerate(batch.get_residency()):
+            counts[node] += count
+    return dict(zip(model.names, counts))
+
+
+def get_comparisons(pr_desc, residency):
+    """ Return the average number of checks of the current node done by the 
+        Execute function ('if' backend) per tick for the argument residency
+        of the procedure in its nodes 
+    """
+    order = [node.name for node in FwGenCode.get_check_order(pr_desc)]
+    total = sum(residency.get(name, 0) for name in order)
+    return sum(residency.get(name, 0)*(i+1) for i, name in enumerate(order))/total
+
+
+def bench_order():
+    """ Compare the average number of checks of the current node per tick
+        of the Execute function with the node checks in the order of the 
+        model and in the order of a node profile (see FwGenCode.node_profile).
+        The procedure is a chain whose last nodes are the ones where the 
+        procedure spends most of its time; the profile is obtained by 
+        simulating it and the number of checks is measured on another 
+        simulation (with another seed).
+    """
+    print('order: node checks per tick on a chain of %d nodes with a skewed profile' % 
+          order_chain_size)
+    json_obj = make_chain_model(order_chain_size, note_every=0, guard_every=1)
+    json_obj['connections'][0]['fwprop']['guardDesc'] = ''    # No guard on the initial node
+    pr_desc = get_pr_desc(json_obj)
+    symbols = FwGenCode.get_pr_symbols(pr_desc)
+    probabilities = {}
+    for key in FwGenCode.get_trace_names(pr_desc)[1]:
+        is_hot = key[0].startswith('N') and int(key[0][1:]) >= order_chain_size-order_hot_size-1
+        probabilities[key] = 0.02 if is_hot else 0.9
+    profile = simulate_residency(pr_desc, probabilities, 10000, 200, rnd_seed)
+    residency = simulate_residency(pr_desc, probabilities, 10000, 200, rnd_seed+1)
+    node_profile = FwGenCode.node_profile
+    try:
+        results = []
+        for label, order_profile in (('model order', None), ('profile order', profile)):
+            FwGenCode.node_profile = order_profile
+            sink = MemorySink()
+            FwGenCode.pr_create_body(pr_desc, sink)
+            checks = re.findall(r'^        if \(curNode == (\w+)\) \{$', 
+                                sink.files[FwGenCode.fn_pr_prefix+pr_desc['name']+'.c'], re.M)
+            assert(checks == [symbols['node_names'][node.id] for node in 
+                              FwGenCode.get_check_order(pr_desc)])
+            results.append(get_comparisons(pr_desc, residency))
+            print('    %-14s: %6.2f checks per tick' % (label, results[-1]))
+    finally:
+        FwGenCode.node_profile = node_profile
+    print('    reduction     : %6.1f %%' % (100*(1 - results[1]/results[0])))
+
+
+""" Benchmarks which can be run from the command line """
+benchmarks = {
+    'notedots': bench_notedots,
+    'scaling': bench_scaling,
+    'diamonds': bench_diamonds,
+    'emit': bench_emit,
+    'load': bench_load,
+    'backend': bench_backend,
+    'suite': bench_suite,
+    'delta': bench_delta,
+    'validate': bench_validate,
+    'deep': bench_deep,
+    'wrap': bench_wrap,
+    'reproducible': check_reproducible,
+    'sim': bench_sim,
+    'instances': bench_instances,
+    'trace': bench_trace,
+    'wcet': bench_wcet,
+    'order': bench_order,
+    'sm': check_sm,
+}
+
+def main(argv):
+    """ Run the benchmarks named in the argument list or all benchmarks """
+    global suite_sizes, suite_shapes, suite_report_name
+    parser = argparse.ArgumentParser(description='Run the code generator benchmarks')
+    parser.add_argument('--sizes', help='comma-separated model sizes of the suite')
+    parser.add_argument('--shapes', help='comma-separated model shapes of the suite')
+    parser.add_argument('--report', help='json report file of the suite')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error('unknown benchmark: '+name)
+    if args.sizes is not None:
+        suite_sizes = tuple(int(size) for size in args.sizes.split(','))
+    if args.shapes is not None:
+        suite_shapes = tuple(args.shapes.split(','))
+    if args.report is not None:
+        suite_report_name = args.report
+
+    names = args.names if len(args.names) > 0 else list(benchmarks)
+    for name in names:
+        benchmarks[name]()
+    return
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
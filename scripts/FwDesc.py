@@ -3,11 +3,387 @@
 The key functions in this module are: get_pr_desc and get_sm_desc. They take as
 argument the json file of a FW Profile Procedure or State Machine and return
 a dictionary holding a complete description of the procedue or state machine.
+Function apply_pr_delta updates a procedure descriptor in place when the
+model is edited.
 """
 
 __author__ = 'Alessandro Pasetti, P&P software GmbH'
 
+import sys
 import json
+import math
+import bisect
+import collections.abc
+
+try:
+    import ijson
+except ImportError:     # The json models are loaded with the json module
+    ijson = None
+
+""" Fields of the json model which are used by get_pr_desc. The fields are
+    given as dot-separated paths within the 'globals' object and within the
+    items of the 'states' and 'connections' lists. """
+PR_FIELDS = {
+    'globals': ('fwprop.editorType', 'fwprop.smName'),
+    'states': ('id', 'attrs.x', 'attrs.y', 'attrs.width', 'attrs.height', 
+               'fwprop.type', 'fwprop.identifier', 'fwprop.entryDesc', 'fwprop.note'),
+    'connections': ('stateFromID', 'stateToID', 'fwprop.order', 'fwprop.guardDesc')
+}
+
+""" Fields of the json model which are used by get_sm_desc (see PR_FIELDS) """
+SM_FIELDS = {
+    'globals': ('fwprop.editorType', 'fwprop.smName'),
+    'states': ('id', 'attrs.x', 'attrs.y', 'attrs.width', 'attrs.height', 
+               'fwprop.type', 'fwprop.identifier', 'fwprop.entryDesc', 'fwprop.doDesc',
+               'fwprop.exitDesc', 'fwprop.embedSmId', 'fwprop.note'),
+    'connections': ('stateFromID', 'stateToID', 'fwprop.order', 'fwprop.identifier',
+                    'fwprop.guardDesc', 'fwprop.actionDesc', 'fwprop.note')
+}
+
+""" Fields of the json model which are used by get_model_type (see PR_FIELDS) """
+TYPE_FIELDS = {'globals': ('fwprop.editorType',), 'states': (), 'connections': ()}
+
+
+class DescItem(collections.abc.Mapping):
+    """ Base class for the items of a descriptor (states, connections, notes).
+    The attributes of an item are held in slots. An item can also be used 
+    as a read-only dictionary whose keys are given by the 'keys_map' class 
+    attribute (mapping each key to the name of an attribute). Items are 
+    compared and hashed by identity.
+    """
+    __slots__ = ()
+    keys_map = {}
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.keys_map[key])
+        except KeyError:
+            raise KeyError(key) from None
+    
+    def __setitem__(self, key, value):
+        setattr(self, self.keys_map[key], value)
+    
+    def __iter__(self):
+        return iter(self.keys_map)
+    
+    def __len__(self):
+        return len(self.keys_map)
+    
+    def __repr__(self):
+        return type(self).__name__ + '(id=' + repr(self.id) + ')'
+    
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+
+class State(DescItem):
+    """ A procedure state (initial or final pseudo-state, action node or 
+    decision node) """
+    __slots__ = ('id', 'name', 'type', 'x', 'y', 'width', 'height', 'description',
+                 'is_do_nothing', 'outgoing_connections', 'to_notes')
+    keys_map = {name: name for name in __slots__}
+    
+    def __init__(self, id, name, type, x, y, width, height, description, 
+                 is_do_nothing, outgoing_connections, to_notes):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.description = description
+        self.is_do_nothing = is_do_nothing
+        self.outgoing_connections = outgoing_connections
+        self.to_notes = to_notes
+
+
+class Connection(DescItem):
+    """ A connection between two procedure states (or between a note and a
+    notedot). Attributes from_state and to_state refer to the source and
+    target states (they are None if the end point is not a state).
+    """
+    __slots__ = ('from_id', 'to_id', 'guard_desc', 'order', 'is_else_guard', 
+                 'from_state', 'to_state')
+    keys_map = {'from': 'from_id', 'to': 'to_id', 'guardDesc': 'guard_desc', 
+                'order': 'order', 'is_else_guard': 'is_else_guard'}
+    
+    def __init__(self, from_id, to_id, guard_desc, order, is_else_guard, 
+                 from_state, to_state):
+        self.from_id = from_id
+        self.to_id = to_id
+        self.guard_desc = guard_desc
+        self.order = order
+        self.is_else_guard = is_else_guard
+        self.from_state = from_state
+        self.to_state = to_state
+                
+    def __repr__(self):
+        return 'Connection(' + repr(self.from_id) + ', ' + repr(self.to_id) + ')'
+
+
+class Note(DescItem):
+    """ A note which may be attached to procedure states """
+    __slots__ = ('id', 'x', 'y', 'width', 'height', 'description', 'to_states')
+    keys_map = {name: name for name in __slots__}
+    
+    def __init__(self, id, x, y, width, height, description, to_states):
+        self.id = id
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.description = description
+        self.to_states = to_states
+
+
+class SmState(DescItem):
+    """ A state machine state, choice pseudo-state, initial pseudo-state or 
+    final pseudo-state. 
+    Attribute 'machine' is the state machine to which the state belongs and
+    attribute 'embedded' is the state machine embedded in the state (or None).
+    Attribute 'outgoing_transitions' holds the transitions out of the state
+    sorted by their order. Attribute 'dispatch' maps each trigger to the list 
+    of the transitions out of the state with that trigger (sorted by order).
+    """
+    __slots__ = ('id', 'name', 'type', 'x', 'y', 'width', 'height', 'entry_desc',
+                 'do_desc', 'exit_desc', 'embed_sm_id', 'note', 'machine', 'embedded', 
+                 'outgoing_transitions', 'dispatch', 'to_notes')
+    keys_map = {name: name for name in __slots__}
+    
+    def __init__(self, id, name, type, x, y, width, height, entry_desc, do_desc,
+                 exit_desc, embed_sm_id, note):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.entry_desc = entry_desc
+        self.do_desc = do_desc
+        self.exit_desc = exit_desc
+        self.embed_sm_id = embed_sm_id
+        self.note = note
+        self.machine = None
+        self.embedded = None
+        self.outgoing_transitions = []
+        self.dispatch = {}
+        self.to_notes = []
+
+
+class SmTransition(DescItem):
+    """ A transition between two states or pseudo-states of a state machine """
+    __slots__ = ('from_id', 'to_id', 'trigger', 'guard_desc', 'action_desc', 'order', 
+                 'is_else_guard', 'note', 'from_state', 'to_state')
+    keys_map = {'from': 'from_id', 'to': 'to_id', 'trigger': 'trigger', 
+                'guardDesc': 'guard_desc', 'actionDesc': 'action_desc', 'order': 'order',
+                'is_else_guard': 'is_else_guard', 'note': 'note'}
+    
+    def __init__(self, from_id, to_id, trigger, guard_desc, action_desc, order,
+                 is_else_guard, note, from_state, to_state):
+        self.from_id = from_id
+        self.to_id = to_id
+        self.trigger = trigger
+        self.guard_desc = guard_desc
+        self.action_desc = action_desc
+        self.order = order
+        self.is_else_guard = is_else_guard
+        self.note = note
+        self.from_state = from_state
+        self.to_state = to_state
+                
+    def __repr__(self):
+        return 'SmTransition(' + repr(self.from_id) + ', ' + repr(self.to_id) + ')'
+
+
+class SmMachine(DescItem):
+    """ A state machine: either the top-level state machine or a state 
+    machine embedded in a state (attribute 'parent') """
+    __slots__ = ('name', 'parent', 'init', 'states', 'choices', 'finals', 'transitions')
+    keys_map = {name: name for name in __slots__}
+    
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.init = None
+        self.states = []        # States (excluding pseudo-states)
+        self.choices = []       # Choice pseudo-states
+        self.finals = []        # Final pseudo-states
+        self.transitions = []   # Transitions out of the states of the machine
+                
+    def __repr__(self):
+        return 'SmMachine(' + repr(self.name) + ')'
+
+
+class StateGrid:
+    """ Uniform grid over the bounding boxes of procedure states.
+    The grid answers point-in-rectangle queries in near-constant time. It is
+    used to find the state to which a notedot is attached. A point is inside
+    a state if it lies strictly inside its bounding box. If several states
+    contain the point, the state which comes last in the iteration order of
+    the argument states is returned (this is the same as the outcome of a 
+    linear scan over all states).
+    """
+    def __init__(self, states):
+        self.states = list(states)
+        self.cells = {}
+        self.rects = None       # Built when the grid is first updated (see _rects)
+        self.indices = None     # Position in self.states of each state
+        if len(self.states) == 0:
+            self.cell_size = 1.0
+            return
+        # The cell size is the average state dimension: a state then covers
+        # a handful of cells and a cell holds a handful of states
+        total = sum(state.width + state.height for state in self.states)
+        self.cell_size = max(total / (2.0*len(self.states)), 1.0)
+        for index, state in enumerate(self.states):
+            for cell in self._cells(state.x, state.y, state.width, state.height):
+                self.cells.setdefault(cell, []).append(index)
+
+    def _cell(self, x, y):
+        """ Return the (column, row) of the cell holding point (x,y) """
+        return (math.floor(x/self.cell_size), math.floor(y/self.cell_size))
+
+    def _cells(self, x, y, width, height):
+        """ Return the cells covered by the argument rectangle """
+        i_min, j_min = self._cell(x, y)
+        i_max, j_max = self._cell(x + width, y + height)
+        return [(i, j) for i in range(i_min, i_max+1) for j in range(j_min, j_max+1)]
+
+    def _rects(self):
+        """ Return the dictionary of the rectangles under which the states are
+            stored in the cells, indexed by the state position in self.states
+            (the dictionary is built when the grid is first updated)
+        """
+        if self.rects is None:
+            self.rects = {index: (state.x, state.y, state.width, state.height)
+                          for index, state in enumerate(self.states) if state is not None}
+            self.indices = {state: index for index, state in enumerate(self.states)
+                            if state is not None}
+        return self.rects
+
+    def position(self, state):
+        """ Return the position of the argument state in the iteration order """
+        self._rects()
+        return self.indices[state]
+
+    def add(self, state):
+        """ Add a state to the grid (the state comes last in the iteration order) """
+        rects = self._rects()
+        index = len(self.states)
+        self.states.append(state)
+        self.indices[state] = index
+        rects[index] = (state.x, state.y, state.width, state.height)
+        for cell in self._cells(*rects[index]):
+            self.cells.setdefault(cell, []).append(index)
+
+    def remove(self, state):
+        """ Remove a state from the grid """
+        rects = self._rects()
+        index = self.indices.pop(state)
+        for cell in self._cells(*rects.pop(index)):
+            self.cells[cell].remove(index)
+        self.states[index] = None
+
+    def move(self, state, x, y, width, height):
+        """ Change the position and size of a state of the grid (the state
+            keeps its place in the iteration order)
+        """
+        rects = self._rects()
+        index = self.indices[state]
+        for cell in self._cells(*rects[index]):
+            self.cells[cell].remove(index)
+        state.x, state.y, state.width, state.height = x, y, width, height
+        rects[index] = (x, y, width, height)
+        for cell in self._cells(*rects[index]):
+            bisect.insort(self.cells.setdefault(cell, []), index)
+
+    def find(self, x, y):
+        """ Return the last state which strictly contains point (x,y) or None """
+        # Cells hold state indices in increasing order: scan them backwards
+        for index in reversed(self.cells.get(self._cell(x, y), ())):
+            state = self.states[index]
+            if (x > state.x and 
+                x < state.x + state.width and
+                y > state.y and 
+                y < state.y + state.height):
+                return state
+        return None
+
+    def find_all(self, x, y):
+        """ Return the list of the states which strictly contain point (x,y) """
+        return [self.states[index] for index in self.cells.get(self._cell(x, y), ())
+                if (x > self.states[index].x and 
+                    x < self.states[index].x + self.states[index].width and
+                    y > self.states[index].y and 
+                    y < self.states[index].y + self.states[index].height)]
+
+
+def set_field(obj, keys, value):
+    """ Set the field at the argument path (a sequence of keys) in obj """
+    for key in keys[:-1]:
+        obj = obj.setdefault(key, {})
+    obj[keys[-1]] = value
+
+
+def load_model_stream(fd, fields):
+    """ Load the argument fields from the json model in the argument binary
+        file with the event-based parser of module ijson. The items of the 
+        'states' and 'connections' lists are built one at a time and only
+        the requested fields are kept.
+    """
+    model = {'globals': {}, 'states': [], 'connections': []}
+    leaves = {}     # Target (collection, keys) of each leaf prefix
+    for path in fields['globals']:
+        leaves['globals.'+path] = ('globals', path.split('.'))
+    for collection in ('states', 'connections'):
+        for path in fields[collection]:
+            leaves[collection+'.item.'+path] = (collection, path.split('.'))
+    items = {'states.item': 'states', 'connections.item': 'connections'}
+    item = None
+    for prefix, event, value in ijson.parse(fd, use_float=True):
+        if prefix in items:
+            if event == 'start_map':
+                item = {}
+            elif event == 'end_map':
+                model[items[prefix]].append(item)
+                item = None
+        elif prefix in leaves and event in ('string', 'number', 'boolean', 'null'):
+            collection, keys = leaves[prefix]
+            set_field(model['globals'] if collection == 'globals' else item, keys, value)
+    return model
+
+
+def load_model(json_file_name, fields=PR_FIELDS):
+    """ Load a json model and return a json object from which the
+        descriptor of the model can be built.
+        If module ijson is available, the model is parsed incrementally and
+        only the argument fields (see PR_FIELDS) are stored: this halves the
+        peak memory but is about 2.6 times slower than json.load (see the 
+        'load' benchmark of FwBench.py). Otherwise, the full model is 
+        returned by json.load. The descriptor built from the returned object
+        is the same in both cases.
+    """
+    if ijson is not None:
+        with open(json_file_name, 'rb') as fd:
+            return load_model_stream(fd, fields)
+    with open(json_file_name) as fd:
+        return json.load(fd)
+
+
+def get_model_type(json_obj):
+    """ Return 'Pr' if the argument json object holds a procedure, 'Sm' if
+        it holds a state machine and None otherwise (see get_pr_desc and
+        get_sm_desc: the editor type of a state machine may be missing)
+    """
+    editor_type = json_obj.get('globals', {}).get('fwprop', {}).get('editorType', '')
+    if editor_type == 'Pr':
+        return 'Pr'
+    if editor_type in ('Sm', ''):
+        return 'Sm'
+    return None
+
 
 def get_pr_desc(json_obj):
     """ 
@@ -19,6 +395,12 @@ def get_pr_desc(json_obj):
     - The dictionary of procedure states indexed by their ID
     - The list of connections in the procedures
     - The list of notes in the procedure
+    - The dictionary of notes indexed by their ID, the dictionary of notedots
+      indexed by their ID and the grid of the procedure states (these are 
+      used by apply_pr_delta)
+    The code generator may add to the descriptor a table of the names of
+    the generated symbols (key 'symbols', see FwGenCode.get_pr_symbols); 
+    the table is discarded by apply_pr_delta.
     
     A procedure 'state' is one of: (a) the initial pseudo-state;
     (b) the final pseudo-state, (c) an action node, or (d) a decision node.
@@ -32,6 +414,11 @@ def get_pr_desc(json_obj):
     list of states to which the note is attached and each state dictionary
     holds a list of notes to which it is attached.
     
+    States, connections and notes are instances of classes State, Connection
+    and Note. Their fields can be accessed either as attributes or as 
+    dictionary items. Connections also hold a reference to their source 
+    and target states (attributes from_state and to_state).
+    
     The 'is_do_nothing' attribute is attached to procedure states which 
     represent an action node whose action consists of the (case-insensitive)
     string 'do nothing'.
@@ -39,9 +426,9 @@ def get_pr_desc(json_obj):
     The is_else_guard attribute is attached to connections whose guard is
     equal to the (case-insensitive0 string 'else'.
     """    
-    globals_data = json_obj['globals']['fwprop']
-    if globals_data['editorType'] != 'Pr':
+    if get_model_type(json_obj) != 'Pr':
         return None
+    globals_data = json_obj['globals']['fwprop']
     pr_name = globals_data.get('smName', 'Unnamed Procedure')
     
     states = {}                 # Dictionary of states indexed by their name
@@ -49,89 +436,41 @@ def get_pr_desc(json_obj):
     notedots = {}               # Dictionary of notedots indexed by ID
     states_by_id = {}           # Dictionary of states indexed by their ID
     notes_by_id = {}            # Dictionary of notes indexed by their ID
-    states_by_notedot_id = {}   # Dictionary of states indexed by the ID of the notedot attached to them
     
     for item in json_obj.get('states', []):
-        item_id = item['id']
-        item_type = item['fwprop']['type']
-        item_name = item['fwprop'].get('identifier', None)
-        if item_type in ('init', 'final'):  # initial or final pseuod-node
-            item_name = item_type.capitalize()
-        
-        if item_type == "note":
-            note = {
-                'id': item_id,
-                'x': item['attrs']['x'],
-                'y': item['attrs']['y'],
-                'width': item['attrs']['width'],
-                'height': item['attrs']['height'],
-                'description': item['fwprop'].get('note', '').replace('\n',' '),
-                'to_states': []  # List of states to which the note is attached
-            }
-            notes.append(note)
-            notes_by_id[item_id] = note
-        elif item_type == "notedot":
-            notedots[item_id] = {
-                'id': item_id,
-                'x': item['attrs']['x'],
-                'y': item['attrs']['y']
-            }
+        pr_item = make_pr_item(item)
+        if type(pr_item) is Note:
+            notes.append(pr_item)
+            notes_by_id[pr_item.id] = pr_item
+        elif type(pr_item) is dict:
+            notedots[pr_item['id']] = pr_item
         else:   # The state is one of: IPN, FPN, Action Node, or Decision Node
-            key = item_name.capitalize() if item_type == 'choice' else item_name
-            description = item['fwprop'].get('entryDesc', '').replace('\n',' ')
-            is_do_nothing = (description.lower().strip() == 'do nothing')
-            state = {
-                'id': item_id,
-                'name': key,
-                'type': item_type,
-                'x': item['attrs']['x'],
-                'y': item['attrs']['y'],
-                'width': item['attrs']['width'],
-                'height': item['attrs']['height'],
-                'description': description,
-                'is_do_nothing': is_do_nothing,
-                'outgoing_connections': [],  # List of outgoing connections
-                'to_notes': []  # List of notes attached to the state
-            }
-            states[key] = state
-            states_by_id[item_id] = state
+            states[pr_item.name] = pr_item
+            states_by_id[pr_item.id] = pr_item
     
     # Check if a notedot is attached to a state
+    state_grid = StateGrid(states.values())
     for notedot_id, notedot in notedots.items():
-        for key, state in states.items():
-            if (notedot['x'] > state['x'] and 
-                notedot['x'] < state['x'] + state['width'] and
-                notedot['y'] > state['y'] and 
-                notedot['y'] < state['y'] + state['height']):
-                states_by_notedot_id[notedot['id']] = state
+        notedot['state'] = state_grid.find(notedot['x'], notedot['y'])
     
     # Extract connections
     connections = []
     for connection in json_obj.get('connections', []):
-        guard_desc = connection['fwprop'].get('guardDesc', '').replace('\n',' ')
-        is_else_guard = (guard_desc.lower().strip() == 'else')
-        conn_data = {
-            'from': connection['stateFromID'],
-            'to': connection['stateToID'],
-            'guardDesc': guard_desc,
-            'order': int(connection['fwprop']['order']),
-            'is_else_guard': is_else_guard
-        }
+        conn_data = make_pr_connection(connection, states_by_id)
         connections.append(conn_data)
         
         # Map each connection to its source state in the states dictionary
-        for key, state in states.items():
-            if state['id'] == conn_data['from']:
-                state['outgoing_connections'].append(conn_data)
+        if conn_data.from_state is not None:
+            conn_data.from_state.outgoing_connections.append(conn_data)
         
         # Check if the connection is between a note and a notedot attached to a state
-        for note in notes:
-            if note['id'] == conn_data['from'] and conn_data['to'] in notedots:
-                notedot = notedots[conn_data['to']]
-                if notedot['id'] in states_by_notedot_id:
-                    target_state = states_by_notedot_id[notedot['id']]
-                    target_state['to_notes'].append(note)
-                    note['to_states'].append(target_state)
+        if conn_data.from_id in notes_by_id and conn_data.to_id in notedots:
+            note = notes_by_id[conn_data.from_id]
+            notedot = notedots[conn_data.to_id]
+            notedot['notes'].append(note)
+            if notedot['state'] is not None:
+                notedot['state'].to_notes.append(note)
+                note.to_states.append(notedot['state'])
     
     # Create the refined dictionary
     desc = {
@@ -139,6 +478,531 @@ def get_pr_desc(json_obj):
         'states': states,
         'states_by_id': states_by_id,
         'connections': connections,
+        'notes': notes,
+        'notes_by_id': notes_by_id,
+        'notedots': notedots,
+        'state_grid': state_grid
+    }
+    
+    return desc
+
+
+def make_pr_item(item):
+    """ Return the procedure item represented by the argument json state
+        item: a Note, a State or (for a notedot) a dictionary holding the
+        notedot ID and position, the state to which it is attached (set 
+        by the caller) and the notes connected to it.
+    """
+    item_id = item['id']
+    item_type = item['fwprop']['type']
+    item_name = item['fwprop'].get('identifier', None)
+    if item_type in ('init', 'final'):  # initial or final pseuod-node
+        item_name = item_type.capitalize()
+    
+    if item_type == "note":
+        return Note(
+            id = item_id,
+            x = item['attrs']['x'],
+            y = item['attrs']['y'],
+            width = item['attrs']['width'],
+            height = item['attrs']['height'],
+            description = item['fwprop'].get('note', '').replace('\n',' '),
+            to_states = []  # List of states to which the note is attached
+        )
+    if item_type == "notedot":
+        return {
+            'id': item_id,
+            'x': item['attrs']['x'],
+            'y': item['attrs']['y'],
+            'state': None,
+            'notes': []
+        }
+    key = sys.intern(item_name.capitalize() if item_type == 'choice' else item_name)
+    description = item['fwprop'].get('entryDesc', '').replace('\n',' ')
+    is_do_nothing = (description.lower().strip() == 'do nothing')
+    return State(
+        id = item_id,
+        name = key,
+        type = sys.intern(item_type),
+        x = item['attrs']['x'],
+        y = item['attrs']['y'],
+        width = item['attrs']['width'],
+        height = item['attrs']['height'],
+        description = description,
+        is_do_nothing = is_do_nothing,
+        outgoing_connections = [],  # List of outgoing connections
+        to_notes = []  # List of notes attached to the state
+    )
+
+
+def make_pr_connection(connection, states_by_id):
+    """ Return the Connection represented by the argument json connection """
+    guard_desc = connection['fwprop'].get('guardDesc', '').replace('\n',' ')
+    is_else_guard = (guard_desc.lower().strip() == 'else')
+    return Connection(
+        from_id = connection['stateFromID'],
+        to_id = connection['stateToID'],
+        guard_desc = guard_desc,
+        order = int(connection['fwprop']['order']),
+        is_else_guard = is_else_guard,
+        from_state = states_by_id.get(connection['stateFromID'], None),
+        to_state = states_by_id.get(connection['stateToID'], None)
+    )
+
+
+def apply_pr_delta(pr_desc, delta):
+    """
+    Apply the argument delta to a procedure descriptor returned by get_pr_desc
+    and return a summary of the changes (see below). The descriptor is
+    updated in place: states, states_by_id, connections, outgoing_connections,
+    notes and the attachments of notes to states are updated without 
+    rebuilding the descriptor.
+    
+    The delta is a dictionary with (optional) keys 'states' and 'connections'.
+    Each value is a dictionary with (optional) keys:
+    - 'added': list of items in the format of the json model
+    - 'changed': list of items in the format of the json model; a state item
+      replaces the state (or note or notedot) with the same ID; a connection
+      item replaces the connection with the same end points
+    - 'removed': list of IDs of states (or notes or notedots) or list of
+      [stateFromID, stateToID] pairs for connections
+    States are processed before connections. The descriptor is the same as 
+    the one built by get_pr_desc from the updated model, except that notes
+    attached to the same state may be listed in a different order.
+    
+    The summary of the changes is a dictionary holding:
+    - 'nodes': True if action nodes were added, removed or renamed
+    - 'actions': set of the names of the action nodes whose description or
+      attached notes changed (including added, removed and renamed nodes)
+    - 'guards': set of the (source name, target name) pairs of the 
+      connections whose guard changed (including added and removed guards)
+    - 'structure': True if the control flow of the procedure changed
+    """
+    changes = {'nodes': False, 'actions': set(), 'guards': set(), 'structure': False}
+    states = pr_desc['states']
+    states_by_id = pr_desc['states_by_id']
+    notes_by_id = pr_desc['notes_by_id']
+    notedots = pr_desc['notedots']
+    grid = pr_desc['state_grid']
+    moved = []          # Rectangles (old and new) of the states which moved
+    renamed = False     # True if the states dictionary must be re-ordered
+    
+    def touch_state(state):
+        """ Record that the declaration of the argument state changed """
+        if state.type == 'state':
+            changes['actions'].add(state.name)
+
+    def touch_guards(state):
+        """ Record that the guards to and from the argument state changed """
+        for connection in state.outgoing_connections:
+            touch_guard(connection)
+        for connection in pr_desc['connections']:
+            if connection.to_state is state:
+                touch_guard(connection)
+
+    def touch_guard(connection):
+        """ Record that the guard of the argument connection changed """
+        if connection.from_state is not None and connection.to_state is not None:
+            if connection.guard_desc != '' and not connection.is_else_guard:
+                changes['guards'].add((connection.from_state.name, connection.to_state.name))
+
+    def set_notedot_state(notedot, state):
+        """ Attach the argument notedot (and its notes) to the argument state """
+        if notedot['state'] is state:
+            return
+        if notedot['state'] is not None:
+            for note in notedot['notes']:
+                notedot['state'].to_notes.remove(note)
+                note.to_states.remove(notedot['state'])
+            touch_state(notedot['state'])
+        notedot['state'] = state
+        if state is not None:
+            for note in notedot['notes']:
+                state.to_notes.append(note)
+                note.to_states.append(state)
+            touch_state(state)
+
+    def remove_item(item_id):
+        """ Remove the state, note or notedot with the argument ID """
+        if item_id in states_by_id:
+            state = states_by_id.pop(item_id)
+            del states[state.name]
+            grid.remove(state)
+            moved.append((state.x, state.y, state.width, state.height))
+            touch_state(state)
+            touch_guards(state)
+            changes['structure'] = True
+            changes['nodes'] = changes['nodes'] or state.type == 'state'
+            for connection in state.outgoing_connections:
+                connection.from_state = None
+            for connection in pr_desc['connections']:
+                if connection.to_state is state:
+                    connection.to_state = None
+        elif item_id in notes_by_id:
+            note = notes_by_id.pop(item_id)
+            pr_desc['notes'].remove(note)
+            for notedot in notedots.values():
+                while note in notedot['notes']:
+                    state = notedot['state']
+                    set_notedot_state(notedot, None)
+                    notedot['notes'].remove(note)
+                    set_notedot_state(notedot, state)
+        elif item_id in notedots:
+            set_notedot_state(notedots.pop(item_id), None)
+
+    def add_item(item):
+        """ Add the state, note or notedot represented by the json item """
+        pr_item = make_pr_item(item)
+        if type(pr_item) is Note:
+            pr_desc['notes'].append(pr_item)
+            notes_by_id[pr_item.id] = pr_item
+        elif type(pr_item) is dict:
+            notedots[pr_item['id']] = pr_item
+            set_notedot_state(pr_item, grid.find(pr_item['x'], pr_item['y']))
+        else:
+            states[pr_item.name] = pr_item
+            states_by_id[pr_item.id] = pr_item
+            grid.add(pr_item)
+            moved.append((pr_item.x, pr_item.y, pr_item.width, pr_item.height))
+            touch_state(pr_item)
+            changes['structure'] = True
+            changes['nodes'] = changes['nodes'] or pr_item.type == 'state'
+
+    def change_item(item):
+        """ Update the state, note or notedot with the ID of the json item """
+        nonlocal renamed
+        item_id = item['id']
+        new_item = make_pr_item(item)
+        if type(new_item) is State and item_id in states_by_id:
+            state = states_by_id[item_id]
+            if (state.type != new_item.type or state.name != new_item.name or
+                state.is_do_nothing != new_item.is_do_nothing):
+                touch_state(state)
+                changes['structure'] = True
+                changes['nodes'] = changes['nodes'] or ('state' in (state.type, new_item.type) and
+                                    (state.type, state.name) != (new_item.type, new_item.name))
+                is_renamed = (state.name != new_item.name)
+                if is_renamed:      # The names of the guard functions change
+                    touch_guards(state)
+                    del states[state.name]
+                    states[new_item.name] = state
+                    renamed = True
+                state.name = new_item.name
+                state.type = new_item.type
+                state.is_do_nothing = new_item.is_do_nothing
+                touch_state(state)
+                if is_renamed:
+                    touch_guards(state)
+            if state.description != new_item.description:
+                state.description = new_item.description
+                touch_state(state)
+            rect = (state.x, state.y, state.width, state.height)
+            if rect != (new_item.x, new_item.y, new_item.width, new_item.height):
+                grid.move(state, new_item.x, new_item.y, new_item.width, new_item.height)
+                moved.append(rect)
+                moved.append((state.x, state.y, state.width, state.height))
+        elif type(new_item) is Note and item_id in notes_by_id:
+            note = notes_by_id[item_id]
+            if note.description != new_item.description:
+                note.description = new_item.description
+                for state in note.to_states:
+                    touch_state(state)
+            note.x, note.y = new_item.x, new_item.y
+            note.width, note.height = new_item.width, new_item.height
+        elif type(new_item) is dict and item_id in notedots:
+            notedot = notedots[item_id]
+            notedot['x'], notedot['y'] = new_item['x'], new_item['y']
+            set_notedot_state(notedot, grid.find(notedot['x'], notedot['y']))
+        else:   # The item changed its kind (e.g. from note to state)
+            remove_item(item_id)
+            add_item(item)
+
+    def find_connection(from_id, to_id):
+        """ Return the connection with the argument end points or None """
+        state = states_by_id.get(from_id)
+        candidates = state.outgoing_connections if state is not None else pr_desc['connections']
+        for connection in candidates:
+            if connection.from_id == from_id and connection.to_id == to_id:
+                return connection
+        return None
+
+    def remove_connection(connection):
+        """ Remove the argument connection (but not from the connections list) """
+        touch_guard(connection)
+        if connection.from_state is not None and connection.to_state is not None:
+            changes['structure'] = True
+        if connection.from_state is not None:
+            connection.from_state.outgoing_connections.remove(connection)
+        if connection.from_id in notes_by_id and connection.to_id in notedots:
+            notedot = notedots[connection.to_id]
+            state = notedot['state']
+            set_notedot_state(notedot, None)
+            notedot['notes'].remove(notes_by_id[connection.from_id])
+            set_notedot_state(notedot, state)
+
+    def add_connection(connection):
+        """ Add the argument connection (but not to the connections list) """
+        if connection.from_state is not None:
+            connection.from_state.outgoing_connections.append(connection)
+        touch_guard(connection)
+        if connection.from_state is not None and connection.to_state is not None:
+            changes['structure'] = True
+        if connection.from_id in notes_by_id and connection.to_id in notedots:
+            notedot = notedots[connection.to_id]
+            state = notedot['state']
+            set_notedot_state(notedot, None)
+            notedot['notes'].append(notes_by_id[connection.from_id])
+            set_notedot_state(notedot, state)
+
+    state_delta = delta.get('states', {})
+    for item_id in state_delta.get('removed', []):
+        remove_item(item_id)
+    for item in state_delta.get('changed', []):
+        change_item(item)
+    for item in state_delta.get('added', []):
+        add_item(item)
+    if renamed:     # Restore the order of the states in the json model
+        ordered = sorted(states.values(), key=grid.position)
+        states.clear()
+        states.update((state.name, state) for state in ordered)
+
+    # Re-attach the notedots which lie inside a state which was added, 
+    # removed or moved
+    if len(moved) > 0:
+        for notedot in notedots.values():
+            x, y = notedot['x'], notedot['y']
+            for rx, ry, width, height in moved:
+                if x > rx and x < rx + width and y > ry and y < ry + height:
+                    set_notedot_state(notedot, grid.find(x, y))
+                    break
+
+    conn_delta = delta.get('connections', {})
+    removed = set()
+    for from_id, to_id in conn_delta.get('removed', []):
+        connection = find_connection(from_id, to_id)
+        if connection is not None:
+            remove_connection(connection)
+            removed.add(connection)
+    for item in conn_delta.get('changed', []):
+        connection = find_connection(item['stateFromID'], item['stateToID'])
+        new_connection = make_pr_connection(item, states_by_id)
+        if connection is None:
+            pr_desc['connections'].append(new_connection)
+            add_connection(new_connection)
+        elif (connection.guard_desc != new_connection.guard_desc or
+              connection.order != new_connection.order):
+            has_guard = (connection.guard_desc != '', connection.is_else_guard)
+            touch_guard(connection)
+            if (connection.order != new_connection.order or has_guard != 
+                (new_connection.guard_desc != '', new_connection.is_else_guard)):
+                changes['structure'] = True
+            connection.guard_desc = new_connection.guard_desc
+            connection.order = new_connection.order
+            connection.is_else_guard = new_connection.is_else_guard
+            touch_guard(connection)
+    for item in conn_delta.get('added', []):
+        connection = make_pr_connection(item, states_by_id)
+        pr_desc['connections'].append(connection)
+        add_connection(connection)
+    if len(removed) > 0:
+        pr_desc['connections'][:] = [c for c in pr_desc['connections'] if c not in removed]
+    pr_desc.pop('symbols', None)    # Rebuilt on demand by the code generator
+    return changes
+
+
+def get_sm_desc(json_obj):
+    """ 
+    Return a dictionary describing the state machine in the argument json object
+    If the json object does not contain a state machine, None is returned.
+    The state machine desriptor returned by this procedure holds:
+    - The state machine name
+    - The dictionary of states and choice pseudo-states indexed by their name
+    - The dictionary of states and pseudo-states indexed by their ID
+    - The list of state machines (the top-level state machine followed by
+      the embedded state machines)
+    - The list of transitions in the state machine
+    - The list of transition triggers (other than 'Execute')
+    - The list of notes in the state machine
+    
+    A state machine 'state' is one of: (a) an initial pseudo-state, (b) a 
+    final pseudo-state, (c) a choice pseudo-state, or (d) a proper state.
+    The initial and final pseudo-states of the top-level state machine are
+    called 'Init' and 'Final'. The initial and final pseudo-states of a state
+    machine embedded in state S are called 'SInit' and 'SFinal'. A choice
+    pseudo-state without identifier is called 'Choice' followed by its ID.
+    
+    A state drawn inside state S belongs to the state machine embedded in S. 
+    The state machines embedded in other models (attribute 'embed_sm_id') are
+    recorded in the descriptor but are not otherwise processed.
+    
+    States, transitions, state machines and notes are instances of classes 
+    SmState, SmTransition, SmMachine and Note. The per-state dispatch tables 
+    (attributes 'outgoing_transitions' and 'dispatch' of the states) are 
+    built once by this function so that code generators do not need to scan
+    the list of transitions.
+    
+    The is_else_guard attribute is attached to transitions whose guard is
+    equal to the (case-insensitive) string 'else'.
+    """
+    if get_model_type(json_obj) != 'Sm':
+        return None
+    globals_data = json_obj.get('globals', {}).get('fwprop', {})
+    sm_name = globals_data.get('smName', 'Unnamed State Machine')
+    
+    states = {}                 # Dictionary of states and choices indexed by their name
+    states_by_id = {}           # Dictionary of states indexed by their ID
+    notes = []                  # List of notes
+    notedots = {}               # Dictionary of notedots indexed by ID
+    notes_by_id = {}            # Dictionary of notes indexed by their ID
+    
+    for item in json_obj.get('states', []):
+        item_id = item['id']
+        fwprop = item['fwprop']
+        item_type = fwprop['type']
+        if item_type == "note":
+            note = Note(
+                id = item_id,
+                x = item['attrs']['x'],
+                y = item['attrs']['y'],
+                width = item['attrs']['width'],
+                height = item['attrs']['height'],
+                description = fwprop.get('note', '').replace('\n',' '),
+                to_states = []
+            )
+            notes.append(note)
+            notes_by_id[item_id] = note
+        elif item_type == "notedot":
+            notedots[item_id] = {
+                'id': item_id,
+                'x': item['attrs']['x'],
+                'y': item['attrs']['y']
+            }
+        else:   # The state is one of: IPS, FPS, CPS or proper state
+            name = fwprop.get('identifier', None)
+            if not name:    # Unnamed choices are made unique by their ID
+                name = item_type.capitalize() + (str(item_id) if item_type == 'choice' else '')
+            state = SmState(
+                id = item_id,
+                name = sys.intern(name),
+                type = sys.intern(item_type),
+                x = item['attrs']['x'],
+                y = item['attrs']['y'],
+                width = item['attrs']['width'],
+                height = item['attrs']['height'],
+                entry_desc = (fwprop.get('entryDesc', '') or '').replace('\n',' '),
+                do_desc = (fwprop.get('doDesc', '') or '').replace('\n',' '),
+                exit_desc = (fwprop.get('exitDesc', '') or '').replace('\n',' '),
+                embed_sm_id = fwprop.get('embedSmId', None),
+                note = (fwprop.get('note', '') or '').replace('\n',' ')
+            )
+            states_by_id[item_id] = state
+    
+    # Find the innermost proper state enclosing each state: the enclosing
+    # state must be strictly inside the bounding box of the enclosing state
+    all_states = list(states_by_id.values())
+    state_grid = StateGrid(state for state in all_states if state.type == 'state')
+    parents = {}
+    for state in all_states:
+        parent = None
+        for candidate in state_grid.find_all(state.x, state.y):
+            if (candidate is not state and 
+                candidate.x + candidate.width > state.x + state.width and
+                candidate.y + candidate.height > state.y + state.height and
+                (parent is None or 
+                 candidate.width*candidate.height < parent.width*parent.height)):
+                parent = candidate
+        parents[state.id] = parent
+    
+    # Create the state machines and assign the states to them
+    top_machine = SmMachine(sm_name, None)
+    machines = [top_machine]
+    for state in all_states:
+        parent = parents[state.id]
+        if parent is None:
+            machine = top_machine
+        else:
+            if parent.embedded is None:
+                parent.embedded = SmMachine(parent.name, parent)
+            machine = parent.embedded
+        state.machine = machine
+        if state.type in ('init', 'final') and parent is not None:
+            state.name = sys.intern(parent.name + state.name)
+        if state.type == 'init':
+            machine.init = state
+        elif state.type == 'final':
+            machine.finals.append(state)
+        elif state.type == 'choice':
+            machine.choices.append(state)
+            states[state.name] = state
+        else:
+            machine.states.append(state)
+            states[state.name] = state
+    # Embedded machines are listed in the order of their parent states 
+    i = 0
+    while i < len(machines):
+        for state in machines[i].states:
+            if state.embedded is not None:
+                machines.append(state.embedded)
+        i = i + 1
+    
+    # Check if a notedot is attached to a state: a notedot inside nested
+    # states is attached to the innermost (smallest) one
+    states_by_notedot_id = {}
+    state_grid = StateGrid(all_states)
+    for notedot_id, notedot in notedots.items():
+        candidates = state_grid.find_all(notedot['x'], notedot['y'])
+        if len(candidates) > 0:
+            states_by_notedot_id[notedot_id] = min(
+                candidates, key=lambda state: state.width*state.height)
+    
+    # Extract transitions
+    transitions = []
+    triggers = set()
+    for connection in json_obj.get('connections', []):
+        fwprop = connection['fwprop']
+        from_id = connection['stateFromID']
+        to_id = connection['stateToID']
+        if from_id in notes_by_id:  # Connection between a note and a notedot
+            if to_id in states_by_notedot_id:
+                note = notes_by_id[from_id]
+                target_state = states_by_notedot_id[to_id]
+                target_state.to_notes.append(note)
+                note.to_states.append(target_state)
+            continue
+        guard_desc = (fwprop.get('guardDesc', '') or '').replace('\n',' ')
+        trigger = fwprop.get('identifier', '') or ''
+        transition = SmTransition(
+            from_id = from_id,
+            to_id = to_id,
+            trigger = sys.intern(trigger) if trigger != '' else '',
+            guard_desc = guard_desc,
+            action_desc = (fwprop.get('actionDesc', '') or '').replace('\n',' '),
+            order = int(fwprop.get('order', 1)),
+            is_else_guard = (guard_desc.lower().strip() == 'else'),
+            note = (fwprop.get('note', '') or '').replace('\n',' '),
+            from_state = states_by_id.get(from_id, None),
+            to_state = states_by_id.get(to_id, None)
+        )
+        transitions.append(transition)
+        if transition.from_state is not None:
+            transition.from_state.outgoing_transitions.append(transition)
+            transition.from_state.machine.transitions.append(transition)
+            if transition.from_state.type == 'state' and trigger not in ('', 'Execute'):
+                triggers.add(trigger)
+    
+    # Build the per-state dispatch tables
+    for state in all_states:
+        state.outgoing_transitions.sort(key=lambda x: x.order)
+        for transition in state.outgoing_transitions:
+            state.dispatch.setdefault(transition.trigger, []).append(transition)
+    
+    desc = {
+        'name': sm_name,
+        'states': states,
+        'states_by_id': states_by_id,
+        'machines': machines,
+        'transitions': transitions,
+        'triggers': sorted(triggers),
         'notes': notes
     }
     
@@ -148,10 +1012,10 @@ def get_pr_desc(json_obj):
 def main(argv):
     """ Dummy main to be used to test functions defined in module """
     json_file_name = argv[0]
-    with open(json_file_name) as fd:
-        json_obj = json.load(fd)
-        pr_desc = get_pr_desc(jsonFileName, json_obj)
-        import pdb; pdb.set_trace()         
+    json_obj = load_model(json_file_name, SM_FIELDS)
+    pr_desc = get_pr_desc(json_obj)
+    sm_desc = get_sm_desc(json_obj)
+    import pdb; pdb.set_trace()         
     return
 
 if __name__ == "__main__":
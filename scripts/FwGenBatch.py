@@ -0,0 +1,176 @@
+""" Script to generate the implementation of many FW Profile Procedures
+and State Machines.
+This script runs the code generators of modules FwGenCode (procedures) and
+FwGenSmCode (state machines) on a set of json models in one single process.
+The generator of each model is selected by the editor type of the model
+(see FwDesc.get_model_type). The generation of the models is distributed 
+over a pool of worker processes.
+
+The batch generator script is called as follows:
+
+> python FwGenBatch.py [-j N] [--incremental] [--backend B] [--trace] 
+                       [--multi-instance] [--reproducible] [--profile File]
+                       CodeDirPath Model ...
+
+'Model' is either a json file, or a directory (in which case all the json
+files in the directory are processed), or a glob pattern (e.g. 'models/*.json').
+'CodeDirPath' is the path to the directory where the C code is generated.
+N is the number of worker processes (by default, the number of CPUs).
+Option '--incremental' skips the procedures which have not changed since
+the last generation (see FwGenCode).
+Options '--backend', '--trace', '--multi-instance' and '--reproducible' set
+the configuration parameters of FwGenCode with the same names (see 
+FwGenCode.main); they only apply to procedures.
+Option '--profile' writes the profile records of the generation phases of
+all models to the argument file (see FwGenCode.run_phase).
+
+A failure in the generation of one model does not stop the generation of
+the other models. A summary with the outcome of the generation and the
+time it took is printed for each model. The exit code is 1 if the
+generation of at least one model failed.
+"""
+
+__author__ = 'Alessandro Pasetti, P&P software GmbH'
+
+import os
+import sys
+import glob
+import time
+import argparse
+import concurrent.futures
+
+import FwDesc
+import FwGenCode
+import FwGenSmCode
+
+def get_model_files(models):
+    """ Return the sorted list of json files designated by the argument list
+        of files, directories and glob patterns (duplicates are removed).
+    """
+    files = set()
+    for model in models:
+        if os.path.isdir(model):
+            files.update(glob.glob(os.path.join(model, '*.json')))
+        elif os.path.isfile(model):
+            files.add(model)
+        elif any(c in model for c in '*?['):
+            files.update(glob.glob(model))
+        else:   # Missing file: it is reported as a failure by gen_model
+            files.add(model)
+    return sorted(files)
+
+
+def gen_code(json_file_name, dir_path):
+    """ Generate the code for the procedure or state machine in the argument 
+        json file in directory dir_path. The model is first processed as a 
+        procedure; if this fails and the model is a state machine, its code
+        is generated by FwGenSmCode (the model is then loaded a second time,
+        procedures are loaded once). Return False if the generation was 
+        skipped (see FwGenCode.gen_pr_code) and True otherwise.
+    """
+    try:
+        return FwGenCode.gen_pr_code(json_file_name, dir_path)
+    except ValueError:
+        if FwDesc.get_model_type(FwDesc.load_model(json_file_name, FwDesc.TYPE_FIELDS)) != 'Sm':
+            raise
+    FwGenSmCode.gen_sm_code(json_file_name, dir_path)
+    return True
+
+
+def gen_model(json_file_name, dir_path, config, profile=False):
+    """ Generate the code for one model with the argument configuration.
+        Return a tuple (json_file_name, duration, error, records) where error
+        is None if the generation was successful, 'skipped' if the model is
+        unchanged (incremental mode) or a string describing the error and
+        records is the list of the profile records of the generation phases
+        (empty if profile is False).
+    """
+    FwGenCode.set_config(config)
+    profiler = FwGenCode.Profiler()
+    if profile:
+        profiler.start()
+    start = time.perf_counter()
+    try:
+        error = None if gen_code(json_file_name, dir_path) else 'skipped'
+    except Exception as e:
+        error = type(e).__name__ + ': ' + str(e)
+    finally:
+        if profile:
+            profiler.stop()
+    return (json_file_name, time.perf_counter() - start, error, profiler.records)
+
+
+def gen_models(json_file_names, dir_path, n_workers=None, profile=False):
+    """ Generate the code for the argument json files in directory dir_path
+        using n_workers worker processes (if n_workers is 1, the code is
+        generated in the calling process). Return the list of the tuples
+        returned by gen_model, in the order of json_file_names.
+    """
+    config = FwGenCode.get_config()
+    if n_workers == 1 or len(json_file_names) <= 1:
+        return [gen_model(name, dir_path, config, profile) for name in json_file_names]
+    with concurrent.futures.ProcessPoolExecutor(n_workers) as executor:
+        futures = [executor.submit(gen_model, name, dir_path, config, profile)
+                   for name in json_file_names]
+        results = []
+        for name, future in zip(json_file_names, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:  # The worker process itself failed
+                results.append((name, 0.0, type(e).__name__ + ': ' + str(e), []))
+        return results
+
+
+def print_summary(results, total_time):
+    """ Print the outcome of the generation of each model """
+    n_failed = 0
+    for json_file_name, duration, error, records in results:
+        if error == None:
+            print('OK     %8.3f s  %s' % (duration, json_file_name))
+        elif error == 'skipped':
+            print('SKIP   %8.3f s  %s' % (duration, json_file_name))
+        else:
+            n_failed += 1
+            print('FAILED %8.3f s  %s: %s' % (duration, json_file_name, error))
+    print('%d models, %d failed, %.3f s' % (len(results), n_failed, total_time))
+
+
+def main(argv):
+    """ Generate the code for the models given on the command line """
+    parser = argparse.ArgumentParser(description='Generate the C code of FW Profile procedures '
+                                     'and state machines')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('dir_path', help='directory where the C code is generated')
+    parser.add_argument('models', nargs='+', help='json files, directories or glob patterns')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip unchanged models and keep unchanged files')
+    parser.add_argument('--backend', choices=('if', 'switch'), default=None,
+                        help='structure of the Execute function (see FwGenCode.pr_backend)')
+    parser.add_argument('--multi-instance', action='store_true',
+                        help='generate modules supporting several instances (see FwGenCode.multi_instance)')
+    parser.add_argument('--trace', action='store_true',
+                        help='generate trace points (see FwGenCode.trace)')
+    parser.add_argument('--reproducible', action='store_true',
+                        help='generate files which only depend on the models (see FwGenCode.reproducible)')
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help='write the profile of the generation phases to FILE (- for stdout)')
+    args = parser.parse_args(argv)
+
+    FwGenCode.incremental = FwGenCode.incremental or args.incremental
+    FwGenCode.trace = FwGenCode.trace or args.trace
+    FwGenCode.multi_instance = FwGenCode.multi_instance or args.multi_instance
+    FwGenCode.reproducible = FwGenCode.reproducible or args.reproducible
+    if args.backend is not None:
+        FwGenCode.pr_backend = args.backend
+    json_file_names = get_model_files(args.models)
+    start = time.perf_counter()
+    results = gen_models(json_file_names, args.dir_path, args.jobs, args.profile is not None)
+    print_summary(results, time.perf_counter() - start)
+    if args.profile is not None:
+        FwGenCode.write_profile([record for result in results for record in result[3]], 
+                                args.profile)
+    return 0 if all(result[2] in (None, 'skipped') for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -5,10 +5,31 @@ withthe FW Profile Editor.
 
 The generator script is called as follows:
 
-> python FwGenCode.py FwModel.json CodeDirPath
+> python FwGenCode.py [--incremental] [--backend if|switch] [--multi-instance]
+                       [--trace] [--node-profile File] [--reproducible] 
+                       [--profile File] FwModel.json CodeDirPath
     
 'FwModel.json' is the json representation of the procedure and 'CodeDirPath'
 is the path to the directory where the C code is generated. 
+With option '--incremental', the code is not re-generated if neither the model
+nor the generator have changed since the last generation in the same directory
+and a file is only written if its content other than the timestamp changes.
+Option '--backend' overrides the configuration parameter pr_backend.
+With option '--multi-instance', a module supporting several instances of the
+procedure is generated (see configuration parameter multi_instance).
+With option '--trace', trace points are generated (see configuration 
+parameter trace and script FwPrTrace.py).
+With option '--node-profile', the checks of the current node in the Execute
+function are ordered by decreasing frequency in the argument json profile 
+(see configuration parameter node_profile).
+With option '--reproducible', the generated files only depend on the model
+(see configuration parameter reproducible).
+With option '--profile', a json report holding the wall time, the memory
+allocated and the number of bytes written in each generation phase is
+written to the argument file (see run_phase).
+If 'CodeDirPath' ends with '.zip', the generated files are written to a zip
+archive with that name. Function gen_pr_files returns the generated files
+without writing them.
 
 The structure of the generated code can be controlled through the 
 configuration parameters defined at the beginning of this module.
@@ -37,12 +58,20 @@ procedure which privileges speed of execution over code memory usage.
 
 __author__ = 'Alessandro Pasetti, P&P software GmbH'
 
+import os
 import json
 import sys
-import pdb
+import hashlib
+import time
+import tracemalloc
+import warnings
+import argparse
 
-from Utilities import createHeaderFile, createBodyFile, writeDoxy
-from FwDesc import get_pr_desc
+import FwDesc
+import Utilities
+from Utilities import createHeaderFile, createBodyFile, writeDoxy, Emitter
+from Utilities import Sink, ZipSink, MemorySink
+from FwDesc import get_pr_desc, load_model
 
 """ Prefix for file names for files implementing procedures """
 fn_pr_prefix = 'FwPr'
@@ -56,38 +85,487 @@ fnc_pr_prefix = 'FwPr'
 d_ind = 4*' '
 """ If True, then no procedure counters are not generated """
 no_cnt = True
+""" Structure of the Execute function: 'if' for a sequence of checks on the
+    current node (one check per non-transient node) or 'switch' for a switch
+    statement on the current node (constant-time dispatch when the compiler
+    builds a jump table) """
+pr_backend = 'if'
+""" If True, transient nodes which are reached from more than one node are
+    generated only once as labelled blocks in the Execute function and are
+    reached through a goto (this keeps the size of the generated code linear 
+    in the size of the procedure when decision branches re-converge) """
+share_nodes = False
+""" If True, the generated module supports any number of instances of the
+    procedure: the state of the instances is held in arrays (one item per
+    instance) which are described by an instance data type defined in the 
+    header file and which are passed to the functions of the module together
+    with the index of an instance; the action and guard functions receive
+    the index of the instance; function ExecuteAll executes all instances
+    (see pr_create_header) """
+multi_instance = False
+""" Node residency profile: dictionary mapping the names of the nodes to 
+    their frequencies (for instance, the number of ticks spent in each node
+    as written by FwPrSim.py or FwPrTrace.py). If it is not None, the checks
+    of the current node in the Execute function are ordered by decreasing 
+    frequency (see get_check_order) """
+node_profile = None
+""" If True, trace points recording the node entries and the guard outcomes 
+    in a ring buffer are generated (see pr_create_header); the trace points
+    are compiled in only if macro <Prefix><Name>_TRACE (in upper case) is
+    defined and are otherwise compiled out entirely """
+trace = False
+""" If True, the procedure is validated before its code is generated (see
+    validate_pr_desc) """
+validate = True
+""" If True, the generated files only depend on the model and on the 
+    configuration parameters: the nodes and connections are generated in
+    the order of their names (instead of the order of the json model) and 
+    the generation timestamp is taken from environment variable 
+    SOURCE_DATE_EPOCH or is replaced by the hash of the model (see 
+    get_pr_hash and Utilities.getTimestamp) """
+reproducible = False
+""" If True, the code is only generated for models which have changed since
+    the last generation and files are only written if their content (other 
+    than the generation timestamp) has changed """
+incremental = False
+""" Name of the directory (in the code directory) holding the cache used in
+    incremental mode """
+cache_dir_name = '.FwGenCache'
+
+""" Names of the configuration parameters of this module """
+config_names = ('fn_pr_prefix', 'uh_pr_suffix', 'enum_pr_prefix', 'fnc_pr_prefix',
+                'd_ind', 'no_cnt', 'pr_backend', 'share_nodes', 'multi_instance', 'trace',
+                'node_profile', 'validate', 'reproducible', 'incremental', 'cache_dir_name')
 
 def get_guard_fnc(pr_desc, connection):
     """ Return the name of the function implementing the guard on the connection
         or None if the connection has no guard or the else guard """
     pr_name = pr_desc['name']
-    states = pr_desc['states']
-    states_by_id = pr_desc['states_by_id']
-    from_state = states_by_id[connection['from']]
-    to_state = states_by_id[connection['to']]
-    assert(from_state['type'] in ('init', 'state', 'choice'))
-    assert(to_state['type'] in ('final', 'state', 'choice'))
-    if connection['guardDesc'] == '' or connection['is_else_guard']:
+    from_state = connection.from_state
+    to_state = connection.to_state
+    assert(from_state is not None and from_state.type in ('init', 'state', 'choice'))
+    assert(to_state is not None and to_state.type in ('final', 'state', 'choice'))
+    if connection.guard_desc == '' or connection.is_else_guard:
         return None
-    return fnc_pr_prefix+pr_name+from_state['name']+to_state['name']
+    return fnc_pr_prefix+pr_name+from_state.name+'To'+to_state.name
     
     
 def get_node_name(pr_desc, state):
     """ Return the name of the enumerator holding the name of the node
         represented by the argument state
     """
-    assert(state['type'] in ('init', 'final', 'state'))
+    assert(state.type in ('init', 'final', 'state'))
     pr_name = pr_desc['name']
-    return enum_pr_prefix+pr_name+state['name']
+    return enum_pr_prefix+pr_name+state.name
 
     
 def get_node_fnc(pr_desc, state):
     """ Return the name of the function implementing the action of the node
         represented by the argument state
     """
-    assert(state['type'] in ('state'))
+    assert(state.type in ('state'))
     pr_name = pr_desc['name']
-    return fnc_pr_prefix+pr_name+state['name']
+    return fnc_pr_prefix+pr_name+state.name
+    
+    
+def get_node_label(pr_desc, state):
+    """ Return the name of the label of the code block implementing the
+        argument state when the state is shared (see share_nodes)
+    """
+    return 'L'+state.name
+
+
+def is_node_transient(pr_desc, state):
+    """ Return True if the argument state represents a transient procedure node.
+        A transient node is either a decision node or a final node, or an action  
+        node whose out-going connection has either no guard or has an else guard.
+        Or, equivalently, a non-transient node is either the initial node or an
+        action node with a non-else guard on its out-going connection (a 
+        decision node is transient whatever the number of its out-going
+        connections).
+        A non-transient node is a node where the procedure may pause while waiting
+        to be executed.
+    """
+    assert(state.type in ('init', 'final', 'state', 'choice'))
+    if state.type == 'init':
+        return False
+    if state.type != 'state' or len(state.outgoing_connections) != 1:
+        return True
+    if get_guard_fnc(pr_desc, state.outgoing_connections[0]) == None:
+        return True
+    return False
+
+
+def get_pr_hash(pr_desc):
+    """ Return the hash of the procedure in the argument descriptor. The hash
+        only depends on the parts of the procedure from which code is 
+        generated (and not on the order of the nodes and connections in the
+        json model or on their position).
+    """
+    states = sorted(pr_desc['states'].values(), key=lambda state: state.name)
+    connections = sorted((c.from_state.name, c.to_state.name, c.order, c.guard_desc, 
+                          c.is_else_guard) for c in pr_desc['connections'] 
+                         if c.from_state is not None and c.to_state is not None)
+    model = [pr_desc['name'],
+             [(state.name, state.type, state.description, state.is_do_nothing,
+               sorted(note.description for note in state.to_notes)) for state in states],
+             connections]
+    return hashlib.sha256(json.dumps(model).encode()).hexdigest()
+
+
+def get_pr_symbols(pr_desc):
+    """ Return the table of the names of the symbols generated for the
+        procedure in the argument descriptor. The table is a dictionary 
+        holding:
+        - 'node_names': the enumerator of each initial, final and action
+          node (see get_node_name) indexed by node ID
+        - 'node_fncs': the action function of each action node (see 
+          get_node_fnc) indexed by node ID
+        - 'guard_fncs': the guard function of each connection between two
+          nodes (see get_guard_fnc) indexed by connection
+        - 'transient': the transient flag of each node (see 
+          is_node_transient) indexed by node ID
+        - 'stopped': the enumerator of the stopped state of the procedure
+        - 'states': the list of the nodes in the order in which they are
+          generated (the order of the json model or, in reproducible mode,
+          the order of their names)
+        - 'connections': the list of the connections between two nodes in
+          the order in which they are generated (the order of the json model
+          or, in reproducible mode, the order of the names of their end 
+          points and of their order attribute)
+        - 'guard_ids': the identifier of each connection with a guard (its
+          index in the list of the connections with a guard) indexed by
+          connection (see trace)
+        - 'timestamp': the generation timestamp in reproducible mode or None
+        The table is built once and is stored in the descriptor under key
+        'symbols'; it is rebuilt if the naming configuration parameters
+        or the reproducible mode have changed since it was built.
+    """
+    key = (pr_desc['name'], enum_pr_prefix, fnc_pr_prefix, reproducible)
+    symbols = pr_desc.get('symbols')
+    if symbols is not None and symbols['key'] == key:
+        return symbols
+    node_names = {}
+    node_fncs = {}
+    guard_fncs = {}
+    transient = {}
+    states = list(pr_desc['states'].values())
+    connections = [connection for connection in pr_desc['connections'] 
+                   if connection.from_state is not None and connection.to_state is not None]
+    timestamp = None
+    if reproducible:
+        states.sort(key=lambda state: state.name)
+        connections.sort(key=lambda c: (c.from_state.name, c.to_state.name, c.order))
+        timestamp = Utilities.getTimestamp(get_pr_hash(pr_desc))
+    for connection in connections:
+        guard_fncs[connection] = get_guard_fnc(pr_desc, connection)
+    for state in states:
+        if state.type != 'choice':
+            node_names[state.id] = get_node_name(pr_desc, state)
+        if state.type == 'state':
+            node_fncs[state.id] = get_node_fnc(pr_desc, state)
+        # Same rule as is_node_transient
+        transient[state.id] = state.type != 'init' and \
+            (state.type != 'state' or len(state.outgoing_connections) != 1 or 
+             guard_fncs[state.outgoing_connections[0]] == None)
+    guard_ids = {}
+    for connection in connections:
+        if guard_fncs[connection] != None:
+            guard_ids[connection] = len(guard_ids)
+    symbols = {'key': key, 'node_names': node_names, 'node_fncs': node_fncs,
+               'guard_fncs': guard_fncs, 'transient': transient, 
+               'stopped': enum_pr_prefix+pr_desc['name']+'Stopped', 'states': states,
+               'connections': connections, 'guard_ids': guard_ids, 'timestamp': timestamp}
+    pr_desc['symbols'] = symbols
+    return symbols
+
+
+def get_sccs(nodes, get_successors):
+    """ Return the strongly connected components of the graph of the argument
+        nodes (a node is connected to the nodes returned by get_successors
+        for it, which must be in the argument list) as lists of nodes. The
+        components are returned in reverse topological order (a component
+        comes after all the components which can be reached from it) and
+        the last node of each component is its root (the first node of the
+        component reached by the search).
+        The components are found in linear time by an iterative version of
+        Tarjan's algorithm.
+    """
+    index = {}
+    low = {}
+    on_stack = set()
+    scc_stack = []
+    sccs = []
+    for root in nodes:
+        if root.id in index:
+            continue
+        work = [(root, iter(get_successors(root)))]
+        index[root.id] = low[root.id] = len(index)
+        scc_stack.append(root)
+        on_stack.add(root.id)
+        while len(work) > 0:
+            node, succs = work[-1]
+            for succ in succs:
+                if succ.id not in index:
+                    index[succ.id] = low[succ.id] = len(index)
+                    scc_stack.append(succ)
+                    on_stack.add(succ.id)
+                    work.append((succ, iter(get_successors(succ))))
+                    break
+                if succ.id in on_stack:
+                    low[node.id] = min(low[node.id], index[succ.id])
+            else:
+                work.pop()
+                if len(work) > 0:
+                    parent = work[-1][0]
+                    low[parent.id] = min(low[parent.id], low[node.id])
+                if low[node.id] == index[node.id]:
+                    scc = []
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack.discard(member.id)
+                        scc.append(member)
+                        if member is node:
+                            break
+                    sccs.append(scc)
+    return sccs
+
+
+def validate_pr_desc(pr_desc):
+    """ Check that code can be generated for the procedure in the argument
+        descriptor and return the list of the problems found as (level, 
+        message) pairs where level is 'error' (no correct code can be 
+        generated) or 'warning'. The following checks are done in time 
+        linear in the size of the procedure:
+        - node names are valid and unique C identifiers
+        - the identifiers generated for the nodes and guards (see 
+          get_pr_symbols) are distinct from each other and from the other
+          identifiers of the module (for instance, an action node called
+          'Stopped' clashes with the enumerator of the stopped state)
+        - there is one initial node and it has no incoming connection
+        - connections link existing nodes
+        - the initial node and the action nodes have one out-going 
+          connection, the final node has none
+        - the out-going connections of a decision node have the orders 1 to N
+          and only the last one has no guard (or the else guard): without an
+          else branch, the Execute function would loop forever when all the
+          guards of the decision node are false
+        - all nodes are reachable from the initial node (warning)
+        - there is no cycle of transient nodes (the code for such a cycle
+          would never return); a cycle through a decision node is only
+          accepted when shared nodes are enabled (see share_nodes)
+    """
+    diagnostics = []
+    def error(message):
+        diagnostics.append(('error', message))
+    def warning(message):
+        diagnostics.append(('warning', message))
+
+    nodes = list(pr_desc['states_by_id'].values())
+    n_names = {}
+    for node in nodes:
+        n_names[node.name] = n_names.get(node.name, 0) + 1
+    for name, n in n_names.items():
+        if n > 1:
+            error('%d nodes have the name %s' % (n, name))
+        if not name.isidentifier() or not name.isascii():
+            error('node name %r is not a valid C identifier' % name)
+    inits = [node for node in nodes if node.type == 'init']
+    if len(inits) != 1:
+        error('the procedure has %d initial nodes instead of 1' % len(inits))
+
+    n_incoming = dict.fromkeys(pr_desc['states_by_id'], 0)
+    for connection in pr_desc['connections']:
+        if connection.from_id in pr_desc['notes_by_id']:
+            continue    # Connection from a note to a notedot
+        if connection.from_state is None or connection.to_state is None:
+            error('connection from %s to %s has an unknown end point' % 
+                  (connection.from_id, connection.to_id))
+            continue
+        n_incoming[connection.to_id] += 1
+    for node in inits:
+        if n_incoming[node.id] > 0:
+            error('the initial node has incoming connections')
+
+    for node in nodes:
+        outgoing = [c for c in node.outgoing_connections if c.to_state is not None]
+        if node.type in ('init', 'state') and len(outgoing) != 1:
+            error('node %s has %d out-going connections instead of 1' % (node.name, len(outgoing)))
+        elif node.type == 'final' and len(outgoing) > 0:
+            error('the final node has out-going connections')
+        elif node.type == 'choice':
+            if len(outgoing) == 0:
+                error('decision node %s has no out-going connections' % node.name)
+                continue
+            orders = sorted(c.order for c in outgoing)
+            if orders != list(range(1, len(orders)+1)):
+                error('the out-going connections of decision node %s have orders %s '
+                      'instead of 1 to %d' % (node.name, orders, len(orders)))
+                continue
+            outgoing.sort(key=lambda c: c.order)
+            for c in outgoing[:-1]:
+                if get_guard_fnc(pr_desc, c) == None:
+                    error('branch %d of decision node %s has no guard but is not the last one' % 
+                          (c.order, node.name))
+            if get_guard_fnc(pr_desc, outgoing[-1]) != None:
+                error('decision node %s has no else branch' % node.name)
+    if any(level == 'error' for level, message in diagnostics):
+        return diagnostics  # The graph checks assume a well-formed procedure
+
+    # Clashes between the generated identifiers
+    pr_name = pr_desc['name']
+    symbols = get_pr_symbols(pr_desc)
+    owners = {}     # Owners of each generated identifier
+    def declare(identifier, owner):
+        owners.setdefault(identifier, []).append(owner)
+    declare(symbols['stopped'], 'the stopped state')
+    declare(enum_pr_prefix+pr_name+'Nodes_t', 'the node type')
+    fncs = ['Start', 'Stop', 'Execute', 'IsStarted', 'GetCurNode']
+    if not no_cnt:
+        fncs += ['GetPrExecCnt', 'GetNodeExecCnt']
+    if multi_instance:
+        fncs += ['ExecuteAll', 'Inst_t']
+    if trace:
+        fncs += ['TraceBuf', 'TraceCnt', 'TraceRec_t']
+    for fnc in fncs:
+        declare(fnc_pr_prefix+pr_name+fnc, 'the module interface')
+    for node in symbols['states']:
+        if node.type in ('init', 'state'):
+            declare(symbols['node_names'][node.id], 'node '+node.name)
+        if node.type == 'state' and not node.is_do_nothing:
+            declare(symbols['node_fncs'][node.id], 'the action of node '+node.name)
+    for connection in symbols['connections']:
+        if symbols['guard_fncs'][connection] != None:
+            declare(symbols['guard_fncs'][connection], 'the guard from %s to %s' % 
+                    (connection.from_state.name, connection.to_state.name))
+    for identifier, owner_list in owners.items():
+        if len(owner_list) > 1:
+            error('identifier %s is generated for %s' % (identifier, ' and '.join(owner_list)))
+
+    # Reachability from the initial node
+    reached = set([inits[0].id])
+    stack = [inits[0]]
+    while len(stack) > 0:
+        for connection in stack.pop().outgoing_connections:
+            if connection.to_id not in reached:
+                reached.add(connection.to_id)
+                stack.append(connection.to_state)
+    for node in nodes:
+        if node.id not in reached:
+            warning('node %s is not reachable from the initial node' % node.name)
+
+    # Cycles of transient nodes
+    transient = set(node_id for node_id, is_transient in 
+                    get_pr_symbols(pr_desc)['transient'].items() if is_transient)
+    def get_successors(node):
+        return [c.to_state for c in node.outgoing_connections if c.to_id in transient]
+    for scc in get_sccs([node for node in nodes if node.id in transient], get_successors):
+        node = scc[-1]
+        if len(scc) > 1 or any(c.to_state is node for c in node.outgoing_connections):
+            names = ', '.join(sorted(member.name for member in scc))
+            if all(member.type != 'choice' for member in scc):
+                error('the nodes %s form a cycle without guards' % names)
+            elif not share_nodes:
+                error('the nodes %s form a cycle of transient nodes '
+                      '(it can only be generated with share_nodes)' % names)
+    return diagnostics
+
+
+def check_pr_desc(pr_desc):
+    """ Validate the procedure in the argument descriptor (see validate_pr_desc).
+        The warnings are issued through the warnings module and a ValueError
+        listing the errors is raised if there are errors.
+    """
+    diagnostics = validate_pr_desc(pr_desc)
+    for level, message in diagnostics:
+        if level == 'warning':
+            warnings.warn(pr_desc['name'] + ': ' + message)
+    errors = [message for level, message in diagnostics if level == 'error']
+    if len(errors) > 0:
+        raise ValueError('procedure ' + pr_desc['name'] + ' is not valid:\n  ' + 
+                         '\n  '.join(errors))
+
+
+def get_inst_type(pr_desc):
+    """ Return the name of the instance data type of the procedure (see 
+        multi_instance)
+    """
+    return fnc_pr_prefix+pr_desc['name']+'Inst_t'
+
+
+def get_trace_macro(pr_desc):
+    """ Return the name of the macro which enables the trace points of the
+        procedure (see trace)
+    """
+    return (fn_pr_prefix+pr_desc['name']).replace('_','').upper()+'_TRACE'
+
+
+def get_trace_names(pr_desc):
+    """ Return the names of the events recorded in the trace buffer of the
+        procedure (see trace): the list of the node names indexed by node
+        identifier (the identifier of the stopped state is 0 and its name 
+        is 'Stopped') and the list of the (source name, target name) pairs
+        of the guards indexed by guard identifier
+    """
+    symbols = get_pr_symbols(pr_desc)
+    names = ['Stopped', None]
+    for state in symbols['states']:
+        if state.type == 'init':
+            names[1] = state.name
+        elif state.type == 'state':
+            names.append(state.name)
+    guards = [None]*len(symbols['guard_ids'])
+    for connection, guard_id in symbols['guard_ids'].items():
+        guards[guard_id] = (connection.from_state.name, connection.to_state.name)
+    return names, guards
+
+
+def check_trace_ids(pr_desc):
+    """ Raise a ValueError if the identifiers of the nodes or of the guards
+        of the procedure do not fit in the 16-bit event of the trace records
+        (see pr_create_header): the node identifiers must be lower than 
+        0x8000 and the guard identifiers must be lower than 0x4000
+    """
+    names, guards = get_trace_names(pr_desc)
+    if len(names) > 0x8000:
+        raise ValueError('procedure %s has too many action nodes for the trace records: '
+                         '%d node identifiers, at most %d' % (pr_desc['name'], len(names), 0x8000))
+    if len(guards) > 0x4000:
+        raise ValueError('procedure %s has too many guards for the trace records: '
+                         '%d guard identifiers, at most %d' % (pr_desc['name'], len(guards), 0x4000))
+
+
+def get_check_order(pr_desc):
+    """ Return the non-transient nodes of the procedure in the order in which
+        they are checked by the Execute function: the order of the symbol
+        table (see get_pr_symbols) or, if a node profile is given (see
+        node_profile), the order of decreasing frequency (nodes which are
+        not in the profile come last, in the order of the symbol table).
+        A warning is issued for the nodes in the profile which are not in 
+        the procedure.
+    """
+    symbols = get_pr_symbols(pr_desc)
+    nodes = [node for node in symbols['states'] if not symbols['transient'][node.id]]
+    if node_profile is None:
+        return nodes
+    unknown = set(node_profile) - set(node.name for node in symbols['states']) - set(['Stopped'])
+    if len(unknown) > 0:
+        warnings.warn(pr_desc['name'] + ': nodes in the profile which are not in the procedure: ' + 
+                      ', '.join(sorted(unknown)))
+    return sorted(nodes, key=lambda node: -node_profile.get(node.name, 0))
+
+
+def get_shared_nodes(pr_desc):
+    """ Return the set of the IDs of the shared procedure nodes.
+        A shared node is an action or decision node with more than one
+        incoming connection.
+    """
+    n_incoming = {}
+    for connection in pr_desc['connections']:
+        if connection.from_state is not None:
+            n_incoming[connection.to_id] = n_incoming.get(connection.to_id, 0) + 1
+    return set(state.id for state in pr_desc['states'].values() 
+               if state.type in ('state', 'choice') and n_incoming.get(state.id, 0) > 1)
     
     
 def pr_create_header(pr_desc, dir_path):
@@ -96,43 +574,125 @@ def pr_create_header(pr_desc, dir_path):
         the procedure; the functions to get the current node, the
         two procedure counters; and the enumerated type holding the node
         identifiers.
+        If multi_instance is True, the header file also defines the type
+        of the instance data (arrays holding the current node and the
+        counters of each instance) and the functions take as arguments
+        the instance data and the index of an instance (function ExecuteAll
+        executes all instances).
+        If trace is True, the header file also declares the trace buffer. 
+        The trace buffer is a ring buffer of <Prefix><Name>_TRACE_SIZE
+        records (a power of 2, by default: 256) written by a single writer 
+        (the procedure) and which may be read without locks: record i is
+        held in item i % <Prefix><Name>_TRACE_SIZE of the buffer and the
+        number of records written so far is held in a counter which is 
+        incremented after each record is complete (a barrier given by macro
+        <Prefix><Name>_TRACE_BARRIER() separates the stores of the record 
+        from the store of the counter: by default, a C11 release fence or, 
+        for GCC-compatible compilers in C99 mode, a compiler barrier; it must
+        be defined by the user for other compilers). A record holds a 32-bit
+        tick, a 16-bit event and the index of the instance (16 bits and 
+        always 0 in single-instance mode; 32 bits, after 16 unused bits, in 
+        multi-instance mode).
+        The event is the identifier of the node which is entered (0 if the
+        procedure terminates or is stopped) or 0x8000 + 2*g + v for the
+        evaluation of the guard with identifier g to the value v (see 
+        get_trace_names): a ValueError is raised if the identifiers do not
+        fit in the event (see check_trace_ids). The tick is given by macro <Prefix><Name>_TRACE_TICK() 
+        which, by default, counts the calls to the Execute function.
         The first argument is the descriptor of the procedure returned
         by function get_pr_desc. The second argument is the fully qualified
-        name of the directory where the file is generated.
+        name of the directory where the file is generated or the sink to
+        which it is written (see Utilities.getSink).
     """
     pr_name = pr_desc['name']
     
     # Define the enumerated type holding the node identifiers
-    s = ''
+    e = Emitter(d_ind)
     i = 0
-    s += writeDoxy(['Enumerated type for the procedure nodes'])
-    s += 'typedef enum {\n'
-    s += d_ind+enum_pr_prefix+pr_name+'Stopped'+' = 0;\n'
-    for state_name,state in pr_desc['states'].items():
-        if state['type'] == 'state':
+    e.write(writeDoxy(['Enumerated type for the procedure nodes']))
+    e.write('typedef enum {\n')
+    e.indent()
+    e.line(enum_pr_prefix+pr_name+'Stopped'+' = 0,')
+    e.line(enum_pr_prefix+pr_name+'Init'+' = 1,')
+    i = 1
+    symbols = get_pr_symbols(pr_desc)
+    node_names = symbols['node_names']
+    for state in symbols['states']:
+        if state.type == 'state':
             i = i+1
-            s += d_ind+enum_pr_prefix+pr_name+state_name+' = '+str(i)+';\n'
-    s+= '} '+enum_pr_prefix+pr_name+'Nodes_t;\n\n'
+            e.line(node_names[state.id]+' = '+str(i)+',')
+    e.dedent()
+    e.write('} '+enum_pr_prefix+pr_name+'Nodes_t;\n\n')
+
+    if trace:
+        check_trace_ids(pr_desc)
+        macro = get_trace_macro(pr_desc)
+        rec_type = fnc_pr_prefix+pr_name+'TraceRec_t'
+        e.write('#ifdef '+macro+'\n')
+        e.write('#include <stdint.h>\n')
+        e.write('#ifndef '+macro+'_SIZE\n')
+        e.write(writeDoxy(['Number of records of the trace buffer (a power of 2)']))
+        e.write('#define '+macro+'_SIZE 256\n')
+        e.write('#endif\n\n')
+        e.write(writeDoxy(['Record of the trace buffer of procedure '+pr_name,
+                           'The event is the identifier of the node which is entered or '
+                           '0x8000 + 2*guard identifier + guard value']))
+        e.write('typedef struct {\n')
+        e.indent()
+        e.line('uint32_t tick;')
+        e.line('uint16_t event;')
+        if multi_instance:
+            e.line('uint16_t unused;')
+            e.line('uint32_t inst;')
+        else:
+            e.line('uint16_t inst;')
+        e.dedent()
+        e.write('} '+rec_type+';\n\n')
+        e.write(writeDoxy(['Trace buffer: record i is held in item i % '+macro+'_SIZE']))
+        e.write('extern '+rec_type+' '+fnc_pr_prefix+pr_name+'TraceBuf['+macro+'_SIZE];\n\n')
+        e.write(writeDoxy(['Number of records written to the trace buffer']))
+        e.write('extern volatile uint32_t '+fnc_pr_prefix+pr_name+'TraceCnt;\n')
+        e.write('#endif\n\n')
+
+    params = ''
+    if multi_instance:
+        inst_type = get_inst_type(pr_desc)
+        params = inst_type+'* set, unsigned int inst'
+        e.write(writeDoxy(['Instance data of a set of instances of procedure '+pr_name,
+                           'Item i of each array holds the state of instance i. The '
+                           'arrays must initially hold zeros (all instances are stopped).']))
+        e.write('typedef struct {\n')
+        e.indent()
+        e.line(enum_pr_prefix+pr_name+'Nodes_t* curNode;')
+        if not no_cnt:
+            e.line('unsigned int* prExecCnt;')
+            e.line('unsigned int* nodeExecCnt;')
+        e.line('unsigned int n;')
+        e.dedent()
+        e.write('} '+inst_type+';\n\n')
   
-    s += writeDoxy(['Function to start procedure '+pr_name])
-    s += 'void '+fnc_pr_prefix+pr_name+'Start();\n\n'
-    s += writeDoxy(['Function to stop procedure '+pr_name])
-    s += 'void '+fnc_pr_prefix+pr_name+'Stop();\n\n'
-    s += writeDoxy(['Function to execute procedure '+pr_name])
-    s += 'void '+fnc_pr_prefix+pr_name+'Exec();\n\n'
-    s += writeDoxy(['Check the current state of procedure '+pr_name,
-                   '@return 0 if the procedure is not started; 1 otherwise'])
-    s += 'unsigned int '+fnc_pr_prefix+pr_name+'IsStarted();\n\n'
-    s += writeDoxy(['Get the current node of the procedure '+pr_name,
-                   '@return -1 if the procedure is stopped; otherwise the current node'])
-    s += enum_pr_prefix+pr_name+'Nodes_t'+pr_name+'GetCurNode();\n\n'
+    e.write(writeDoxy(['Function to start procedure '+pr_name]))
+    e.write('void '+fnc_pr_prefix+pr_name+'Start('+params+');\n\n')
+    e.write(writeDoxy(['Function to stop procedure '+pr_name]))
+    e.write('void '+fnc_pr_prefix+pr_name+'Stop('+params+');\n\n')
+    e.write(writeDoxy(['Function to execute procedure '+pr_name]))
+    e.write('void '+fnc_pr_prefix+pr_name+'Execute('+params+');\n\n')
+    if multi_instance:
+        e.write(writeDoxy(['Function to execute all instances of procedure '+pr_name]))
+        e.write('void '+fnc_pr_prefix+pr_name+'ExecuteAll('+inst_type+'* set);\n\n')
+    e.write(writeDoxy(['Check the current state of procedure '+pr_name,
+                       '@return 0 if the procedure is not started; 1 otherwise']))
+    e.write('unsigned int '+fnc_pr_prefix+pr_name+'IsStarted('+params+');\n\n')
+    e.write(writeDoxy(['Get the current node of the procedure '+pr_name,
+                       '@return -1 if the procedure is stopped; otherwise the current node']))
+    e.write(enum_pr_prefix+pr_name+'Nodes_t '+fnc_pr_prefix+pr_name+'GetCurNode('+params+');\n\n')
     if not no_cnt:
-        s += writeDoxy(['Get the procedure execution coounter for procedure '+pr_name, \
-                       '@return the execution counter of the procedure'])
-        s += 'unsigned int '+fnc_pr_prefix+pr_name+'GetPrExecCnt();\n\n'
-        s += writeDoxy(['Get the node execution counter for procedure '+pr_name, \
-                       '@return the execution counter of the procedure'])
-        s += 'unsigned int '+fnc_pr_prefix+pr_name+'GetNodeExecCnt();\n\n'
+        e.write(writeDoxy(['Get the procedure execution coounter for procedure '+pr_name, \
+                           '@return the execution counter of the procedure']))
+        e.write('unsigned int '+fnc_pr_prefix+pr_name+'GetPrExecCnt('+params+');\n\n')
+        e.write(writeDoxy(['Get the node execution counter for procedure '+pr_name, \
+                           '@return the execution counter of the procedure']))
+        e.write('unsigned int '+fnc_pr_prefix+pr_name+'GetNodeExecCnt('+params+');\n\n')
     
     func_desc = 'The functions declared in this file allow the user to  control ' + \
                 'the operation of the FW Profile procedure ' + pr_name + '.' + \
@@ -142,205 +702,674 @@ def pr_create_header(pr_desc, dir_path):
     if not no_cnt:
         func_desc = func_desc + \
                 '(c) Get the current value of procedure and node execution counters '
-    createHeaderFile(dir_path, fn_pr_prefix+pr_name, s, func_desc)
+    createHeaderFile(dir_path, fn_pr_prefix+pr_name, e.getparts(), func_desc, incremental,
+                     symbols['timestamp'])
     
     
 def pr_create_user_header(pr_desc, dir_path):
     """ Create the header file which declares the functions implementing
         the node actions and the guards.
     """
-    s = ''
-    i = 0
+    e = Emitter(d_ind)
     pr_name = pr_desc['name']
-    for state_name,state in pr_desc['states'].items():
-        i = i+1
-        if state['type'] == 'state' and not state['is_do_nothing']:
+    symbols = get_pr_symbols(pr_desc)
+    node_fncs = symbols['node_fncs']
+    guard_fncs = symbols['guard_fncs']
+    params = 'unsigned int inst' if multi_instance else ''
+    for state in symbols['states']:
+        if state.type == 'state' and not state.is_do_nothing:
             notes = []
-            for note in state['to_notes']:
+            to_notes = state.to_notes
+            if reproducible:
+                to_notes = sorted(to_notes, key=lambda note: note.description)
+            for note in to_notes:
                 notes.append('')
-                notes.append(note['description'])
-            s += writeDoxy(['Function implementing the action for node '+state_name, \
-                            state['description']] + notes)
-            s += 'void '+fnc_pr_prefix+pr_name+state_name+'();\n\n'
+                notes.append(note.description)
+            e.write(writeDoxy(['Function implementing the action for node '+state.name, \
+                               state.description] + notes))
+            e.write('void '+node_fncs[state.id]+'('+params+');\n\n')
 
-    i = 0
-    for connection in pr_desc['connections']:
-        i = i+1
-        if (connection['guardDesc'] != '') and not connection['is_else_guard']:
-            src_state_name = pr_desc['states_by_id'][connection['from']]['name']
-            dest_state_name = pr_desc['states_by_id'][connection['to']]['name']
-            connection_name = pr_name + src_state_name + 'To' + dest_state_name
-            s += writeDoxy(['Function implementing the guard from '+src_state_name+\
-                            ' to '+dest_state_name, connection['guardDesc']])
-            s += 'void '+fnc_pr_prefix+pr_name+connection_name+'();\n\n'
+    for connection in symbols['connections']:
+        guard_fnc = guard_fncs[connection]
+        if guard_fnc != None:
+            src_state_name = connection.from_state.name
+            dest_state_name = connection.to_state.name
+            e.write(writeDoxy(['Function implementing the guard from '+src_state_name+\
+                               ' to '+dest_state_name, connection.guard_desc,
+                               '@return 1 if the guard is true; 0 otherwise']))
+            e.write('int '+guard_fnc+'('+params+');\n\n')
 
     func_desc =  'The functions in this file implement the actions and ' + \
                  'guards of the FW Profile procedure of ' + pr_name + '.' + \
                  'The user is responsible for providing a C body file which ' + \
                  'implements all the functions declared in this header file.' 
-    createHeaderFile(dir_path, fn_pr_prefix + pr_name + uh_pr_suffix, s, func_desc)
+    createHeaderFile(dir_path, fn_pr_prefix + pr_name + uh_pr_suffix, e.getparts(), 
+                     func_desc, incremental, symbols['timestamp'])
     
 
 def pr_create_body(pr_desc, dir_path):
     """ Create the body file for the procedure module.
         The first argument is the descriptor of the procedure returned
         by function get_pr_desc. The second argument is the fully qualified
-        name of the directory where the file is generated.
+        name of the directory where the file is generated or the sink to
+        which it is written (see Utilities.getSink).
+        If multi_instance is True, the state of the procedure is held in the
+        instance data passed to the functions (see pr_create_header) and
+        otherwise it is held in static variables.
+        If trace is True, the trace points are generated as macros which
+        are expanded to calls to the functions writing the trace buffer
+        if the trace macro is defined (see get_trace_macro) and to nothing
+        otherwise.
+        The Execute function follows the procedure semantics: when it enters
+        a non-transient node, it resumes its while(1) loop and evaluates the
+        guard on the out-going connection of that node; it only returns 
+        when this guard is false or when the final node is entered.
     """        
     pr_name = pr_desc['name']
-    states_by_id = pr_desc['states_by_id']
+    symbols = get_pr_symbols(pr_desc)
+    node_names = symbols['node_names']
+    node_fncs = symbols['node_fncs']
+    guard_fncs = symbols['guard_fncs']
+    transients = symbols['transient']
+    guard_ids = symbols['guard_ids']
+    stopped = symbols['stopped']
     
-    s = '#include <'+pr_name+'.h>\n\n'
-    s += writeDoxy(['The current procedure node'])
-    s += 'static '+enum_pr_prefix+pr_name+'Nodes_t curNode = FwPr'+pr_name+'Stopped;\n\n'
-    if not no_cnt:
-        s += writeDoxy(['The procedure execution counter'])
-        s += 'static unsigned int prExecCnt = 0;\n\n' 
-        s += writeDoxy(['The node execution counter'])
-        s += 'static unsigned int nodeExecCnt = 0;\n\n' 
+    e = Emitter(d_ind)
+    e.write('#include "'+fn_pr_prefix+pr_name+'.h"\n')
+    e.write('#include "'+fn_pr_prefix+pr_name+uh_pr_suffix+'.h"\n\n')
+    if multi_instance:
+        # The state of an instance is held in the items of the instance data
+        params = get_inst_type(pr_desc)+'* set, unsigned int inst'
+        args = 'inst'
+        cur_node = 'set->curNode[inst]'
+        pr_exec_cnt = 'set->prExecCnt[inst]'
+        node_exec_cnt = 'set->nodeExecCnt[inst]'
+    else:
+        params = ''
+        args = ''
+        cur_node = 'curNode'
+        pr_exec_cnt = 'prExecCnt'
+        node_exec_cnt = 'nodeExecCnt'
+    trace_inst = 'inst' if multi_instance else '0'
+
+    def guard_call(connection):
+        """ Return the call to the guard function on the argument connection """
+        call = guard_fncs[connection]+'('+args+')'
+        if trace:
+            call = 'TRACE_GUARD(%d, %s, %s)' % (guard_ids[connection], call, trace_inst)
+        return call
+
+    def trace_node(node_name):
+        """ Generate the trace point for the entry into the argument node """
+        if trace:
+            e.line('TRACE_NODE('+node_name+', '+trace_inst+');')
+
+    if trace:
+        check_trace_ids(pr_desc)
+        macro = get_trace_macro(pr_desc)
+        trace_cnt = fnc_pr_prefix+pr_name+'TraceCnt'
+        e.write('#ifdef '+macro+'\n')
+        e.write('#ifndef '+macro+'_TICK\n')
+        e.write(writeDoxy(['Default trace clock: number of calls to the Execute function']))
+        e.write('static uint32_t traceTick = 0;\n')
+        e.write('#define '+macro+'_TICK() traceTick\n')
+        e.write('#define TRACE_EXECUTE() traceTick++\n')
+        e.write('#else\n')
+        e.write('#define TRACE_EXECUTE()\n')
+        e.write('#endif\n\n')
+        e.write('#ifndef '+macro+'_BARRIER\n')
+        e.write(writeDoxy(['Default trace barrier: the stores of a record may not be '
+                           'moved after the store of the record counter']))
+        e.write('#if defined(__STDC_VERSION__) && __STDC_VERSION__ >= 201112L && '
+                '!defined(__STDC_NO_ATOMICS__)\n')
+        e.write('#include <stdatomic.h>\n')
+        e.write('#define '+macro+'_BARRIER() atomic_thread_fence(memory_order_release)\n')
+        e.write('#elif defined(__GNUC__)\n')
+        e.write('#define '+macro+'_BARRIER() __asm__ __volatile__("" ::: "memory")\n')
+        e.write('#else\n')
+        e.write('#error "'+macro+'_BARRIER() must be defined for this compiler"\n')
+        e.write('#endif\n')
+        e.write('#endif\n\n')
+        e.write(fnc_pr_prefix+pr_name+'TraceRec_t '+fnc_pr_prefix+pr_name+'TraceBuf['+macro+'_SIZE];\n')
+        e.write('volatile uint32_t '+trace_cnt+' = 0;\n\n')
+        e.write(writeDoxy(['Write a record to the trace buffer (the record is published '
+                           'by incrementing the record counter once it is complete)']))
+        e.write('static void trace(unsigned int event, unsigned int inst) {\n')
+        e.indent()
+        e.line('uint32_t cnt = '+trace_cnt+';')
+        e.line(fnc_pr_prefix+pr_name+'TraceRec_t* rec = &'+fnc_pr_prefix+pr_name+
+               'TraceBuf[cnt & ('+macro+'_SIZE-1)];')
+        e.line('rec->tick = '+macro+'_TICK();')
+        e.line('rec->event = (uint16_t)event;')
+        e.line('rec->inst = ('+('uint32_t' if multi_instance else 'uint16_t')+')inst;')
+        e.line(macro+'_BARRIER();')
+        e.line(trace_cnt+' = cnt + 1;')
+        e.dedent()
+        e.write('}\n\n')
+        if len(guard_ids) > 0:
+            e.write(writeDoxy(['Record the evaluation of a guard and return its value']))
+            e.write('static int traceGuard(unsigned int guard, int value, unsigned int inst) {\n')
+            e.indent()
+            e.line('trace(0x8000u | (guard << 1) | (value != 0), inst);')
+            e.line('return value;')
+            e.dedent()
+            e.write('}\n\n')
+        e.write('#define TRACE_NODE(node, inst) trace(node, inst)\n')
+        e.write('#define TRACE_GUARD(guard, value, inst) traceGuard(guard, value, inst)\n')
+        e.write('#else\n')
+        e.write('#define TRACE_EXECUTE()\n')
+        e.write('#define TRACE_NODE(node, inst)\n')
+        e.write('#define TRACE_GUARD(guard, value, inst) (value)\n')
+        e.write('#endif\n\n')
+
+    if not multi_instance:
+        e.write(writeDoxy(['The current procedure node']))
+        e.write('static '+enum_pr_prefix+pr_name+'Nodes_t curNode = '+stopped+';\n\n')
+        if not no_cnt:
+            e.write(writeDoxy(['The procedure execution counter']))
+            e.write('static unsigned int prExecCnt = 0;\n\n')
+            e.write(writeDoxy(['The node execution counter']))
+            e.write('static unsigned int nodeExecCnt = 0;\n\n')
     
-    s += 'unsigned int'+' '+fnc_pr_prefix+pr_name+'IsStarted() {\n'
-    s += d_ind+'return curNode != '+enum_pr_prefix+pr_name+'Stopped;\n'
-    s += '}\n\n'
+    e.write('unsigned int'+' '+fnc_pr_prefix+pr_name+'IsStarted('+params+') {\n')
+    e.write(d_ind+'return '+cur_node+' != '+stopped+';\n')
+    e.write('}\n\n')
     
-    s += enum_pr_prefix+pr_name+'Nodes_t '+fnc_pr_prefix+pr_name+'GetCurNode() {\n'
-    s += d_ind+'return curNode;\n'
-    s += '}\n\n'
+    e.write(enum_pr_prefix+pr_name+'Nodes_t '+fnc_pr_prefix+pr_name+'GetCurNode('+params+') {\n')
+    e.write(d_ind+'return '+cur_node+';\n')
+    e.write('}\n\n')
 
     if not no_cnt:
-        s += 'unsigned int '+fnc_pr_prefix+pr_name+'GetPrExecCnt() {\n'
-        s += d_ind+'return prExecCnt;\n'
-        s += '}\n\n'
+        e.write('unsigned int '+fnc_pr_prefix+pr_name+'GetPrExecCnt('+params+') {\n')
+        e.write(d_ind+'return '+pr_exec_cnt+';\n')
+        e.write('}\n\n')
 
-        s += 'unsigned int '+fnc_pr_prefix+pr_name+'GetNodeExecCnt() {\n'
-        s += d_ind+'return nodeExecCnt;\n'
-        s += '}\n\n'
+        e.write('unsigned int '+fnc_pr_prefix+pr_name+'GetNodeExecCnt('+params+') {\n')
+        e.write(d_ind+'return '+node_exec_cnt+';\n')
+        e.write('}\n\n')
  
-    s += 'void '+fnc_pr_prefix+pr_name+'Start() {\n'
-    s += d_ind+'if (curNode != '+enum_pr_prefix+pr_name+'Stopped)\n'
-    s += d_ind+d_ind+'return;\n'
-    s += d_ind+'curNode = '+enum_pr_prefix+pr_name+'Init;\n'
+    e.write('void '+fnc_pr_prefix+pr_name+'Start('+params+') {\n')
+    e.write(d_ind+'if ('+cur_node+' != '+stopped+')\n')
+    e.write(d_ind+d_ind+'return;\n')
+    e.write(d_ind+cur_node+' = '+enum_pr_prefix+pr_name+'Init;\n')
+    if trace:
+        e.write(d_ind+'TRACE_NODE('+enum_pr_prefix+pr_name+'Init, '+trace_inst+');\n')
     if not no_cnt:
-        s += d_ind+'prExecCnt = 0;\n'
-        s += d_ind+'nodeExecCnt = 0;\n'
-    s += '}\n\n'
-
-    s += 'void '+fnc_pr_prefix+pr_name+'Stop() {\n'
-    s += d_ind+'if (curNode == '+enum_pr_prefix+pr_name+'Stopped)\n'
-    s += d_ind+d_ind+'return;\n'
-    s += d_ind+'curNode = '+enum_pr_prefix+pr_name+'Stopped;\n'
-    s += '}\n\n'
+        e.write(d_ind+pr_exec_cnt+' = 0;\n')
+        e.write(d_ind+node_exec_cnt+' = 0;\n')
+    e.write('}\n\n')
+
+    e.write('void '+fnc_pr_prefix+pr_name+'Stop('+params+') {\n')
+    e.write(d_ind+'if ('+cur_node+' == '+stopped+')\n')
+    e.write(d_ind+d_ind+'return;\n')
+    e.write(d_ind+cur_node+' = '+stopped+';\n')
+    if trace:
+        e.write(d_ind+'TRACE_NODE('+stopped+', '+trace_inst+');\n')
+    e.write('}\n\n')
     
-    s += 'void '+fnc_pr_prefix+pr_name+'Execute() {\n'
-    s += d_ind+'if (curNode == '+enum_pr_prefix+pr_name+'Stopped)\n'
-    s += d_ind+d_ind+'return;\n'
+    e.write('void '+fnc_pr_prefix+pr_name+'Execute('+params+') {\n')
+    e.indent()
+    if multi_instance:
+        e.line(enum_pr_prefix+pr_name+'Nodes_t* const curNode = &'+cur_node+';')
+        cur_node = '*curNode'
+    e.line('if ('+cur_node+' == '+stopped+')')
+    e.line(d_ind+'return;')
+    if trace:
+        e.line('TRACE_EXECUTE();')
     if not no_cnt:
-        s += d_ind+'prExecCnt++;\n'
-        s += d_ind+'nodeExecCnt++;\n'
-    s += d_ind+'while (1) {\n'
-    n_ind = 2
-
-    def is_node_transient(pr_desc, state):
-        """ Return True if the argument state represents a transient procedure node.
-            A transient node is either a decision node or a final node, or an action  
-            node whose out-going connection has either no guard or has an else guard.
-            Or, equivalently, a non-transient node is either the initial node or a 
-            node with a non-else guard on its out-going connection.
-            A transient node is a node where the procedure may pause while waiting to
-            be executed.
-        """
-        assert(state['type'] in ('init', 'final', 'state', 'choice'))
-        if state['type'] == 'init':
-            return False
-        if len(state['outgoing_connections']) != 1:
-            return True
-        if get_guard_fnc(pr_desc, state['outgoing_connections'][0]) == None:
-            return True
-        return False
-    
-    def proc_sub_tree(n_ind, pr_desc, node):
-        """ Process the procedure sub-tree starting at 'node'
+        e.line(pr_exec_cnt+'++;')
+        e.line(node_exec_cnt+'++;')
+    e.line('while (1) {')
+    e.indent()
+    shared_nodes = get_shared_nodes(pr_desc) if share_nodes else set()
+    shared_queue = []           # Shared nodes which are the target of a goto
+    shared_queued = set()       # IDs of the nodes in shared_queue
+
+    def proc_sub_tree(pr_desc, node, is_reached=False):
+        """ Process the procedure sub-tree starting at 'node'.
             The argument node is one of the following: 
             (a) the final node: the execution is declared to have terminated
-            (b) a transient action node: the node action is executed and then the
-                function is called (recusively) on the next node
-            (c) a non-transient action node: the node action is executed
-            (d) a decision node: the function is called (recursively) on
-                each of the successor nodes
+            (b) a transient action node: the node action is executed and then
+                the sub-tree starting at the next node is processed
+            (c) a non-transient action node: the node action is executed and
+                the loop of the Execute function is resumed (the guard on 
+                the out-going connection of the node is then evaluated)
+            (d) a decision node: the sub-tree starting at each of the successor
+                nodes is processed
+            If is_reached is True, 'node' is reached from another node: if it
+            is then a shared node, only a goto to its code block is generated
+            (the block itself is generated after the node checks in the Execute
+            function).
+            The sub-trees are processed iteratively through an explicit stack 
+            of pending operations (a node to be processed, a line to be written
+            or a change of indentation) so that the depth of the procedure is 
+            not limited by the depth of the Python call stack.
+            The code is generated at the current indentation level of the emitter.
         """
-        nonlocal s
-        ind = d_ind*n_ind
-        if not is_node_transient(pr_desc, node):
-            s += ind + get_node_fnc(pr_desc, node)+'();\n'
-            return
-        if node['type'] == 'final':
-            s += ind + 'curNode = '+enum_pr_prefix+pr_name+'Stopped;\n'
-            s += ind + 'return;\n'
-        if node['type'] == 'state':
-            s += ind + 'curNode = ' + get_node_name(pr_desc,node) + ';\n'
-            s += ind + get_node_fnc(pr_desc, node)+'();\n'
-            next_node = states_by_id[node['outgoing_connections'][0]['to']]
-            proc_sub_tree(n_ind, pr_desc, next_node)
-        if node['type'] == 'choice':
-            sorted_connections = sorted(node['outgoing_connections'], key=lambda x: x['order'])
-            for connection in sorted_connections:
-                guard_fnc = get_guard_fnc(pr_desc, connection)
-                if connection['order'] > 1: 
-                    if guard_fnc != None:
-                        s += 'if ('+guard_fnc+'() == 1) {\n'
+        stack = [('node', node, is_reached)]
+        while len(stack) > 0:
+            op, arg, param = stack.pop()
+            if op == 'line':
+                e.line(arg, end=param)
+                continue
+            if op == 'write':
+                e.write(arg)
+                continue
+            if op == 'indent':
+                e.indent()
+                continue
+            if op == 'dedent':
+                e.dedent()
+                continue
+            node = arg
+            transient = transients[node.id]
+            if param and transient and node.id in shared_nodes:
+                if node.id not in shared_queued:
+                    shared_queue.append(node)
+                    shared_queued.add(node.id)
+                e.line('goto '+get_node_label(pr_desc, node)+';')
+            elif not transient:
+                e.line(cur_node+' = ' + node_names[node.id] + ';')
+                trace_node(node_names[node.id])
+                if not node.is_do_nothing:
+                    e.line(node_fncs[node.id]+'('+args+');')
+                e.line('continue;')
+            elif node.type == 'state':
+                e.line(cur_node+' = ' + node_names[node.id] + ';')
+                trace_node(node_names[node.id])
+                if not node.is_do_nothing:
+                    e.line(node_fncs[node.id]+'('+args+');')
+                stack.append(('node', node.outgoing_connections[0].to_state, True))
+            elif node.type == 'choice':
+                sorted_connections = sorted(node.outgoing_connections, key=lambda x: x.order)
+                ops = []
+                for connection in sorted_connections:
+                    guard_fnc = guard_fncs[connection]
+                    if connection.order > 1: 
+                        if guard_fnc != None:
+                            ops.append(('write', 'if ('+guard_call(connection)+' == 1) {\n', None))
+                        else:
+                            ops.append(('write', ' {\n', None))
                     else:
-                        s += ' {\n'
-                else:
-                    s += ind + 'if ('+guard_fnc+'() == 1) {\n'
-                order = connection['order']
-                next_node = states_by_id[sorted_connections[order-1]['to']]
-                proc_sub_tree(n_ind+1, pr_desc, next_node)
-                if connection['order'] < len(sorted_connections):
-                    s += n_ind*d_ind + '} else '
-                else:
-                    s += n_ind*d_ind + '}\n'
-        assert('false')
-        
-    for state_name, node in pr_desc['states'].items():
-        if not is_node_transient(pr_desc, node):
-            s += n_ind*d_ind + 'if (curNode == ' + get_node_name(pr_desc,node) + ') {\n' 
-            n_ind = n_ind + 1
-            guard_fnc = get_guard_fnc(pr_desc, node['outgoing_connections'][0])
-            next_node = states_by_id[node['outgoing_connections'][0]['to']]
-            if not no_cnt:
-                s += n_ind*d_ind + 'nodeExecCnt = 0;\n'
-            if guard_fnc != None:
-                assert(node['type'] == 'state')
-                s += n_ind*d_ind + 'if ('+guard_fnc+'() == 0) {\n' 
-                s += (n_ind+1)*d_ind + 'return\n'    
-                    
-                proc_sub_tree(n_ind, pr_desc, next_node) 
-                s += n_ind*d_ind + '}\n'
-                n_ind = n_ind - 1
+                        ops.append(('line', 'if ('+guard_call(connection)+' == 1) {', '\n'))
+                    order = connection.order
+                    next_node = sorted_connections[order-1].to_state
+                    ops.append(('indent', None, None))
+                    ops.append(('node', next_node, True))
+                    ops.append(('dedent', None, None))
+                    if connection.order < len(sorted_connections):
+                        ops.append(('line', '} else ', ''))
+                    else:
+                        ops.append(('line', '}', '\n'))
+                stack.extend(reversed(ops))
             else:
-                assert(node['type'] == 'init')
-                proc_sub_tree(n_ind, pr_desc, next_node)
-                n_ind = n_ind - 1
-            s += n_ind*d_ind + '}\n'
+                assert node.type == 'final', 'unexpected node type: '+node.type
+                e.line(cur_node+' = '+stopped+';')
+                trace_node(stopped)
+                e.line('return;')
+        
+    if pr_backend == 'switch':
+        e.line('switch ('+cur_node+') {')
+        e.indent()
+    for node in get_check_order(pr_desc):
+        if pr_backend == 'switch':
+            e.line('case ' + node_names[node.id] + ':')
+        else:
+            e.line('if ('+cur_node+' == ' + node_names[node.id] + ') {')
+        e.indent()
+        guard_fnc = guard_fncs[node.outgoing_connections[0]]
+        next_node = node.outgoing_connections[0].to_state
+        if guard_fnc != None:
+            assert(node.type == 'state')
+            e.line('if ('+guard_call(node.outgoing_connections[0])+' == 0)')
+            e.line(d_ind+'return;')
+        else:
+            assert(node.type == 'init')
+        if not no_cnt:
+            e.line(node_exec_cnt+' = 0;')     # The node is left
+        proc_sub_tree(pr_desc, next_node, True)
+        if pr_backend == 'switch' and not (e.endswith('return;\n') or e.endswith('continue;\n')):
+            e.line('break;')
+        e.dedent()
+        if pr_backend != 'switch':
+            e.line('}')
+    if pr_backend == 'switch':
+        e.line('default:')
+        e.line(d_ind+'return;')
+        e.dedent()
+        e.line('}')
+
+    # Shared nodes: each block ends like the node checks (the loop is resumed)
+    if len(shared_queue) > 0:
+        e.line('continue;')
+    i = 0
+    while i < len(shared_queue):
+        node = shared_queue[i]
+        e.line(get_node_label(pr_desc, node) + ':')
+        proc_sub_tree(pr_desc, node)
+        if not (e.endswith('return;\n') or e.endswith('continue;\n')):
+            e.line('continue;')
+        i = i + 1
       
-    n_ind = n_ind - 1                            
-    s += n_ind*d_ind + '}\n'    # While (1)    
-    s += '}\n\n'    
+    e.dedent()
+    e.line('}')    # While (1)    
+    e.dedent()
+    e.write('}\n\n')    
+
+    if multi_instance:
+        e.write('void '+fnc_pr_prefix+pr_name+'ExecuteAll('+get_inst_type(pr_desc)+'* set) {\n')
+        e.indent()
+        e.line('unsigned int inst;')
+        e.line('for (inst = 0; inst < set->n; inst++)')
+        e.line(d_ind+'if (set->curNode[inst] != '+stopped+')')
+        e.line(2*d_ind+fnc_pr_prefix+pr_name+'Execute(set, inst);')
+        e.dedent()
+        e.write('}\n\n')
     
     short_desc = 'Body file for module implementing procedure '+pr_name
-    createBodyFile(dir_path, fn_pr_prefix+pr_name, s, short_desc)
+    createBodyFile(dir_path, fn_pr_prefix+pr_name, e.getparts(), short_desc, incremental,
+                   symbols['timestamp'])
+
+
+def get_config():
+    """ Return a dictionary holding the values of the configuration parameters
+        of this module (the dictionary can be passed to set_config)
+    """
+    return {name: globals()[name] for name in config_names}
+
+
+def set_config(config):
+    """ Set the configuration parameters of this module from the argument
+        dictionary (as returned by get_config)
+    """
+    for name, value in config.items():
+        assert(name in config_names)
+        globals()[name] = value
+
+
+def get_generator_hash():
+    """ Return the hash of the source code of the generator modules """
+    global generator_hash
+    if generator_hash == None:
+        h = hashlib.sha256()
+        for module in (sys.modules[__name__], FwDesc, Utilities):
+            with open(module.__file__, 'rb') as fd:
+                h.update(fd.read())
+        generator_hash = h.hexdigest()
+    return generator_hash
+
+""" Hash of the source code of the generator modules (see get_generator_hash) """
+generator_hash = None
+
+
+def get_cache_key(json_file_name):
+    """ Return the key under which the code generated from the argument 
+        json model is cached. The key depends on the model, on the 
+        configuration parameters and on the generator source code.
+    """
+    h = hashlib.sha256()
+    with open(json_file_name, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b''):
+            h.update(chunk)
+    h.update(repr(sorted(get_config().items())).encode())
+    h.update(get_generator_hash().encode())
+    if reproducible:
+        h.update(os.environ.get('SOURCE_DATE_EPOCH', '').encode())
+    return h.hexdigest()
+
+
+def get_cache_file_name(json_file_name, dir_path):
+    """ Return the name of the file holding the cache entry for the argument
+        json model and code directory
+    """
+    model_hash = hashlib.sha1(os.path.abspath(json_file_name).encode()).hexdigest()
+    return os.path.join(dir_path, cache_dir_name, model_hash+'.json')
+
+
+def is_cache_valid(cache_file_name, key, dir_path):
+    """ Return True if the argument cache entry has the argument key and all
+        the files it lists exist in the code directory
+    """
+    if not os.path.isfile(cache_file_name):
+        return False
+    with open(cache_file_name) as fd:
+        try:
+            entry = json.load(fd)
+        except ValueError:
+            return False
+    if entry.get('key') != key:
+        return False
+    return all(os.path.isfile(os.path.join(dir_path, name)) for name in entry['files'])
+
+
+def write_cache(cache_file_name, json_file_name, key, file_names):
+    """ Write the cache entry for a model (the file is replaced atomically
+        because several batch workers may share the cache directory)
+    """
+    os.makedirs(os.path.dirname(cache_file_name), exist_ok=True)
+    tmp_file_name = cache_file_name + '.' + str(os.getpid())
+    with open(tmp_file_name, 'w') as fd:
+        json.dump({'model': json_file_name, 'key': key, 'files': file_names}, fd)
+    os.replace(tmp_file_name, cache_file_name)
+
+
+""" Functions called with the profile record of each generation phase (see run_phase) """
+phase_hooks = []
+
+def add_phase_hook(hook):
+    """ Register a function to be called with the profile record of each 
+        generation phase (see run_phase)
+    """
+    phase_hooks.append(hook)
+
+
+def remove_phase_hook(hook):
+    """ Unregister a function registered with add_phase_hook """
+    phase_hooks.remove(hook)
+
+
+def run_phase(model, phase, fnc, *args):
+    """ Call fnc with the argument args as the generation phase 'phase' of the
+        argument model and return its return value.
+        If phase hooks are registered, a profile record of the phase is passed
+        to each of them. The profile record is a dictionary with keys:
+        'model' and 'phase' (the arguments), 'time' (wall time in seconds),
+        'mem_peak' and 'mem_net' (peak and net size in bytes of the memory
+        allocated during the phase or None if tracemalloc is not tracing),
+        'out_files', 'out_bytes' and 'write_time' (number of files and of bytes
+        written during the phase and the part of 'time' spent writing them).
+    """
+    if len(phase_hooks) == 0:
+        return fnc(*args)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        mem_start = tracemalloc.get_traced_memory()[0]
+    write_stats = dict(Utilities.write_stats)
+    start = time.perf_counter()
+    result = fnc(*args)
+    duration = time.perf_counter() - start
+    if tracing:
+        mem_end, mem_peak = tracemalloc.get_traced_memory()
+    record = {'model': model, 
+              'phase': phase, 
+              'time': duration,
+              'mem_peak': mem_peak - mem_start if tracing else None,
+              'mem_net': mem_end - mem_start if tracing else None,
+              'out_files': Utilities.write_stats['files'] - write_stats['files'],
+              'out_bytes': Utilities.write_stats['bytes'] - write_stats['bytes'],
+              'write_time': Utilities.write_stats['time'] - write_stats['time']}
+    for hook in list(phase_hooks):
+        hook(record)
+    return result
+
+
+class Profiler:
+    """ Collector of the profile records of the generation phases.
+        While the profiler is started, it is registered as a phase hook
+        and (if trace_memory is True) tracemalloc is tracing.
+    """
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.started_tracing = False
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def start(self):
+        add_phase_hook(self)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        remove_phase_hook(self)
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+
+def write_profile(records, file_name):
+    """ Write the argument profile records in json format to the argument 
+        file ('-' for the standard output)
+    """
+    report = {'generator_hash': get_generator_hash(),
+              'config': get_config(),
+              'records': records}
+    if file_name == '-':
+        json.dump(report, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    else:
+        with open(file_name, 'w') as fd:
+            json.dump(report, fd, indent=1)
+
+
+def gen_pr_code(json_file_name, dir_path):
+    """ Generate the C code for the procedure in the argument json file
+        in directory dir_path (dir_path may also be a sink, see Utilities.getSink;
+        the incremental mode only applies to directories).
+        Return False if the generation was skipped because the model is
+        unchanged (incremental mode) and True otherwise.
+    """
+    use_cache = incremental and not isinstance(dir_path, Sink)
+    if use_cache:
+        key = run_phase(json_file_name, 'cache_key', get_cache_key, json_file_name)
+        cache_file_name = get_cache_file_name(json_file_name, dir_path)
+        if is_cache_valid(cache_file_name, key, dir_path):
+            return False
+    json_obj = run_phase(json_file_name, 'load_model', load_model, json_file_name)
+    pr_desc = run_phase(json_file_name, 'get_pr_desc', get_pr_desc, json_obj)
+    if pr_desc == None:
+        raise ValueError(json_file_name+' does not hold a procedure')
+    if validate:
+        run_phase(json_file_name, 'validate', check_pr_desc, pr_desc)
+    for fnc in (pr_create_user_header, pr_create_header, pr_create_body):
+        run_phase(json_file_name, fnc.__name__, fnc, pr_desc, dir_path)
+    if use_cache:
+        pr_name = pr_desc['name']
+        file_names = [fn_pr_prefix+pr_name+uh_pr_suffix+'.h', 
+                      fn_pr_prefix+pr_name+'.h',
+                      fn_pr_prefix+pr_name+'.c']
+        write_cache(cache_file_name, json_file_name, key, file_names)
+    return True
+
+
+def gen_pr_files(json_file_name):
+    """ Generate the C code for the procedure in the argument json file and
+        return it as a dictionary mapping the names of the generated files
+        to their content (no file is written)
+    """
+    sink = MemorySink()
+    gen_pr_code(json_file_name, sink)
+    return sink.files
+
+
+def get_affected(pr_desc, changes):
+    """ Return the generated files and functions affected by the argument
+        changes to a procedure descriptor (as returned by FwDesc.apply_pr_delta).
+        The return value is a dictionary mapping the name of each affected file
+        to the list of the affected functions and types declared or defined in
+        it (functions which were removed are included).
+    """
+    pr_name = pr_desc['name']
+    affected = {}
+    if changes['nodes']:
+        affected[fn_pr_prefix+pr_name+'.h'] = [enum_pr_prefix+pr_name+'Nodes_t']
+    functions = [fnc_pr_prefix+pr_name+name for name in sorted(changes['actions'])]
+    functions += [fnc_pr_prefix+pr_name+src+'To'+dest for src, dest in sorted(changes['guards'])]
+    if len(functions) > 0:
+        affected[fn_pr_prefix+pr_name+uh_pr_suffix+'.h'] = functions
+    if changes['structure']:
+        affected[fn_pr_prefix+pr_name+'.c'] = [fnc_pr_prefix+pr_name+'Execute']
+    return affected
+
+
+def gen_pr_delta(pr_desc, delta, dir_path):
+    """ Apply the argument delta to a procedure descriptor (see 
+        FwDesc.apply_pr_delta) and re-generate only the affected files in 
+        directory dir_path (or sink, see Utilities.getSink). 
+        If configuration parameter validate is True, the updated procedure
+        is validated first (see check_pr_desc): a ValueError is raised and
+        no file is generated if it is not valid (the descriptor is updated
+        in any case).
+        Return the affected files and functions (see get_affected).
+    """
+    affected = get_affected(pr_desc, FwDesc.apply_pr_delta(pr_desc, delta))
+    pr_name = pr_desc['name']
+    if validate:
+        run_phase(pr_name, 'validate', check_pr_desc, pr_desc)
+    for file_name, fnc in ((fn_pr_prefix+pr_name+uh_pr_suffix+'.h', pr_create_user_header),
+                           (fn_pr_prefix+pr_name+'.h', pr_create_header),
+                           (fn_pr_prefix+pr_name+'.c', pr_create_body)):
+        if file_name in affected:
+            run_phase(pr_name, fnc.__name__, fnc, pr_desc, dir_path)
+    return affected
 
 
 def main(argv):
-    """ Dummy main to be used to test functions defined in module """
-    jsonFileName = argv[0]
-    dir_path = argv[1]
-    with open(jsonFileName) as fd:
-        json_obj = json.load(fd)
-        pr_desc = get_pr_desc(json_obj)
-        pr_create_user_header(pr_desc, dir_path)
-        pr_create_header(pr_desc, dir_path)
-        pr_create_body(pr_desc, dir_path)
+    """ Generate the code for the procedure model given on the command line """
+    parser = argparse.ArgumentParser(description='Generate the C code of a FW Profile procedure')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip unchanged models and keep unchanged files')
+    parser.add_argument('--backend', choices=('if', 'switch'), default=None,
+                        help='structure of the Execute function (see pr_backend)')
+    parser.add_argument('--multi-instance', action='store_true',
+                        help='generate a module supporting several instances (see multi_instance)')
+    parser.add_argument('--trace', action='store_true',
+                        help='generate trace points (see trace)')
+    parser.add_argument('--node-profile', metavar='FILE', default=None,
+                        help='order the node checks by the frequencies in FILE (see node_profile)')
+    parser.add_argument('--reproducible', action='store_true',
+                        help='generate files which only depend on the model (see reproducible)')
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help='write the profile of the generation phases to FILE (- for stdout)')
+    parser.add_argument('json_file_name', help='json file of the procedure')
+    parser.add_argument('dir_path', help='directory or zip archive (.zip) where the C code is generated')
+    args = parser.parse_args(argv)
+    
+    global incremental, pr_backend, reproducible, multi_instance, trace, node_profile
+    incremental = incremental or args.incremental
+    trace = trace or args.trace
+    multi_instance = multi_instance or args.multi_instance
+    reproducible = reproducible or args.reproducible
+    if args.backend is not None:
+        pr_backend = args.backend
+    if args.node_profile is not None:
+        with open(args.node_profile) as fd:
+            node_profile = json.load(fd)
+    target = ZipSink(args.dir_path) if args.dir_path.endswith('.zip') else args.dir_path
+    profiler = Profiler()
+    if args.profile is not None:
+        profiler.start()
+    try:
+        gen_pr_code(args.json_file_name, target)
+    finally:
+        if isinstance(target, Sink):
+            target.close()
+        if args.profile is not None:
+            profiler.stop()
+            write_profile(profiler.records, args.profile)
     return
 
 if __name__ == "__main__":
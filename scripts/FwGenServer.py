@@ -0,0 +1,282 @@
+""" Resident code generation server.
+This script keeps the code generator modules loaded and serves code
+generation requests in JSON-RPC 2.0 format. This avoids the cost of
+starting the Python interpreter and of importing the generator modules
+for each generation.
+
+The server is called as follows:
+
+> python FwGenServer.py [--socket SocketPath] [--cache-size N]
+
+Without option '--socket', the requests are read from the standard input
+and the responses are written to the standard output (one json object per
+line). With option '--socket', the server listens on a UNIX socket with the
+argument path and serves one connection at a time; on each connection, the
+requests and responses are exchanged in the same line-oriented format.
+
+The following methods are supported:
+
+- generate: generate the code of a procedure or state machine model. The
+  model is given through one of the following parameters: 'path' (name of
+  a json file), 'text' (content of a json file) or 'model' (json object).
+  The optional parameter 'config' holds values for the configuration
+  parameters of FwGenCode for a procedure (see FwGenCode.get_config) or of
+  FwGenSmCode for a state machine (see FwGenSmCode.get_config) which apply
+  to this request only; other parameters are rejected. If the optional parameter 'dir_path' is given, the files are
+  written to that directory and the result holds the names of the files
+  which were written (with the optional parameter 'keep_unchanged' set to
+  true, files which only differ in their timestamp are not written, see
+  Utilities.writeFile); otherwise the
+  result holds the generated files as a dictionary of file names to text.
+  The result also holds the hash of the model and a flag 'cached' which is
+  true if the code was taken from the cache.
+- stats: return the number of entries, hits and misses of the caches.
+- ping: return 'pong'.
+- shutdown: stop the server.
+
+The descriptors and the generated files are held in two LRU caches keyed by
+the hash of the model (and, for the generated files, of the configuration).
+A repeated request for an unchanged model is served from the cache.
+"""
+
+__author__ = 'Alessandro Pasetti, P&P software GmbH'
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import collections
+import socketserver
+
+import FwDesc
+import FwGenCode
+import FwGenSmCode
+from Utilities import DirectorySink, MemorySink
+
+""" Maximum number of entries of the descriptor and output caches """
+cache_size = 64
+
+""" JSON-RPC error codes """
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+GENERATION_ERROR = -32000
+
+class LruCache:
+    """ Cache holding at most max_size entries. When the cache is full, the
+        least recently used entry is discarded.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """ Return the entry with the argument key or None if there is none """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """ Store the argument entry in the cache """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        """ Return the size, hits and misses of the cache """
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class RpcError(Exception):
+    """ Error reported to the client as a JSON-RPC error object """
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+
+class GenServer:
+    """ Handler of the code generation requests (see module documentation) """
+    def __init__(self, max_size=cache_size):
+        self.descs = LruCache(max_size)
+        self.outputs = LruCache(max_size)
+        self.running = True
+        self.methods = {'generate': self.generate, 'stats': self.stats,
+                        'ping': self.ping, 'shutdown': self.shutdown}
+
+    def get_model(self, params):
+        """ Return the hash of the model in the argument request parameters
+            and a function which returns the model as a json object
+        """
+        if 'path' in params:
+            with open(params['path'], 'rb') as fd:
+                text = fd.read()
+        elif 'text' in params:
+            text = params['text'].encode()
+        elif 'model' in params:
+            model = params['model']
+            text = json.dumps(model, sort_keys=True, separators=(',', ':')).encode()
+            return hashlib.sha256(text).hexdigest(), lambda: model
+        else:
+            raise RpcError(INVALID_PARAMS, 'one of path, text or model is required')
+        return hashlib.sha256(text).hexdigest(), lambda: json.loads(text)
+
+    def get_desc(self, model_hash, get_json_obj):
+        """ Return the kind ('Pr' or 'Sm') and the descriptor of the argument model """
+        entry = self.descs.get(model_hash)
+        if entry is None:
+            json_obj = get_json_obj()
+            kind = FwDesc.get_model_type(json_obj)
+            if kind is None:
+                raise RpcError(INVALID_PARAMS, 'the model is neither a procedure nor a state machine')
+            if kind == 'Sm':
+                entry = (kind, FwDesc.get_sm_desc(json_obj))
+            else:
+                entry = (kind, FwDesc.get_pr_desc(json_obj))
+            self.descs.put(model_hash, entry)
+        return entry
+
+    def generate(self, params):
+        model_hash, get_json_obj = self.get_model(params)
+        kind, desc = self.get_desc(model_hash, get_json_obj)
+        generator = FwGenSmCode if kind == 'Sm' else FwGenCode
+        config = generator.get_config()
+        request_config = params.get('config', {})
+        for name in request_config:
+            if name not in generator.config_names:
+                raise RpcError(INVALID_PARAMS, 'unknown configuration parameter of %s: %s' % 
+                               (generator.__name__, name))
+        key = (model_hash, repr(sorted(dict(config, **request_config).items())))
+        files = self.outputs.get(key)
+        cached = files is not None
+        if not cached:
+            generator.set_config(request_config)
+            try:
+                sink = MemorySink()
+                if kind == 'Pr' and FwGenCode.validate:
+                    FwGenCode.check_pr_desc(desc)
+                if kind == 'Sm':
+                    FwGenSmCode.check_sm_desc(desc)
+                if kind == 'Sm':
+                    FwGenSmCode.sm_create_user_header(desc, sink)
+                    FwGenSmCode.sm_create_header(desc, sink)
+                    FwGenSmCode.sm_create_body(desc, sink)
+                else:
+                    FwGenCode.pr_create_user_header(desc, sink)
+                    FwGenCode.pr_create_header(desc, sink)
+                    FwGenCode.pr_create_body(desc, sink)
+            finally:
+                generator.set_config(config)
+            files = sink.files
+            self.outputs.put(key, files)
+        result = {'hash': model_hash, 'cached': cached}
+        if 'dir_path' in params:
+            sink = DirectorySink(params['dir_path'], params.get('keep_unchanged', False))
+            result['files'] = [name for name, text in files.items() if sink.write(name, text)]
+        else:
+            result['files'] = files
+        return result
+
+    def stats(self, params):
+        return {'descs': self.descs.stats(), 'outputs': self.outputs.stats()}
+
+    def ping(self, params):
+        return 'pong'
+
+    def shutdown(self, params):
+        self.running = False
+        return None
+
+    def handle(self, line):
+        """ Process one request line and return the response line (or None
+            if the request is a notification, even if it fails: as required
+            by JSON-RPC 2.0, only the requests which cannot be parsed or are 
+            not valid request objects are answered without an 'id')
+        """
+        request_id = None
+        notification = False
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RpcError(PARSE_ERROR, 'parse error: '+str(e))
+            if not isinstance(request, dict) or 'method' not in request:
+                raise RpcError(INVALID_REQUEST, 'invalid request')
+            request_id = request.get('id')
+            notification = 'id' not in request
+            method = self.methods.get(request['method'])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, 'method not found: '+str(request['method']))
+            params = request.get('params', {})
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, 'params must be an object')
+            response = {'jsonrpc': '2.0', 'id': request_id, 'result': method(params)}
+        except RpcError as e:
+            response = {'jsonrpc': '2.0', 'id': request_id,
+                        'error': {'code': e.code, 'message': str(e)}}
+        except Exception as e:
+            response = {'jsonrpc': '2.0', 'id': request_id,
+                        'error': {'code': GENERATION_ERROR, 'message': type(e).__name__+': '+str(e)}}
+        if notification:
+            return None
+        return json.dumps(response)
+
+    def serve_stream(self, rfile, wfile):
+        """ Serve the requests read from rfile until the end of the file or
+            until the server is shut down. The responses are written to wfile.
+        """
+        for line in rfile:
+            if line.strip() == '':
+                continue
+            response = self.handle(line)
+            if response is not None:
+                wfile.write(response + '\n')
+                wfile.flush()
+            if not self.running:
+                break
+
+
+def serve_socket(server, socket_path):
+    """ Serve the requests received on the UNIX socket with the argument path """
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            with self.request.makefile('r', encoding='utf-8') as rfile, \
+                 self.request.makefile('w', encoding='utf-8') as wfile:
+                server.serve_stream(rfile, wfile)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.UnixStreamServer(socket_path, Handler) as unix_server:
+        try:
+            while server.running:
+                unix_server.handle_request()
+        finally:
+            os.remove(socket_path)
+
+
+def main(argv):
+    """ Run the server with the options given on the command line """
+    parser = argparse.ArgumentParser(description='Serve FW Profile code generation requests')
+    parser.add_argument('--socket', metavar='PATH', default=None,
+                        help='UNIX socket on which requests are served (default: stdin/stdout)')
+    parser.add_argument('--cache-size', type=int, default=cache_size,
+                        help='maximum number of cached models')
+    args = parser.parse_args(argv)
+
+    server = GenServer(args.cache_size)
+    if args.socket is not None:
+        serve_socket(server, args.socket)
+    else:
+        server.serve_stream(sys.stdin, sys.stdout)
+    return
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,513 @@
+""" Script to generate the implementation of a FW Profile State Machine.
+This script parses the json representation of a state machine and generates
+the C code implementing it. The json representation is the one created
+with the FW Profile Editor.
+
+The generator script is called as follows:
+
+> python FwGenSmCode.py FwModel.json CodeDirPath
+
+'FwModel.json' is the json representation of the state machine and
+'CodeDirPath' is the path to the directory where the C code is generated
+(or the name of a zip archive, if it ends with '.zip').
+
+The structure of the generated code can be controlled through the
+configuration parameters defined at the beginning of this module.
+
+The following C files are generated for a json model:
+
+- <Prefix>FwModel.h: header file declaring the functons through which the
+                     state machine is controlled
+- <Prefix>FwModel.c: body file implementing the functions through which
+                     the state machine is controlled
+- <Prefix>FwModel<Suffix>.h: header file declaring the functions, which
+                             implement the state machine actions and guards
+
+The <prefix> and <suffix> are strings defined through configuration parameters.
+
+The user should normally provide an implementation of the header file
+<Prefix>FwModel<Suffix>.h.
+
+As the procedure generator in FwGenCode, the state machine generator
+privileges speed of execution over code memory usage. Each state machine
+(the top-level one and each embedded one) is implemented by a function
+which dispatches a transition command through a switch on the current
+state and then through the (pre-computed) transitions out of that state
+which have the command as their trigger.
+
+A transition command is first sent to the state machine embedded in the
+current state. If the command is 'Execute', the do-action of the current
+state is then executed. Finally, the transitions out of the current state
+which have the command as trigger are checked in the order of their
+'order' attribute and the first one whose guard is true is taken.
+Transitions out of proper states must have a trigger: the code is not
+generated for a state machine with a transition out of a proper state 
+without a trigger (see check_sm_desc).
+"""
+
+__author__ = 'Alessandro Pasetti, P&P software GmbH'
+
+import sys
+import argparse
+
+from Utilities import createHeaderFile, createBodyFile, writeDoxy, Emitter
+from Utilities import Sink, ZipSink, MemorySink
+from FwDesc import get_sm_desc, load_model, SM_FIELDS
+
+""" Prefix for file names for files implementing state machines """
+fn_sm_prefix = 'FwSm'
+""" Suffix for the header file name declaring the state machine user functions """
+uh_sm_suffix = 'User'
+""" Prefix for enumerator holding state machine states """
+enum_sm_prefix = 'e'
+""" Prefix for enumerator holding state machine triggers """
+trig_sm_prefix = 't'
+""" Prefix for function names for state machine files """
+fnc_sm_prefix = 'FwSm'
+""" Size of indentation jump in generated C-code """
+d_ind = 4*' '
+
+""" Names of the configuration parameters of this module """
+config_names = ('fn_sm_prefix', 'uh_sm_suffix', 'enum_sm_prefix', 'trig_sm_prefix', 
+                'fnc_sm_prefix', 'd_ind')
+
+def is_do_nothing(desc):
+    """ Return True if the argument action description is empty or is the
+        (case-insensitive) string 'do nothing'
+    """
+    return desc.lower().strip() in ('', 'do nothing')
+
+
+def get_state_name(sm_desc, state):
+    """ Return the name of the enumerator holding the name of the argument state """
+    assert(state.type == 'state')
+    return enum_sm_prefix+sm_desc['name']+state.name
+
+
+def get_stopped_name(sm_desc):
+    """ Return the name of the enumerator representing a stopped state machine """
+    return enum_sm_prefix+sm_desc['name']+'Stopped'
+
+
+def get_trigger_name(sm_desc, trigger):
+    """ Return the name of the enumerator holding the argument trigger """
+    return trig_sm_prefix+sm_desc['name']+trigger
+
+
+def get_action_fnc(sm_desc, state, kind):
+    """ Return the name of the function implementing the entry, do or exit
+        action (kind is one of: 'Entry', 'Do', 'Exit') of the argument state
+        or None if the state has no such action
+    """
+    desc = {'Entry': state.entry_desc, 'Do': state.do_desc, 'Exit': state.exit_desc}[kind]
+    if state.type != 'state' or is_do_nothing(desc):
+        return None
+    return fnc_sm_prefix+sm_desc['name']+state.name+kind
+
+
+def get_tr_name(sm_desc, transition):
+    """ Return the name of the argument transition (used to build the names
+        of its action and guard functions)
+    """
+    return sm_desc['name']+transition.from_state.name+transition.trigger+'To'+ \
+           transition.to_state.name
+
+
+def get_tr_action_fnc(sm_desc, transition):
+    """ Return the name of the function implementing the action of the
+        argument transition or None if the transition has no action
+    """
+    if is_do_nothing(transition.action_desc):
+        return None
+    return fnc_sm_prefix+get_tr_name(sm_desc, transition)+'Action'
+
+
+def get_tr_guard_fnc(sm_desc, transition):
+    """ Return the name of the function implementing the guard of the
+        argument transition or None if the transition has no guard or
+        has the else guard
+    """
+    if transition.guard_desc.strip() == '' or transition.is_else_guard:
+        return None
+    return fnc_sm_prefix+get_tr_name(sm_desc, transition)+'Guard'
+
+
+def get_machine_suffix(machine):
+    """ Return the suffix of the names of the static variables and functions
+        implementing the argument state machine in the body file
+    """
+    return '' if machine.parent is None else machine.parent.name
+
+
+def check_sm_desc(sm_desc):
+    """ Validate the state machine in the argument descriptor: a ValueError
+        listing the errors is raised if a transition out of a proper state
+        has no trigger
+    """
+    errors = []
+    for transition in sm_desc['transitions']:
+        state = transition.from_state
+        if state is not None and state.type == 'state' and transition.trigger == '':
+            to_name = transition.to_state.name if transition.to_state is not None else '?'
+            errors.append('trigger identifier cannot be empty on the transition from %s to %s' %
+                          (state.name, to_name))
+    if len(errors) > 0:
+        raise ValueError('state machine ' + sm_desc['name'] + ' is not valid:\n  ' + 
+                         '\n  '.join(errors))
+
+
+def sm_create_header(sm_desc, dir_path):
+    """ Create the header file for the state machine module.
+        The header file declares the functions to start, stop and execute
+        the state machine and to send transition commands to it; the
+        functions to get the current state of the state machine and of its
+        embedded state machines; and the enumerated types holding the state
+        and trigger identifiers.
+        The first argument is the descriptor of the state machine returned
+        by function get_sm_desc. The second argument is the fully qualified
+        name of the directory where the file is generated or the sink to
+        which it is written (see Utilities.getSink).
+    """
+    sm_name = sm_desc['name']
+
+    e = Emitter(d_ind)
+    i = 0
+    e.write(writeDoxy(['Enumerated type for the state machine states']))
+    e.write('typedef enum {\n')
+    e.indent()
+    e.line(get_stopped_name(sm_desc)+' = 0,')
+    for machine in sm_desc['machines']:
+        for state in machine.states:
+            i = i+1
+            e.line(get_state_name(sm_desc, state)+' = '+str(i)+',')
+    e.dedent()
+    e.write('} '+enum_sm_prefix+sm_name+'States_t;\n\n')
+
+    e.write(writeDoxy(['Enumerated type for the state machine transition triggers']))
+    e.write('typedef enum {\n')
+    e.indent()
+    e.line(get_trigger_name(sm_desc, 'Execute')+' = 0,')
+    for i, trigger in enumerate(sm_desc['triggers']):
+        e.line(get_trigger_name(sm_desc, trigger)+' = '+str(i+1)+',')
+    e.dedent()
+    e.write('} '+trig_sm_prefix+sm_name+'Triggers_t;\n\n')
+
+    e.write(writeDoxy(['Function to start state machine '+sm_name]))
+    e.write('void '+fnc_sm_prefix+sm_name+'Start();\n\n')
+    e.write(writeDoxy(['Function to stop state machine '+sm_name]))
+    e.write('void '+fnc_sm_prefix+sm_name+'Stop();\n\n')
+    e.write(writeDoxy(['Function to execute state machine '+sm_name,
+                       '(this is equivalent to sending the Execute transition command)']))
+    e.write('void '+fnc_sm_prefix+sm_name+'Execute();\n\n')
+    e.write(writeDoxy(['Function to send a transition command to state machine '+sm_name,
+                       '@param trigger the transition trigger']))
+    e.write('void '+fnc_sm_prefix+sm_name+'MakeTrans('+trig_sm_prefix+sm_name+
+            'Triggers_t trigger);\n\n')
+    e.write(writeDoxy(['Check the current state of state machine '+sm_name,
+                       '@return 0 if the state machine is not started; 1 otherwise']))
+    e.write('unsigned int '+fnc_sm_prefix+sm_name+'IsStarted();\n\n')
+    for machine in sm_desc['machines']:
+        suffix = get_machine_suffix(machine)
+        if machine.parent is None:
+            doxy = 'Get the current state of the state machine '+sm_name
+        else:
+            doxy = 'Get the current state of the state machine embedded in state '+suffix
+        e.write(writeDoxy([doxy, '@return the current state (' + get_stopped_name(sm_desc) +
+                           ' if the state machine is stopped)']))
+        e.write(enum_sm_prefix+sm_name+'States_t '+fnc_sm_prefix+sm_name+suffix+'GetCurState();\n\n')
+
+    func_desc = 'The functions declared in this file allow the user to control ' + \
+                'the operation of the FW Profile state machine ' + sm_name + '. ' + \
+                'The following operations can be performed on the state machine: ' + \
+                '(a) Start, stop and execute the state machine \n' + \
+                '(b) Send transition commands to the state machine \n' + \
+                '(c) Query the state machine for its start/stop state and for its current state\n'
+    createHeaderFile(dir_path, fn_sm_prefix+sm_name, e.getparts(), func_desc)
+
+
+def sm_create_user_header(sm_desc, dir_path):
+    """ Create the header file which declares the functions implementing
+        the state and transition actions and the transition guards.
+    """
+    e = Emitter(d_ind)
+    sm_name = sm_desc['name']
+    for machine in sm_desc['machines']:
+        for state in machine.states:
+            notes = []
+            if state.note.strip() != '':
+                notes += ['', state.note]
+            for note in state.to_notes:
+                notes += ['', note.description]
+            for kind, desc in (('Entry', state.entry_desc), ('Do', state.do_desc),
+                               ('Exit', state.exit_desc)):
+                action_fnc = get_action_fnc(sm_desc, state, kind)
+                if action_fnc != None:
+                    e.write(writeDoxy([kind+' action of state '+state.name, desc] + notes))
+                    e.write('void '+action_fnc+'();\n\n')
+
+    for transition in sm_desc['transitions']:
+        if transition.from_state is None or transition.to_state is None:
+            continue
+        notes = ['', transition.note] if transition.note.strip() != '' else []
+        src_state_name = transition.from_state.name
+        dest_state_name = transition.to_state.name
+        action_fnc = get_tr_action_fnc(sm_desc, transition)
+        if action_fnc != None:
+            e.write(writeDoxy(['Action on the transition from '+src_state_name+
+                               ' to '+dest_state_name, transition.action_desc] + notes))
+            e.write('void '+action_fnc+'();\n\n')
+        guard_fnc = get_tr_guard_fnc(sm_desc, transition)
+        if guard_fnc != None:
+            e.write(writeDoxy(['Guard on the transition from '+src_state_name+
+                               ' to '+dest_state_name, transition.guard_desc,
+                               '@return 1 if the guard is true; 0 otherwise'] + notes))
+            e.write('int '+guard_fnc+'();\n\n')
+
+    func_desc =  'The functions in this file implement the actions and ' + \
+                 'guards of the FW Profile state machine ' + sm_name + '. ' + \
+                 'The user is responsible for providing a C body file which ' + \
+                 'implements all the functions declared in this header file.'
+    createHeaderFile(dir_path, fn_sm_prefix + sm_name + uh_sm_suffix, e.getparts(), func_desc)
+
+
+def sm_create_body(sm_desc, dir_path):
+    """ Create the body file for the state machine module.
+        The first argument is the descriptor of the state machine returned
+        by function get_sm_desc. The second argument is the fully qualified
+        name of the directory where the file is generated or the sink to
+        which it is written (see Utilities.getSink).
+    """
+    sm_name = sm_desc['name']
+    stopped = get_stopped_name(sm_desc)
+    states_t = enum_sm_prefix+sm_name+'States_t'
+    triggers_t = trig_sm_prefix+sm_name+'Triggers_t'
+    execute = get_trigger_name(sm_desc, 'Execute')
+
+    e = Emitter(d_ind)
+    e.write('#include "'+fn_sm_prefix+sm_name+'.h"\n')
+    e.write('#include "'+fn_sm_prefix+sm_name+uh_sm_suffix+'.h"\n\n')
+    for machine in sm_desc['machines']:
+        suffix = get_machine_suffix(machine)
+        if machine.parent is None:
+            e.write(writeDoxy(['The current state of the state machine']))
+        else:
+            e.write(writeDoxy(['The current state of the state machine embedded in state '+suffix]))
+        e.write('static '+states_t+' curState'+suffix+' = '+stopped+';\n\n')
+    for machine in sm_desc['machines']:
+        suffix = get_machine_suffix(machine)
+        e.write('static void start'+suffix+'();\n')
+        e.write('static void stop'+suffix+'();\n')
+        e.write('static void makeTrans'+suffix+'('+triggers_t+' trigger);\n')
+    e.write('\n')
+
+    def enter_state(transition):
+        """ Generate the code to execute the argument transition after the
+            source state has been exited: the transition action is executed
+            and the target state is entered (if the target is a choice
+            pseudo-state, the transitions out of it are processed).
+        """
+        action_fnc = get_tr_action_fnc(sm_desc, transition)
+        if action_fnc != None:
+            e.line(action_fnc+'();')
+        target = transition.to_state
+        suffix = get_machine_suffix(target.machine)
+        if target.type == 'final':
+            e.line('curState'+suffix+' = '+stopped+';')
+        elif target.type == 'state':
+            e.line('curState'+suffix+' = '+get_state_name(sm_desc, target)+';')
+            entry_fnc = get_action_fnc(sm_desc, target, 'Entry')
+            if entry_fnc != None:
+                e.line(entry_fnc+'();')
+            if target.embedded is not None:
+                e.line('start'+target.embedded.parent.name+'();')
+        elif target.type == 'choice':
+            take_first(target.outgoing_transitions, None)
+
+    def take_first(transitions, source):
+        """ Generate the code to take the first of the argument transitions
+            (sorted by order) whose guard is true. If source is not None, it
+            is the proper state which is exited when a transition is taken
+            and the generated code returns after the transition is taken.
+        """
+        braces = False
+        for i, transition in enumerate(transitions):
+            guard_fnc = get_tr_guard_fnc(sm_desc, transition)
+            if guard_fnc != None:
+                e.line(('if' if i == 0 else '} else if')+' ('+guard_fnc+'() == 1) {')
+                braces = True
+            elif i > 0:
+                e.line('} else {')
+            if braces:
+                e.indent()
+            if source is not None:
+                if source.embedded is not None:
+                    e.line('stop'+source.name+'();')
+                exit_fnc = get_action_fnc(sm_desc, source, 'Exit')
+                if exit_fnc != None:
+                    e.line(exit_fnc+'();')
+            enter_state(transition)
+            if source is not None:
+                e.line('return;')
+            if braces:
+                e.dedent()
+            if guard_fnc == None:   # Later transitions can never be taken
+                break
+        if braces:
+            e.line('}')
+
+    for machine in sm_desc['machines']:
+        suffix = get_machine_suffix(machine)
+        cur_state = 'curState'+suffix
+
+        # Start function: take the transition out of the initial pseudo-state
+        e.write('static void start'+suffix+'() {\n')
+        e.indent()
+        e.line('if ('+cur_state+' != '+stopped+')')
+        e.line(d_ind+'return;')
+        if machine.init is not None:
+            take_first(machine.init.outgoing_transitions, None)
+        e.dedent()
+        e.write('}\n\n')
+
+        # Stop function: stop the embedded state machine and exit the current state
+        e.write('static void stop'+suffix+'() {\n')
+        e.indent()
+        e.line('switch ('+cur_state+') {')
+        e.indent()
+        for state in machine.states:
+            exit_fnc = get_action_fnc(sm_desc, state, 'Exit')
+            if state.embedded is None and exit_fnc == None:
+                continue
+            e.line('case '+get_state_name(sm_desc, state)+':')
+            e.indent()
+            if state.embedded is not None:
+                e.line('stop'+state.name+'();')
+            if exit_fnc != None:
+                e.line(exit_fnc+'();')
+            e.line('break;')
+            e.dedent()
+        e.line('default:')
+        e.line(d_ind+'break;')
+        e.dedent()
+        e.line('}')
+        e.line(cur_state+' = '+stopped+';')
+        e.dedent()
+        e.write('}\n\n')
+
+        # Transition function: dispatch on the current state and on the trigger
+        e.write('static void makeTrans'+suffix+'('+triggers_t+' trigger) {\n')
+        e.indent()
+        e.line('switch ('+cur_state+') {')
+        e.indent()
+        for state in machine.states:
+            e.line('case '+get_state_name(sm_desc, state)+':')
+            e.indent()
+            if state.embedded is not None:
+                e.line('makeTrans'+state.name+'(trigger);')
+            do_fnc = get_action_fnc(sm_desc, state, 'Do')
+            if do_fnc != None:
+                e.line('if (trigger == '+execute+')')
+                e.line(d_ind+do_fnc+'();')
+            for trigger, transitions in state.dispatch.items():
+                assert(trigger != ''), 'empty trigger (see check_sm_desc)'
+                e.line('if (trigger == '+get_trigger_name(sm_desc, trigger)+') {')
+                e.indent()
+                take_first(transitions, state)
+                e.dedent()
+                e.line('}')
+            e.line('break;')
+            e.dedent()
+        e.line('default:')
+        e.line(d_ind+'break;')
+        e.dedent()
+        e.line('}')
+        e.dedent()
+        e.write('}\n\n')
+
+        e.write(states_t+' '+fnc_sm_prefix+sm_name+suffix+'GetCurState() {\n')
+        e.write(d_ind+'return '+cur_state+';\n')
+        e.write('}\n\n')
+
+    e.write('void '+fnc_sm_prefix+sm_name+'Start() {\n')
+    e.write(d_ind+'start();\n')
+    e.write('}\n\n')
+
+    e.write('void '+fnc_sm_prefix+sm_name+'Stop() {\n')
+    e.write(d_ind+'if (curState == '+stopped+')\n')
+    e.write(d_ind+d_ind+'return;\n')
+    e.write(d_ind+'stop();\n')
+    e.write('}\n\n')
+
+    e.write('void '+fnc_sm_prefix+sm_name+'MakeTrans('+triggers_t+' trigger) {\n')
+    e.write(d_ind+'makeTrans(trigger);\n')
+    e.write('}\n\n')
+
+    e.write('void '+fnc_sm_prefix+sm_name+'Execute() {\n')
+    e.write(d_ind+'makeTrans('+execute+');\n')
+    e.write('}\n\n')
+
+    e.write('unsigned int '+fnc_sm_prefix+sm_name+'IsStarted() {\n')
+    e.write(d_ind+'return curState != '+stopped+';\n')
+    e.write('}\n\n')
+
+    short_desc = 'Body file for module implementing state machine '+sm_name
+    createBodyFile(dir_path, fn_sm_prefix+sm_name, e.getparts(), short_desc)
+
+
+def get_config():
+    """ Return a dictionary holding the values of the configuration parameters
+        of this module (the dictionary can be passed to set_config)
+    """
+    return {name: globals()[name] for name in config_names}
+
+
+def set_config(config):
+    """ Set the configuration parameters of this module from the argument
+        dictionary (as returned by get_config)
+    """
+    for name, value in config.items():
+        assert(name in config_names)
+        globals()[name] = value
+
+
+def gen_sm_code(json_file_name, dir_path):
+    """ Generate the C code for the state machine in the argument json file
+        in directory dir_path (dir_path may also be a sink, see Utilities.getSink).
+    """
+    json_obj = load_model(json_file_name, SM_FIELDS)
+    sm_desc = get_sm_desc(json_obj)
+    if sm_desc == None:
+        raise ValueError(json_file_name+' does not hold a state machine')
+    check_sm_desc(sm_desc)
+    sm_create_user_header(sm_desc, dir_path)
+    sm_create_header(sm_desc, dir_path)
+    sm_create_body(sm_desc, dir_path)
+
+
+def gen_sm_files(json_file_name):
+    """ Generate the C code for the state machine in the argument json file
+        and return it as a dictionary mapping the names of the generated
+        files to their content (no file is written)
+    """
+    sink = MemorySink()
+    gen_sm_code(json_file_name, sink)
+    return sink.files
+
+
+def main(argv):
+    """ Generate the code for the state machine model given on the command line """
+    parser = argparse.ArgumentParser(description='Generate the C code of a FW Profile state machine')
+    parser.add_argument('json_file_name', help='json file of the state machine')
+    parser.add_argument('dir_path', help='directory or zip archive (.zip) where the C code is generated')
+    args = parser.parse_args(argv)
+
+    target = ZipSink(args.dir_path) if args.dir_path.endswith('.zip') else args.dir_path
+    try:
+        gen_sm_code(args.json_file_name, target)
+    finally:
+        if isinstance(target, Sink):
+            target.close()
+    return
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
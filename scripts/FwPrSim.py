@@ -0,0 +1,439 @@
+""" Simulator of FW Profile procedures.
+This module executes a procedure directly from its descriptor (as returned
+by FwDesc.get_pr_desc) without generating, compiling and running its C code.
+The simulator follows the semantics of the code generated by FwGenCode:
+
+- Start: a stopped procedure enters its initial node
+- Stop: the procedure is stopped
+- Execute: the procedure and node execution counters are incremented; if
+  the guard on the out-going connection of the current node is true, the
+  node execution counter is reset and the procedure follows the connection:
+  the action of each action node which is entered is executed; a decision
+  node evaluates the guards of its out-going connections in the order of
+  their 'order' attribute and follows the first one which is true (or the
+  else branch); when a non-transient node is entered (see 
+  FwGenCode.is_node_transient), the guard on its out-going connection is
+  evaluated and the execution continues in the same way while the guards
+  are true; the execution stops when this guard is false or when the final
+  node is entered (the procedure is then stopped)
+
+The guards and actions are Python callables which are passed to PrModel:
+the guards are indexed by the (source name, target name) pair of their
+connection and the actions are indexed by the name of their node. A guard
+or action is called with the simulator as argument (see PrSimulator); in
+the batched simulator (see PrBatch), it is called with the batch and with
+the indices of the instances which evaluate it or execute it. The state of
+the batch is held in arrays which are NumPy arrays if NumPy is available.
+
+The simulator script is called as follows:
+
+> python FwPrSim.py [--instances N] [--ticks T] [--probability P] [--seed S]
+                    [--profile File] FwModel.json
+
+It runs N instances of the procedure for T ticks with random guards which
+are true with probability P (instances which terminate are restarted) and
+prints the fraction of the ticks spent in each node. With option '--profile',
+the number of ticks spent in each node is written in json format to the
+argument file.
+"""
+
+__author__ = 'Alessandro Pasetti, P&P software GmbH'
+
+import sys
+import json
+import array
+import random
+import argparse
+
+import FwGenCode
+from FwDesc import get_pr_desc, load_model
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+""" Index of the stopped state of a procedure (as in the generated code) """
+STOPPED = 0
+""" Index of the initial node of a procedure (as in the generated code) """
+INIT = 1
+
+class PrModel:
+    """ Procedure compiled for simulation.
+    The nodes are identified by the index of the enumerator of the generated
+    code: STOPPED, INIT and then the action nodes (in the order of
+    FwGenCode.get_pr_symbols). Attribute names holds the name of the node
+    with each index ('Stopped' for STOPPED).
+    Argument guards is a dictionary mapping (source name, target name)
+    pairs to guard callables and argument actions is a dictionary mapping
+    node names to action callables. The guards which are not in the
+    dictionary are replaced by default_guard and the actions which are not
+    in the dictionary are replaced by default_action (None means that the
+    action does nothing). A ValueError is raised if a guard is missing or
+    if a guard or action does not exist in the procedure.
+    """
+    def __init__(self, pr_desc, guards={}, actions={}, default_guard=None,
+                 default_action=None):
+        if FwGenCode.validate:
+            FwGenCode.check_pr_desc(pr_desc)
+        symbols = FwGenCode.get_pr_symbols(pr_desc)
+        self.pr_name = pr_desc['name']
+        states = symbols['states']
+        vertex = {}             # Vertex of each state (indexed by state ID)
+        for state in states:
+            vertex[state.id] = len(vertex)
+        self.names = ['Stopped', None]
+        self.index = [None]*len(states)     # Enumerator index of each vertex
+        for state in states:
+            if state.type == 'init':
+                self.names[INIT] = state.name
+                self.index[vertex[state.id]] = INIT
+            elif state.type == 'state':
+                self.index[vertex[state.id]] = len(self.names)
+                self.names.append(state.name)
+
+        unknown = set(guards)
+        missing = []
+        def get_guard(connection):
+            """ Return the callable of the guard on the argument connection """
+            if symbols['guard_fncs'][connection] == None:
+                return None
+            key = (connection.from_state.name, connection.to_state.name)
+            unknown.discard(key)
+            if key in guards:
+                return guards[key]
+            if default_guard is None:
+                missing.append('%s->%s' % key)
+            return default_guard
+
+        self.kind = [state.type for state in states]
+        self.transient = [symbols['transient'][state.id] for state in states]
+        self.action = [None]*len(states)
+        self.guard = [None]*len(states)     # Guard on the out-going connection
+        self.next = [None]*len(states)      # Target of the out-going connection
+        self.branches = [None]*len(states)  # (guard, target) of decision nodes
+        self.wait = [None]*len(self.names)  # Vertex of each non-transient node
+        for state in states:
+            v = vertex[state.id]
+            if state.type == 'state' and not state.is_do_nothing:
+                self.action[v] = actions.get(state.name, default_action)
+            if state.type in ('init', 'state'):
+                connection = state.outgoing_connections[0]
+                self.guard[v] = get_guard(connection)
+                self.next[v] = vertex[connection.to_id]
+                if not self.transient[v]:
+                    self.wait[self.index[v]] = v
+            elif state.type == 'choice':
+                self.branches[v] = [(get_guard(c), vertex[c.to_id]) for c in
+                                    sorted(state.outgoing_connections, key=lambda c: c.order)]
+        unknown_actions = set(actions) - set(state.name for state in states
+                                             if state.type == 'state')
+        if len(missing) > 0:
+            raise ValueError('missing guards: ' + ', '.join(missing))
+        if len(unknown) > 0 or len(unknown_actions) > 0:
+            raise ValueError('unknown guards or actions: ' + ', '.join(sorted(
+                ['%s->%s' % key for key in unknown] + list(unknown_actions))))
+
+
+class PrSimulator:
+    """ One instance of a simulated procedure.
+    The simulator holds the index of the current node (cur_node), the
+    procedure and node execution counters (pr_exec_cnt and node_exec_cnt)
+    and a dictionary (data) in which guards and actions may keep their data.
+    Guards and actions are called with the simulator as argument.
+    """
+    def __init__(self, model, data=None):
+        self.model = model
+        self.cur_node = STOPPED
+        self.pr_exec_cnt = 0
+        self.node_exec_cnt = 0
+        self.data = {} if data is None else data
+
+    def start(self):
+        """ Start the procedure (no effect if it is already started) """
+        if self.cur_node != STOPPED:
+            return
+        self.cur_node = INIT
+        self.pr_exec_cnt = 0
+        self.node_exec_cnt = 0
+
+    def stop(self):
+        """ Stop the procedure """
+        self.cur_node = STOPPED
+
+    def is_started(self):
+        return self.cur_node != STOPPED
+
+    def get_cur_node_name(self):
+        return self.model.names[self.cur_node]
+
+    def execute(self):
+        """ Execute the procedure once """
+        if self.cur_node == STOPPED:
+            return
+        self.pr_exec_cnt += 1
+        self.node_exec_cnt += 1
+        model = self.model
+        v = model.wait[self.cur_node]
+        while True:
+            # The procedure waits in vertex v
+            guard = model.guard[v]
+            if guard is not None and not guard(self):
+                return
+            self.node_exec_cnt = 0
+            v = model.next[v]
+            while model.transient[v]:
+                kind = model.kind[v]
+                if kind == 'state':
+                    self.cur_node = model.index[v]
+                    action = model.action[v]
+                    if action is not None:
+                        action(self)
+                    v = model.next[v]
+                elif kind == 'choice':
+                    for guard, target in model.branches[v]:
+                        if guard is None or guard(self):
+                            v = target
+                            break
+                    else:
+                        raise RuntimeError('no branch of a decision node of procedure ' +
+                                           model.pr_name + ' can be taken')
+                else:
+                    self.cur_node = STOPPED
+                    return
+            # Non-transient action node
+            self.cur_node = model.index[v]
+            action = model.action[v]
+            if action is not None:
+                action(self)
+
+    def run(self, n_ticks):
+        """ Execute the procedure n_ticks times """
+        for i in range(n_ticks):
+            self.execute()
+
+
+class PrBatch:
+    """ Batch of n independent instances of a simulated procedure.
+    The state of the instances is held in arrays (NumPy arrays if NumPy is
+    available and arrays of the array module otherwise): cur_node,
+    pr_exec_cnt and node_exec_cnt. Dictionary data is available to the
+    guards and actions.
+    A guard is called with the batch and with the indices of the instances
+    which evaluate it (a NumPy array or a list) and returns a sequence of
+    the same length holding the value of the guard for each instance. An
+    action is called with the batch and with the indices of the instances
+    which execute it. Function per_instance builds a guard or action of a
+    batch from a function which handles one instance.
+    One execution of the batch (method execute) executes all instances
+    once: the instances are grouped by current node and each group goes
+    through the procedure together.
+    """
+    def __init__(self, model, n, data=None):
+        self.model = model
+        self.n = n
+        if numpy is not None:
+            self.cur_node = numpy.zeros(n, dtype=numpy.int32)
+            self.pr_exec_cnt = numpy.zeros(n, dtype=numpy.int64)
+            self.node_exec_cnt = numpy.zeros(n, dtype=numpy.int64)
+        else:
+            self.cur_node = array.array('i', [STOPPED])*n
+            self.pr_exec_cnt = array.array('q', [0])*n
+            self.node_exec_cnt = array.array('q', [0])*n
+        self.data = {} if data is None else data
+
+    def all(self):
+        """ Return the indices of all instances """
+        return numpy.arange(self.n) if numpy is not None else list(range(self.n))
+
+    def find(self, node):
+        """ Return the indices of the instances whose current node has the
+            argument index
+        """
+        if numpy is not None:
+            return numpy.flatnonzero(self.cur_node == node)
+        return [i for i, cur_node in enumerate(self.cur_node) if cur_node == node]
+
+    def set(self, values, idx, value):
+        """ Set the items with the argument indices of an array of the batch """
+        if numpy is not None:
+            values[idx] = value
+        else:
+            for i in idx:
+                values[i] = value
+
+    def start(self, idx=None):
+        """ Start the stopped instances among those with the argument indices
+            (by default, all instances)
+        """
+        stopped = self.find(STOPPED)
+        if idx is not None:
+            if numpy is not None:
+                stopped = numpy.intersect1d(stopped, idx)
+            else:
+                stopped = sorted(set(stopped).intersection(idx))
+        self.set(self.cur_node, stopped, INIT)
+        self.set(self.pr_exec_cnt, stopped, 0)
+        self.set(self.node_exec_cnt, stopped, 0)
+
+    def stop(self, idx=None):
+        """ Stop the instances with the argument indices (by default, all instances) """
+        self.set(self.cur_node, self.all() if idx is None else idx, STOPPED)
+
+    def get_groups(self):
+        """ Return the list of the (node index, instance indices) pairs of
+            the started instances grouped by current node
+        """
+        if numpy is not None:
+            started = numpy.flatnonzero(self.cur_node != STOPPED)
+            cur_node = self.cur_node[started]
+            order = started[numpy.argsort(cur_node, kind='stable')]
+            counts = numpy.bincount(cur_node, minlength=len(self.model.names))
+            ends = numpy.cumsum(counts)
+            return [(node, order[ends[node]-counts[node]:ends[node]])
+                    for node in numpy.flatnonzero(counts)]
+        groups = {}
+        for i, cur_node in enumerate(self.cur_node):
+            if cur_node != STOPPED:
+                groups.setdefault(cur_node, []).append(i)
+        return sorted(groups.items())
+
+    def split(self, idx, values):
+        """ Return the indices in idx for which the argument guard values
+            are true and those for which they are false
+        """
+        if numpy is not None:
+            mask = numpy.asarray(values, dtype=bool)
+            return idx[mask], idx[~mask]
+        taken = []
+        others = []
+        for i, value in zip(idx, values):
+            (taken if value else others).append(i)
+        return taken, others
+
+    def execute(self):
+        """ Execute all started instances once """
+        model = self.model
+        groups = self.get_groups()
+        if numpy is not None:
+            started = self.cur_node != STOPPED
+            self.pr_exec_cnt[started] += 1
+            self.node_exec_cnt[started] += 1
+        else:
+            for node, idx in groups:
+                for i in idx:
+                    self.pr_exec_cnt[i] += 1
+                    self.node_exec_cnt[i] += 1
+        # Pending work as (vertex, instance indices, entered) triples: the
+        # instances either enter vertex v or wait in it (entered is False)
+        stack = [(model.wait[node], idx, False) for node, idx in groups]
+        while len(stack) > 0:
+            v, idx, entered = stack.pop()
+            if not entered:
+                guard = model.guard[v]
+                if guard is not None:
+                    idx = self.split(idx, guard(self, idx))[0]
+                    if len(idx) == 0:
+                        continue
+                self.set(self.node_exec_cnt, idx, 0)
+                stack.append((model.next[v], idx, True))
+                continue
+            kind = model.kind[v]
+            if kind == 'state':
+                self.set(self.cur_node, idx, model.index[v])
+                action = model.action[v]
+                if action is not None:
+                    action(self, idx)
+                if model.transient[v]:
+                    stack.append((model.next[v], idx, True))
+                else:
+                    stack.append((v, idx, False))
+            elif kind == 'choice':
+                for guard, target in model.branches[v]:
+                    if guard is None:
+                        taken, idx = idx, idx[:0]
+                    else:
+                        taken, idx = self.split(idx, guard(self, idx))
+                    if len(taken) > 0:
+                        stack.append((target, taken, True))
+                    if len(idx) == 0:
+                        break
+                if len(idx) > 0:
+                    raise RuntimeError('no branch of a decision node of procedure ' +
+                                       model.pr_name + ' can be taken')
+            else:
+                self.set(self.cur_node, idx, STOPPED)
+
+    def get_residency(self):
+        """ Return the number of instances in each node (indexed by node index) """
+        if numpy is not None:
+            return numpy.bincount(self.cur_node, minlength=len(self.model.names)).tolist()
+        counts = [0]*len(self.model.names)
+        for cur_node in self.cur_node:
+            counts[cur_node] += 1
+        return counts
+
+
+def per_instance(fnc):
+    """ Return the guard or action of a batch which calls the argument
+        function with the batch and with the index of each instance (the
+        return values are collected in a list)
+    """
+    return lambda batch, idx: [fnc(batch, i) for i in idx]
+
+
+def random_guard(rnd, probability):
+    """ Return a batch guard which is true with the argument probability
+        (rnd is a random.Random instance used if NumPy is not available)
+    """
+    if numpy is not None:
+        rng = numpy.random.default_rng(rnd.getrandbits(32))
+        return lambda batch, idx: rng.random(len(idx)) < probability
+    return lambda batch, idx: [rnd.random() < probability for i in idx]
+
+
+def simulate(pr_desc, n_instances, n_ticks, probability, seed):
+    """ Run n_instances of the procedure for n_ticks with random guards which
+        are true with the argument probability (instances which terminate are
+        restarted) and return the number of ticks spent in each node as a
+        dictionary indexed by node name
+    """
+    rnd = random.Random(seed)
+    model = PrModel(pr_desc, default_guard=random_guard(rnd, probability))
+    batch = PrBatch(model, n_instances)
+    counts = [0]*len(model.names)
+    for tick in range(n_ticks):
+        batch.start()
+        batch.execute()
+        for node, count in enumerate(batch.get_residency()):
+            counts[node] += count
+    return {name: count for name, count in zip(model.names, counts)}
+
+
+def main(argv):
+    """ Simulate the procedure model given on the command line """
+    parser = argparse.ArgumentParser(description='Simulate a FW Profile procedure')
+    parser.add_argument('--instances', type=int, default=1000, help='number of instances')
+    parser.add_argument('--ticks', type=int, default=1000, help='number of executions')
+    parser.add_argument('--probability', type=float, default=0.5,
+                        help='probability that a guard is true')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random guards')
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help='write the number of ticks spent in each node to FILE')
+    parser.add_argument('json_file_name', help='json file of the procedure')
+    args = parser.parse_args(argv)
+
+    pr_desc = get_pr_desc(load_model(args.json_file_name))
+    if pr_desc is None:
+        parser.error(args.json_file_name + ' does not hold a procedure')
+    counts = simulate(pr_desc, args.instances, args.ticks, args.probability, args.seed)
+    total = sum(counts.values())
+    for name, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print('%-30s %8.4f' % (name, count/total))
+    if args.profile is not None:
+        with open(args.profile, 'w') as fd:
+            json.dump(counts, fd, indent=2)
+    return
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
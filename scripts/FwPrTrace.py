@@ -0,0 +1,150 @@
+""" Decoder of the execution traces of FW Profile procedures.
+The code generated by FwGenCode with configuration parameter trace set to
+True records the node entries and the guard evaluations of a procedure in a
+trace buffer (see FwGenCode.pr_create_header). This script maps a binary
+dump of the trace buffer back to the names of the nodes and of the guards
+of the procedure using its descriptor (see FwGenCode.get_trace_names).
+
+The dump is the content of the trace buffer as it is held in memory: a
+sequence of 8-byte records holding a 32-bit tick, a 16-bit event and a
+16-bit instance index or, if the code was generated in multi-instance 
+mode, of 12-byte records holding a 32-bit tick, a 16-bit event, 16 unused
+bits and a 32-bit instance index. If the number of records written to the buffer (the
+trace counter of the procedure) is given, the records are put back in the
+order in which they were written and the unused records are discarded;
+otherwise the records are decoded in the order of the dump.
+
+The decoder is called as follows:
+
+> python FwPrTrace.py [--count N] [--big-endian] [--reproducible]
+                      [--multi-instance] [--profile File] FwModel.json TraceFile
+
+Option '--reproducible' must be given if the code was generated in
+reproducible mode (the identifiers of the guards depend on this mode).
+Option '--multi-instance' must be given if the code was generated in
+multi-instance mode (the records hold a 32-bit instance index).
+Each record is printed on one line with its tick, its instance index and
+the node which is entered or the guard which is evaluated and its value.
+With option '--profile', the number of ticks spent in each node (see 
+get_residency) is written in json format to the argument file (the file
+may be used as node profile by FwGenCode.py).
+"""
+
+__author__ = 'Alessandro Pasetti, P&P software GmbH'
+
+import sys
+import json
+import struct
+import argparse
+
+import FwGenCode
+from FwDesc import get_pr_desc, load_model
+
+""" Format of a trace record (without byte order) """
+TRACE_REC_FORMAT = 'IHH'
+""" Format of a trace record in multi-instance mode (without byte order) """
+MULTI_TRACE_REC_FORMAT = 'IHxxI'
+""" Flag set in the event of the records of guard evaluations """
+GUARD_EVENT = 0x8000
+
+def get_records(data, count=None, byte_order='<', multi_instance=False):
+    """ Return the (tick, event, inst) records held in the argument dump of
+        a trace buffer. If count (the number of records written to the
+        buffer) is given, the records are returned in the order in which
+        they were written. Argument multi_instance must be True if the code
+        was generated in multi-instance mode.
+    """
+    rec_format = byte_order + (MULTI_TRACE_REC_FORMAT if multi_instance else TRACE_REC_FORMAT)
+    rec_size = struct.calcsize(rec_format)
+    if len(data) % rec_size != 0:
+        raise ValueError('the size of the trace is not a multiple of %d' % rec_size)
+    records = list(struct.iter_unpack(rec_format, data))
+    if count is not None:
+        if count < len(records):
+            records = records[:count]
+        else:
+            first = count % len(records)
+            records = records[first:] + records[:first]
+    return records
+
+
+def decode(pr_desc, records):
+    """ Return the argument trace records as (tick, inst, kind, name, value)
+        tuples where kind is 'node' (name is the name of the node which is
+        entered and value is None) or 'guard' (name is the (source name,
+        target name) pair of the connection of the guard and value is the
+        value of the guard)
+    """
+    node_names, guards = FwGenCode.get_trace_names(pr_desc)
+    decoded = []
+    for tick, event, inst in records:
+        if event & GUARD_EVENT:
+            guard_id = (event & ~GUARD_EVENT) >> 1
+            if guard_id >= len(guards):
+                raise ValueError('unknown guard identifier %d at tick %d' % (guard_id, tick))
+            decoded.append((tick, inst, 'guard', guards[guard_id], event & 1))
+        else:
+            if event >= len(node_names):
+                raise ValueError('unknown node identifier %d at tick %d' % (event, tick))
+            decoded.append((tick, inst, 'node', node_names[event], None))
+    return decoded
+
+
+def get_residency(decoded):
+    """ Return the number of ticks spent in each node in the argument decoded
+        trace (see decode) as a dictionary indexed by node name. The ticks
+        spent in a node are the ticks between its entry and the next node
+        entry of the same instance (the ticks after the last node entry of
+        an instance are not counted).
+    """
+    residency = {}
+    last = {}       # Last node entry of each instance as a (tick, name) pair
+    for tick, inst, kind, name, value in decoded:
+        if kind != 'node':
+            continue
+        if inst in last:
+            entry_tick, entry_name = last[inst]
+            residency[entry_name] = residency.get(entry_name, 0) + \
+                ((tick - entry_tick) & 0xFFFFFFFF)
+        last[inst] = (tick, name)
+    return residency
+
+
+def main(argv):
+    """ Decode the trace given on the command line """
+    parser = argparse.ArgumentParser(description='Decode the trace of a FW Profile procedure')
+    parser.add_argument('--count', type=int, default=None,
+                        help='number of records written to the trace buffer')
+    parser.add_argument('--big-endian', action='store_true',
+                        help='the trace was written by a big-endian target')
+    parser.add_argument('--reproducible', action='store_true',
+                        help='the code was generated in reproducible mode')
+    parser.add_argument('--multi-instance', action='store_true',
+                        help='the code was generated in multi-instance mode')
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help='write the number of ticks spent in each node to FILE')
+    parser.add_argument('json_file_name', help='json file of the procedure')
+    parser.add_argument('trace_file_name', help='binary dump of the trace buffer')
+    args = parser.parse_args(argv)
+
+    FwGenCode.reproducible = FwGenCode.reproducible or args.reproducible
+    pr_desc = get_pr_desc(load_model(args.json_file_name))
+    if pr_desc is None:
+        parser.error(args.json_file_name + ' does not hold a procedure')
+    with open(args.trace_file_name, 'rb') as fd:
+        data = fd.read()
+    records = get_records(data, args.count, '>' if args.big_endian else '<', 
+                          args.multi_instance)
+    decoded = decode(pr_desc, records)
+    for tick, inst, kind, name, value in decoded:
+        if kind == 'node':
+            print('%10d %5d  node   %s' % (tick, inst, name))
+        else:
+            print('%10d %5d  guard  %s->%s = %d' % (tick, inst, name[0], name[1], value))
+    if args.profile is not None:
+        with open(args.profile, 'w') as fd:
+            json.dump(get_residency(decoded), fd, indent=2)
+    return
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,232 @@
+""" Worst-case execution path analysis of FW Profile procedures.
+In the code generated by FwGenCode, a call to the Execute function of a
+procedure evaluates the guard on the out-going connection of the current
+node and, if it is true, runs through the nodes which follow it: when it
+enters a non-transient node (see FwGenCode.is_node_transient), it evaluates
+the guard on the out-going connection of that node in the same way. The
+call returns when such a guard is false or when the final node is entered.
+This module computes, for each node where the procedure may wait (the 
+initial node and the non-transient action nodes), the largest cost of one
+call to the Execute function and the sequence of action and guard calls 
+which has this cost (on this sequence, the guards of the non-transient 
+nodes are true: this is never cheaper than stopping at one of them).
+
+The cost of a call is the sum of the costs of the action and guard
+functions which it calls. By default, each function costs 1 (the cost of
+a call is then the number of functions it calls); other costs may be
+given for each function (for instance, their worst-case execution time).
+On a decision node, the guards are evaluated in the order of their
+connections: the cost of following a branch includes the costs of the
+guards of the branches before it.
+
+The graph of the nodes is processed in linear time: its
+strongly connected components are visited in reverse topological order
+(see FwGenCode.get_sccs) and the worst-case cost from each node is
+computed from the costs of its successors (dynamic programming over a
+directed acyclic graph). The cost is unbounded (infinite) for a node
+which may lead to one of the following hazards:
+- a cycle of nodes without guards: the while(1) loop of the Execute
+  function never terminates
+- a cycle of nodes through guards (for instance, a loop through 
+  non-transient nodes): the number of iterations depends on the guards
+- a decision node without else branch: if no branch can be taken, the
+  Execute function may not return
+
+The analysis script is called as follows:
+
+> python FwPrWcet.py [--costs File] [--default-cost C] [--sequences] FwModel.json
+
+The costs of the functions are read from the argument json file as an
+object mapping the function names (as in the generated code) to their
+costs; the functions which are not listed cost C (default: 1). For each
+waiting node, the script prints the largest number of function calls and
+the largest cost of one call to the Execute function and, with option
+'--sequences', the sequence of function calls with the largest cost.
+The hazards are printed at the end.
+"""
+
+__author__ = 'Alessandro Pasetti, P&P software GmbH'
+
+import sys
+import json
+import argparse
+
+import FwGenCode
+from FwDesc import get_pr_desc, load_model
+
+""" Cost of a call to an Execute function which may never return """
+UNBOUNDED = float('inf')
+
+def get_wcet(pr_desc, costs={}, default_cost=1):
+    """ Return the worst-case cost of one call to the Execute function of
+        the procedure in the argument descriptor from each waiting node
+        and the list of the hazards of the procedure (see module
+        documentation). Argument costs maps function names to their costs
+        and default_cost is the cost of the other functions.
+        The worst-case costs are returned as a list of (node name, cost,
+        sequence, hazard) tuples in the order of the nodes in the generated
+        code (see FwGenCode.get_pr_symbols). If the cost is bounded, the
+        sequence is the list of the calls with this cost as (kind, function
+        name, value) tuples where kind is 'guard' (value is the value of
+        the guard on the path) or 'action' (value is None) and hazard is
+        None. Otherwise, the cost is UNBOUNDED, the sequence is None and
+        hazard is the hazard which the node may lead to.
+        A ValueError is raised if a cost is negative or if a function is
+        not called by the procedure.
+    """
+    symbols = FwGenCode.get_pr_symbols(pr_desc)
+    transient = symbols['transient']
+    guard_fncs = symbols['guard_fncs']
+    node_fncs = symbols['node_fncs']
+    fncs = set(node_fncs.values()) | set(fnc for fnc in guard_fncs.values() if fnc != None)
+    unknown = sorted(set(costs) - fncs)
+    if len(unknown) > 0:
+        raise ValueError('unknown functions: ' + ', '.join(unknown))
+    if default_cost < 0 or any(cost < 0 for cost in costs.values()):
+        raise ValueError('function costs must not be negative')
+
+    def get_cost(fnc):
+        return costs.get(fnc, default_cost)
+
+    def get_action_cost(node):
+        return 0 if node.is_do_nothing else get_cost(node_fncs[node.id])
+
+    def get_branches(node):
+        return sorted(node.outgoing_connections, key=lambda c: c.order)
+
+    bound = {}      # Worst-case cost from the entry into each node
+    choice = {}     # Branch taken on the worst-case path from each decision node
+    cause = {}      # Hazard which each node with an unbounded cost may lead to
+    hazards = []
+
+    def get_wait_cost(node):
+        """ Return the worst-case cost from the evaluation of the guard on 
+            the out-going connection of the argument node (in which the 
+            procedure waits)
+        """
+        connection = node.outgoing_connections[0]
+        guard_fnc = guard_fncs[connection]
+        cost = get_cost(guard_fnc) if guard_fnc != None else 0
+        return cost + bound[connection.to_id]
+
+    def get_successors(node):
+        return [c.to_state for c in node.outgoing_connections]
+
+    for scc in FwGenCode.get_sccs(symbols['states'], get_successors):
+        node = scc[-1]
+        if len(scc) > 1 or any(c.to_state is node for c in node.outgoing_connections):
+            members = set(member.id for member in scc)
+            def get_unguarded(member):
+                return [c.to_state for c in member.outgoing_connections
+                        if c.to_id in members and guard_fncs[c] == None]
+            names = ', '.join(sorted(member.name for member in scc))
+            if any(len(cycle) > 1 or any(c.to_state is cycle[0] and guard_fncs[c] == None
+                                         for c in cycle[0].outgoing_connections)
+                   for cycle in FwGenCode.get_sccs(scc, get_unguarded)):
+                hazard = 'the nodes %s form a cycle without guards' % names
+            else:
+                hazard = 'the nodes %s form a cycle through guards' % names
+            hazards.append(hazard)
+            for member in scc:
+                bound[member.id] = UNBOUNDED
+                cause[member.id] = hazard
+        elif node.type == 'final':
+            bound[node.id] = 0
+        elif node.type in ('init', 'state'):
+            succ = node.outgoing_connections[0].to_state
+            if node.type == 'init':
+                bound[node.id] = get_wait_cost(node)
+            elif transient[node.id]:
+                bound[node.id] = get_action_cost(node) + bound[succ.id]
+            else:
+                bound[node.id] = get_action_cost(node) + get_wait_cost(node)
+            if succ.id in cause:
+                cause[node.id] = cause[succ.id]
+        else:
+            total = 0
+            best = -1
+            for connection in get_branches(node):
+                if guard_fncs[connection] != None:
+                    total += get_cost(guard_fncs[connection])
+                cost = total + bound[connection.to_id]
+                if cost > best:
+                    best = cost
+                    choice[node.id] = connection
+            bound[node.id] = best
+            if guard_fncs[connection] != None:
+                hazard = 'decision node %s has no else branch' % node.name
+                hazards.append(hazard)
+                bound[node.id] = UNBOUNDED
+                cause[node.id] = hazard
+            elif choice[node.id].to_id in cause:
+                cause[node.id] = cause[choice[node.id].to_id]
+
+    wcet = []
+    for node in symbols['states']:
+        if transient[node.id] or node.type not in ('init', 'state'):
+            continue
+        cost = get_wait_cost(node)
+        if cost == UNBOUNDED:
+            wcet.append((node.name, UNBOUNDED, None, cause[node.outgoing_connections[0].to_id]))
+            continue
+        sequence = []
+        succ = node
+        while succ.type != 'final':
+            if succ.type == 'choice':
+                taken = choice[succ.id]
+                for branch in get_branches(succ):
+                    if guard_fncs[branch] != None:
+                        sequence.append(('guard', guard_fncs[branch], int(branch is taken)))
+                    if branch is taken:
+                        break
+                succ = taken.to_state
+                continue
+            if succ is not node and not succ.is_do_nothing:
+                sequence.append(('action', node_fncs[succ.id], None))
+            connection = succ.outgoing_connections[0]
+            if guard_fncs[connection] != None:
+                sequence.append(('guard', guard_fncs[connection], 1))
+            succ = connection.to_state
+        wcet.append((node.name, cost, sequence, None))
+    return wcet, hazards
+
+
+def main(argv):
+    """ Analyse the procedure model given on the command line """
+    parser = argparse.ArgumentParser(description='Compute the worst-case cost of the '
+                                     'Execute function of a FW Profile procedure')
+    parser.add_argument('--costs', metavar='FILE', default=None,
+                        help='json file with the costs of the functions')
+    parser.add_argument('--default-cost', type=float, default=1,
+                        help='cost of the functions without a cost in the costs file')
+    parser.add_argument('--sequences', action='store_true',
+                        help='print the sequence of calls with the largest cost')
+    parser.add_argument('json_file_name', help='json file of the procedure')
+    args = parser.parse_args(argv)
+
+    pr_desc = get_pr_desc(load_model(args.json_file_name))
+    if pr_desc is None:
+        parser.error(args.json_file_name + ' does not hold a procedure')
+    costs = {}
+    if args.costs is not None:
+        with open(args.costs) as fd:
+            costs = json.load(fd)
+    counts, hazards = get_wcet(pr_desc)
+    wcet = get_wcet(pr_desc, costs, args.default_cost)[0]
+    print('%-30s %10s %12s' % ('Node', 'Calls', 'Cost'))
+    for i, (name, cost, sequence, hazard) in enumerate(wcet):
+        print('%-30s %10g %12g' % (name, counts[i][1], cost))
+        if not args.sequences:
+            continue
+        if sequence is None:
+            print('    unbounded: ' + hazard)
+            continue
+        for kind, fnc, value in sequence:
+            call = fnc + '()' if kind == 'action' else '%s() == %d' % (fnc, value)
+            print('    %10g  %s' % (costs.get(fnc, args.default_cost), call))
+    for hazard in hazards:
+        print('hazard: ' + hazard)
+    return
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
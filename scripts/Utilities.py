@@ -2,57 +2,136 @@
 
 __author__ = 'Alessandro Pasetti, P&P software GmbH'
 
-import sys
 import os
-import argparse
-import shutil
-import csv
-import pdb
-import json
-import operator
 import re
-import copy
+import functools
 import zipfile
-import datetime;
+import datetime
+import time
 
 """ Maximum length of a line in doxygen comment """
 MAX_LINE_LENGTH = 80
+""" Number of fragments after which the Emitter joins its last fragments into one chunk """
+EMITTER_CHUNK_SIZE = 1024
+""" Maximum number of wrapped texts kept in the cache of wrapText """
+WRAP_CACHE_SIZE = 8192
+""" Regular expression matching the line with the timestamp of a generated file """
+TIMESTAMP_LINE_PATTERN = r'^ \* @note This file was generated on .*\n'
+
+#===============================================================================
+class Emitter:
+    """ Buffer for generated code.
+    Fragments of code are appended to a list and, every EMITTER_CHUNK_SIZE
+    fragments, the last fragments are joined into one chunk (this bounds
+    the memory taken by the fragments while each character is copied only 
+    once). The chunks are joined when the content of the buffer is 
+    retrieved through getvalue or are passed as they are to a sink (see
+    getparts). 
+    The emitter holds an indentation level: the lines written through
+    method line are prefixed by the indentation string repeated as many
+    times as the indentation level.
+    """
+    def __init__(self, ind='    '):
+        self.parts = []
+        self.chunks = 0
+        self.ind = ind
+        self.level = 0
+        self.prefixes = ['']
+        
+    def indent(self, n=1):
+        """ Increase the indentation level by n """
+        self.level += n
+        while len(self.prefixes) <= self.level:
+            self.prefixes.append(self.ind*len(self.prefixes))
+        
+    def dedent(self, n=1):
+        """ Decrease the indentation level by n """
+        assert(self.level >= n)
+        self.level -= n
+        
+    def write(self, text):
+        """ Append the argument text without indentation """
+        self.parts.append(text)
+        if len(self.parts) - self.chunks >= EMITTER_CHUNK_SIZE:
+            self.compact()
+        
+    def line(self, text, end='\n'):
+        """ Append the argument text at the current indentation level 
+            followed by end (by default, a new line).
+        """
+        self.parts.append(self.prefixes[self.level] + text + end)
+        if len(self.parts) - self.chunks >= EMITTER_CHUNK_SIZE:
+            self.compact()
+
+    def compact(self):
+        """ Join the fragments appended after the last chunk into one chunk """
+        self.parts[self.chunks:] = [''.join(self.parts[self.chunks:])]
+        self.chunks += 1
+        
+    def endswith(self, text):
+        """ Return True if the buffer ends with the argument text (which must
+            not span more than one fragment)
+        """
+        return len(self.parts) > 0 and self.parts[-1].endswith(text)
+        
+    def getvalue(self):
+        """ Return the content of the buffer """
+        if len(self.parts) > 1:
+            self.parts = [''.join(self.parts)]
+            self.chunks = 1
+        return self.parts[0] if len(self.parts) > 0 else ''
+
+    def getparts(self):
+        """ Return the content of the buffer as a list of chunks and 
+            fragments (they are not joined)
+        """
+        return self.parts
+
+#===============================================================================
+@functools.lru_cache(maxsize=WRAP_CACHE_SIZE)
+def wrapText(text, width):
+    """ Split the words of the argument text into lines of at most width
+        characters and return the lines as a tuple of strings.
+        Words are separated by one space (the white space of the text, 
+        including line breaks, is not preserved) and a word longer than
+        width is placed on a line of its own.
+        The results are kept in a cache of at most WRAP_CACHE_SIZE entries
+        (least recently used entries are discarded first) because the same
+        descriptions are often repeated in a model.
+    """
+    words = text.split()
+    lines = []
+    start = 0
+    length = -1
+    for i, word in enumerate(words):
+        length += len(word) + 1
+        if length > width and i > start:
+            lines.append(' '.join(words[start:i]))
+            start = i
+            length = len(word)
+    if start < len(words):
+        lines.append(' '.join(words[start:]))
+    return tuple(lines)
 
 #===============================================================================
 def writeDoxy(lines):
     """ Write a list of strings as a doxygen comment to a string and return the string.
         Empty items in the list of strings are ignored.
-        Strings which are longer than MAX_LINE_LENGTH are split to fit within MAX_LINE_LENGTH.    
+        Strings which do not fit within MAX_LINE_LENGTH (including the comment
+        delimiters) or which span several lines are wrapped (see wrapText).
     """
-    f = ''
+    width = MAX_LINE_LENGTH - len(' * ')
     newLines = []
     for line in lines:
-        if line == '':
-            continue
-        if len(line)<=MAX_LINE_LENGTH:
-            newLines.append(line)
+        if len(line) <= width and '\n' not in line:
+            if line != '':
+                newLines.append(line)
         else:
-            words = line.split()
-            newLine = ''
-            length = 0
-            for word in words:
-                length += len(word)+1
-                newLine += word + ' '
-                if (length>MAX_LINE_LENGTH):
-                    newLines.append(newLine)
-                    newLine = ''
-                    length =0
-            if length>0:
-                newLines.append(newLine)
+            newLines.extend(wrapText(line, width))
        
-    if len(newLines) == 1:
-        f += '/** ' + newLines[0] + ' */'+'\n'
-    else:
-        f = f + '/**\n'
-        for s in newLines:
-            f = f + ' * ' + s + '\n'
-        f = f + ' */\n'
-    return f
+    if len(newLines) == 1 and len(newLines[0]) <= MAX_LINE_LENGTH - len('/**  */'):
+        return '/** ' + newLines[0] + ' */'+'\n'
+    return '/**\n' + ''.join([' * ' + s + '\n' for s in newLines]) + ' */\n'
 
 #===============================================================================
 def formatAsPartOfComment(text):
@@ -66,59 +145,227 @@ def formatAsPartOfComment(text):
     (c) Words should not be split across lines
     (d) Each line should start with the following characters: ' *'
     """
-    words = text.split()
-    lines = []
-    line = ' *'
-    line_length = 2  # account for the initial ' *'
-    
-    for word in words:
-        if line_length + len(word) + 1 > MAX_LINE_LENGTH:
-            lines.append(line)
-            line = ' * ' + word
-            line_length = 3 + len(word)
-        else:
-            line += ' ' + word
-            line_length += len(word) + 1
-    
-    lines.append(line)
-    return '\n'.join(lines)
+    lines = wrapText(text, MAX_LINE_LENGTH - len(' * '))
+    if len(lines) == 0:
+        return ' *'
+    return '\n'.join([' * ' + line for line in lines])
     
 #===============================================================================
-def createBodyFile(dirName, modelName, content, shortDesc):
-    """Create a body file with the given name and the given content."""
-    name = dirName + '/' + modelName + '.c'
-    ct = str(datetime.datetime.now())
+def stripTimestamp(text):
+    """ Return the argument file content without the line holding the 
+        generation timestamp. 
+    """
+    return re.sub(TIMESTAMP_LINE_PATTERN, '', text, count=1, flags=re.MULTILINE)
+
+#===============================================================================
+def asParts(text):
+    """ Return the argument file content as a list of strings: the content
+        of a generated file is either a string or a list of strings which 
+        are written in sequence.
+    """
+    return [text] if isinstance(text, str) else text
+
+#===============================================================================
+def sameText(text, parts):
+    """ Return True if the argument string is equal to the concatenation of
+        the argument list of strings (the strings are not joined)
+    """
+    pos = 0
+    for part in parts:
+        if not text.startswith(part, pos):
+            return False
+        pos += len(part)
+    return pos == len(text)
+
+""" Statistics of the generated files: number of files, number of bytes and 
+    time in seconds spent writing them to their sink (see FwGenCode.run_phase) """
+write_stats = {'files': 0, 'bytes': 0, 'time': 0.0}
+
+#===============================================================================
+def writeFile(name, text, keepUnchanged=False):
+    """ Write the argument text (a string or a list of strings, see asParts)
+        to the file with the argument name.
+        If keepUnchanged is True and the file already holds the same text
+        (ignoring the generation timestamp, which must be in the first 
+        string of the list), the file is not written (its modification time
+        is not changed). 
+        Return True if the file was written and False otherwise.
+    """
+    start = time.perf_counter()
+    parts = asParts(text)
+    if keepUnchanged and os.path.isfile(name):
+        with open(name) as fd:
+            newParts = [stripTimestamp(parts[0])] + parts[1:] if len(parts) > 0 else parts
+            if sameText(stripTimestamp(fd.read()), newParts):
+                write_stats['time'] += time.perf_counter() - start
+                return False
     with open(name, 'w') as fd:
-        fd.write('/**                                          \n')
-        fd.write(' * @ingroup gen_cfw                          \n')
-        fd.write(' *                                           \n')
-        fd.write(formatAsPartOfComment(shortDesc) + '  \n')
-        fd.write(' *                                           \n')
-        fd.write(' * @note This file was generated on  ' + ct + '\n')
-        fd.write(' * @author Automatically generated by CORDET Editor Code Generator\n')
-        fd.write(' * @copyright P&P Software GmbH\n')
-        fd.write(' */                                          \n')
-        fd.write('\n')
-        fd.write(content)
-
-#===============================================================================
-def createHeaderFile(dirName, modelName, content, modelDesc):
-    """ Create a header file for a procedure or state machine model. """
-    name = dirName + '/' + modelName + '.h'
-    ct = str(datetime.datetime.now())
+        fd.writelines(parts)
+    write_stats['files'] += 1
+    write_stats['bytes'] += sum(len(part) for part in parts)
+    write_stats['time'] += time.perf_counter() - start
+    return True
+
+#===============================================================================
+class Sink:
+    """ Destination of the generated files.
+    A sink receives the generated files through method write and is 
+    released through method close (sinks are also context managers).
+    """
+    def write(self, name, text):
+        """ Write the file with the argument name and text and return True
+            if the file was written and False if it was left unchanged.
+            The text is either a string or a list of strings which are 
+            written in sequence without being joined (see asParts).
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ Release the resources held by the sink """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+#===============================================================================
+class DirectorySink(Sink):
+    """ Sink writing the generated files to a directory.
+    If keepUnchanged is True, the existing files which only differ from
+    the new ones in their timestamp are not overwritten (see writeFile).
+    """
+    def __init__(self, dirName, keepUnchanged=False):
+        self.dirName = dirName
+        self.keepUnchanged = keepUnchanged
+
+    def write(self, name, text):
+        return writeFile(os.path.join(self.dirName, name), text, self.keepUnchanged)
+
+#===============================================================================
+class ZipSink(Sink):
+    """ Sink writing the generated files as entries of a zip archive.
+    The archive is created by the constructor and each file is compressed
+    and written to it as it is received (the archive is complete once the
+    sink is closed).
+    """
+    def __init__(self, zipName):
+        self.zipName = zipName
+        self.zip = zipfile.ZipFile(zipName, 'w', zipfile.ZIP_DEFLATED)
+
+    def write(self, name, text):
+        start = time.perf_counter()
+        info = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o600 << 16
+        size = 0
+        with self.zip.open(info, 'w') as fd:
+            for part in asParts(text):
+                fd.write(part.encode('utf-8'))
+                size += len(part)
+        write_stats['files'] += 1
+        write_stats['bytes'] += size
+        write_stats['time'] += time.perf_counter() - start
+        return True
+
+    def close(self):
+        self.zip.close()
+
+#===============================================================================
+class MemorySink(Sink):
+    """ Sink keeping the generated files in memory.
+    Attribute files is a dictionary mapping the file names to their text
+    (a list of strings received by write is joined into one string).
+    """
+    def __init__(self):
+        self.files = {}
+
+    def write(self, name, text):
+        text = text if isinstance(text, str) else ''.join(text)
+        self.files[name] = text
+        write_stats['files'] += 1
+        write_stats['bytes'] += len(text)
+        return True
+
+#===============================================================================
+def getSink(target, keepUnchanged=False):
+    """ Return the sink for the argument target of a generator: the target
+        itself if it is already a sink or a DirectorySink if it is the name 
+        of a directory
+    """
+    if isinstance(target, Sink):
+        return target
+    return DirectorySink(target, keepUnchanged)
+
+#===============================================================================
+def getTimestamp(modelHash=None):
+    """ Return the timestamp written to the generated files. If modelHash
+        is None, this is the current time. Otherwise (reproducible output),
+        this is the time given in seconds since the epoch by environment 
+        variable SOURCE_DATE_EPOCH or, if this variable is not set, the
+        argument hash of the model (of which the first 16 digits are used).
+    """
+    if modelHash is None:
+        return str(datetime.datetime.now())
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if epoch is not None:
+        utc = datetime.datetime.fromtimestamp(int(epoch), datetime.timezone.utc)
+        return str(utc.replace(tzinfo=None))
+    return 'model ' + modelHash[:16]
+
+#===============================================================================
+def createBodyFile(dirName, modelName, content, shortDesc, keepUnchanged=False, 
+                   timestamp=None):
+    """Create a body file with the given name and the given content (a
+    string or a list of strings, see asParts).
+    The file is written to dirName, which is either a directory name or a
+    sink (see getSink).
+    If keepUnchanged is True, an existing file which differs from the new one
+    only in its timestamp is not overwritten (see writeFile).
+    The timestamp written to the file is the current time unless another 
+    timestamp is given (see getTimestamp).
+    """
+    name = modelName + '.c'
+    ct = timestamp if timestamp is not None else getTimestamp()
+    preamble = '/**                                          \n' + \
+           ' * @ingroup gen_cfw                          \n' + \
+           ' *                                           \n' + \
+           formatAsPartOfComment(shortDesc) + '  \n' + \
+           ' *                                           \n' + \
+           ' * @note This file was generated on  ' + ct + '\n' + \
+           ' * @author Automatically generated by CORDET Editor Code Generator\n' + \
+           ' * @copyright P&P Software GmbH\n' + \
+           ' */                                          \n' + \
+           '\n'
+    return getSink(dirName, keepUnchanged).write(name, [preamble] + asParts(content))
+
+#===============================================================================
+def createHeaderFile(dirName, modelName, content, modelDesc, keepUnchanged=False,
+                     timestamp=None):
+    """ Create a header file for a procedure or state machine model with
+    the given content (a string or a list of strings, see asParts).
+    The file is written to dirName, which is either a directory name or a
+    sink (see getSink).
+    If keepUnchanged is True, an existing file which differs from the new one
+    only in its timestamp is not overwritten (see writeFile).
+    The timestamp written to the file is the current time unless another 
+    timestamp is given (see getTimestamp).
+    """
+    name = modelName + '.h'
+    ct = timestamp if timestamp is not None else getTimestamp()
     ifdefName = modelName.replace('_','').upper()
-    with open(name, 'w') as fd:
-        fd.write('/**                                          \n')
-        fd.write(formatAsPartOfComment(modelDesc) + '  \n')
-        fd.write(' *                                           \n')
-        fd.write(' * @note This file was generated on  ' + ct + '\n')
-        fd.write(' * @author Automatically generated by FW Profile Code Generator\n')
-        fd.write(' * @copyright P&P Software GmbH\n')
-        fd.write(' */                                          \n')
-        fd.write('#ifndef ' + ifdefName + '_H_\n')
-        fd.write('#define ' + ifdefName + '_H_\n')
-        fd.write('\n')
-        fd.write(content)
-        fd.write('#endif /* ' + ifdefName + '_H_ */\n')
+    preamble = '/**                                          \n' + \
+           formatAsPartOfComment(modelDesc) + '  \n' + \
+           ' *                                           \n' + \
+           ' * @note This file was generated on  ' + ct + '\n' + \
+           ' * @author Automatically generated by FW Profile Code Generator\n' + \
+           ' * @copyright P&P Software GmbH\n' + \
+           ' */                                          \n' + \
+           '#ifndef ' + ifdefName + '_H_\n' + \
+           '#define ' + ifdefName + '_H_\n' + \
+           '\n'
+    trailer = '#endif /* ' + ifdefName + '_H_ */\n'
+    return getSink(dirName, keepUnchanged).write(name, [preamble] + asParts(content) + [trailer])
     
         
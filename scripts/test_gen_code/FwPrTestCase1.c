@@ -3,15 +3,16 @@
  *                                           
  * Body file for module implementing procedure TestCase1  
  *                                           
- * @note This file was generated on  2023-10-03 19:53:02.707794
+ * @note This file was generated on  2026-10-17 02:35:32.643114
  * @author Automatically generated by CORDET Editor Code Generator
  * @copyright P&P Software GmbH
  */                                          
 
-#include <TestCase1.h>
+#include "FwPrTestCase1.h"
+#include "FwPrTestCase1User.h"
 
 /** The current procedure node */
-static eTestCase1Nodes_t curNode = FwPrTestCase1Stopped;
+static eTestCase1Nodes_t curNode = eTestCase1Stopped;
 
 unsigned int FwPrTestCase1IsStarted() {
     return curNode != eTestCase1Stopped;
@@ -40,28 +41,29 @@ void FwPrTestCase1Execute() {
         if (curNode == eTestCase1Init) {
             curNode = eTestCase1N1;
             FwPrTestCase1N1();
-            if (FwPrTestCase1Decision1N2() == 1) {
+            if (FwPrTestCase1Decision1ToN2() == 1) {
                 curNode = eTestCase1N2;
                 FwPrTestCase1N2();
                 curNode = eTestCase1N4;
                 FwPrTestCase1N4();
                 curNode = eTestCase1Stopped;
                 return;
-            } else if (FwPrTestCase1Decision1Final() == 1) {
+            } else if (FwPrTestCase1Decision1ToFinal() == 1) {
                 curNode = eTestCase1Stopped;
                 return;
             } else  {
+                curNode = eTestCase1N3;
                 FwPrTestCase1N3();
+                continue;
             }
         }
         if (curNode == eTestCase1N3) {
-            if (FwPrTestCase1N3N5() == 0) {
-                return
+            if (FwPrTestCase1N3ToN5() == 0)
+                return;
             curNode = eTestCase1N5;
             FwPrTestCase1N5();
             curNode = eTestCase1Stopped;
             return;
-            }
         }
     }
 }
@@ -4,7 +4,7 @@
  * performed on the procedure: (a) Start, stop and execute the procedure (b)
  * Query the procedure for its start/stop state and for its current node  
  *                                           
- * @note This file was generated on  2023-10-03 19:53:02.707728
+ * @note This file was generated on  2026-10-17 02:35:32.642612
  * @author Automatically generated by FW Profile Code Generator
  * @copyright P&P Software GmbH
  */                                          
@@ -13,12 +13,13 @@
 
 /** Enumerated type for the procedure nodes */
 typedef enum {
-    eTestCase1Stopped = 0;
-    eTestCase1N1 = 1;
-    eTestCase1N2 = 2;
-    eTestCase1N3 = 3;
-    eTestCase1N4 = 4;
-    eTestCase1N5 = 5;
+    eTestCase1Stopped = 0,
+    eTestCase1Init = 1,
+    eTestCase1N1 = 2,
+    eTestCase1N2 = 3,
+    eTestCase1N3 = 4,
+    eTestCase1N4 = 5,
+    eTestCase1N5 = 6,
 } eTestCase1Nodes_t;
 
 /** Function to start procedure TestCase1 */
@@ -28,7 +29,7 @@ void FwPrTestCase1Start();
 void FwPrTestCase1Stop();
 
 /** Function to execute procedure TestCase1 */
-void FwPrTestCase1Exec();
+void FwPrTestCase1Execute();
 
 /**
  * Check the current state of procedure TestCase1
@@ -40,6 +41,6 @@ unsigned int FwPrTestCase1IsStarted();
  * Get the current node of the procedure TestCase1
  * @return -1 if the procedure is stopped; otherwise the current node
  */
-eTestCase1Nodes_tTestCase1GetCurNode();
+eTestCase1Nodes_t FwPrTestCase1GetCurNode();
 
 #endif /* FWPRTESTCASE1_H_ */
@@ -3,7 +3,7 @@
  * procedure of TestCase1.The user is responsible for providing a C body file
  * which implements all the functions declared in this header file.  
  *                                           
- * @note This file was generated on  2023-10-03 19:53:02.707600
+ * @note This file was generated on  2026-10-17 02:35:32.641444
  * @author Automatically generated by FW Profile Code Generator
  * @copyright P&P Software GmbH
  */                                          
@@ -43,19 +43,22 @@ void FwPrTestCase1N5();
 /**
  * Function implementing the guard from Decision1 to N2
  * Flag_1
+ * @return 1 if the guard is true; 0 otherwise
  */
-void FwPrTestCase1TestCase1Decision1ToN2();
+int FwPrTestCase1Decision1ToN2();
 
 /**
  * Function implementing the guard from N3 to N5
  * Wait Condition 1
+ * @return 1 if the guard is true; 0 otherwise
  */
-void FwPrTestCase1TestCase1N3ToN5();
+int FwPrTestCase1N3ToN5();
 
 /**
  * Function implementing the guard from Decision1 to Final
  * Flag_2
+ * @return 1 if the guard is true; 0 otherwise
  */
-void FwPrTestCase1TestCase1Decision1ToFinal();
+int FwPrTestCase1Decision1ToFinal();
 
 #endif /* FWPRTESTCASE1USER_H_ */
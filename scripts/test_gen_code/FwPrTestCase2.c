@@ -3,15 +3,16 @@
  *                                           
  * Body file for module implementing procedure TestCase2  
  *                                           
- * @note This file was generated on  2023-10-03 22:34:00.619040
+ * @note This file was generated on  2026-10-17 02:35:32.865058
  * @author Automatically generated by CORDET Editor Code Generator
  * @copyright P&P Software GmbH
  */                                          
 
-#include <TestCase2.h>
+#include "FwPrTestCase2.h"
+#include "FwPrTestCase2User.h"
 
 /** The current procedure node */
-static eTestCase2Nodes_t curNode = FwPrTestCase2Stopped;
+static eTestCase2Nodes_t curNode = eTestCase2Stopped;
 
 unsigned int FwPrTestCase2IsStarted() {
     return curNode != eTestCase2Stopped;
@@ -38,15 +39,15 @@ void FwPrTestCase2Execute() {
         return;
     while (1) {
         if (curNode == eTestCase2Init) {
-            if (FwPrTestCase2Decision1N2() == 1) {
+            if (FwPrTestCase2Decision1ToN2() == 1) {
                 curNode = eTestCase2N2;
                 FwPrTestCase2N2();
                 curNode = eTestCase2N4;
                 FwPrTestCase2N4();
                 curNode = eTestCase2Stopped;
                 return;
-            } else if (FwPrTestCase2Decision1Decision2() == 1) {
-                if (FwPrTestCase2Decision2N1() == 1) {
+            } else if (FwPrTestCase2Decision1ToDecision2() == 1) {
+                if (FwPrTestCase2Decision2ToN1() == 1) {
                     curNode = eTestCase2N1;
                     FwPrTestCase2N1();
                     curNode = eTestCase2Stopped;
@@ -58,15 +59,17 @@ void FwPrTestCase2Execute() {
                     return;
                 }
             } else  {
+                curNode = eTestCase2N3;
                 FwPrTestCase2N3();
+                continue;
             }
         }
         if (curNode == eTestCase2N3) {
-            if (FwPrTestCase2N3N5() == 0) {
-                return
+            if (FwPrTestCase2N3ToN5() == 0)
+                return;
             curNode = eTestCase2N5;
             FwPrTestCase2N5();
-            if (FwPrTestCase2Decision2N1() == 1) {
+            if (FwPrTestCase2Decision2ToN1() == 1) {
                 curNode = eTestCase2N1;
                 FwPrTestCase2N1();
                 curNode = eTestCase2Stopped;
@@ -77,7 +80,6 @@ void FwPrTestCase2Execute() {
                 curNode = eTestCase2Stopped;
                 return;
             }
-            }
         }
     }
 }
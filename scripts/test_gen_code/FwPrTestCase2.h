@@ -4,7 +4,7 @@
  * performed on the procedure: (a) Start, stop and execute the procedure (b)
  * Query the procedure for its start/stop state and for its current node  
  *                                           
- * @note This file was generated on  2023-10-03 22:34:00.618965
+ * @note This file was generated on  2026-10-17 02:35:32.864569
  * @author Automatically generated by FW Profile Code Generator
  * @copyright P&P Software GmbH
  */                                          
@@ -13,12 +13,13 @@
 
 /** Enumerated type for the procedure nodes */
 typedef enum {
-    eTestCase2Stopped = 0;
-    eTestCase2N1 = 1;
-    eTestCase2N2 = 2;
-    eTestCase2N3 = 3;
-    eTestCase2N4 = 4;
-    eTestCase2N5 = 5;
+    eTestCase2Stopped = 0,
+    eTestCase2Init = 1,
+    eTestCase2N1 = 2,
+    eTestCase2N2 = 3,
+    eTestCase2N3 = 4,
+    eTestCase2N4 = 5,
+    eTestCase2N5 = 6,
 } eTestCase2Nodes_t;
 
 /** Function to start procedure TestCase2 */
@@ -28,7 +29,7 @@ void FwPrTestCase2Start();
 void FwPrTestCase2Stop();
 
 /** Function to execute procedure TestCase2 */
-void FwPrTestCase2Exec();
+void FwPrTestCase2Execute();
 
 /**
  * Check the current state of procedure TestCase2
@@ -40,6 +41,6 @@ unsigned int FwPrTestCase2IsStarted();
  * Get the current node of the procedure TestCase2
  * @return -1 if the procedure is stopped; otherwise the current node
  */
-eTestCase2Nodes_tTestCase2GetCurNode();
+eTestCase2Nodes_t FwPrTestCase2GetCurNode();
 
 #endif /* FWPRTESTCASE2_H_ */
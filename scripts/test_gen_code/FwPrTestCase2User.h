@@ -3,7 +3,7 @@
  * procedure of TestCase2.The user is responsible for providing a C body file
  * which implements all the functions declared in this header file.  
  *                                           
- * @note This file was generated on  2023-10-03 22:34:00.618835
+ * @note This file was generated on  2026-10-17 02:35:32.863702
  * @author Automatically generated by FW Profile Code Generator
  * @copyright P&P Software GmbH
  */                                          
@@ -43,25 +43,29 @@ void FwPrTestCase2N5();
 /**
  * Function implementing the guard from Decision1 to N2
  * Flag_1
+ * @return 1 if the guard is true; 0 otherwise
  */
-void FwPrTestCase2TestCase2Decision1ToN2();
+int FwPrTestCase2Decision1ToN2();
 
 /**
  * Function implementing the guard from N3 to N5
  * Wait Condition 1
+ * @return 1 if the guard is true; 0 otherwise
  */
-void FwPrTestCase2TestCase2N3ToN5();
+int FwPrTestCase2N3ToN5();
 
 /**
  * Function implementing the guard from Decision1 to Decision2
  * Flag_2
+ * @return 1 if the guard is true; 0 otherwise
  */
-void FwPrTestCase2TestCase2Decision1ToDecision2();
+int FwPrTestCase2Decision1ToDecision2();
 
 /**
  * Function implementing the guard from Decision2 to N1
  * Flag_3
+ * @return 1 if the guard is true; 0 otherwise
  */
-void FwPrTestCase2TestCase2Decision2ToN1();
+int FwPrTestCase2Decision2ToN1();
 
 #endif /* FWPRTESTCASE2USER_H_ */
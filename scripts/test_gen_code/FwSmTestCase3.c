@@ -0,0 +1,156 @@
+/**                                          
+ * @ingroup gen_cfw                          
+ *                                           
+ * Body file for module implementing state machine TestCase3  
+ *                                           
+ * @note This file was generated on  2026-10-17 02:33:34.088354
+ * @author Automatically generated by CORDET Editor Code Generator
+ * @copyright P&P Software GmbH
+ */                                          
+
+#include "FwSmTestCase3.h"
+#include "FwSmTestCase3User.h"
+
+/** The current state of the state machine */
+static eTestCase3States_t curState = eTestCase3Stopped;
+
+/** The current state of the state machine embedded in state S2 */
+static eTestCase3States_t curStateS2 = eTestCase3Stopped;
+
+static void start();
+static void stop();
+static void makeTrans(tTestCase3Triggers_t trigger);
+static void startS2();
+static void stopS2();
+static void makeTransS2(tTestCase3Triggers_t trigger);
+
+static void start() {
+    if (curState != eTestCase3Stopped)
+        return;
+    curState = eTestCase3S1;
+    FwSmTestCase3S1Entry();
+}
+
+static void stop() {
+    switch (curState) {
+        case eTestCase3S2:
+            stopS2();
+            FwSmTestCase3S2Exit();
+            break;
+        default:
+            break;
+    }
+    curState = eTestCase3Stopped;
+}
+
+static void makeTrans(tTestCase3Triggers_t trigger) {
+    switch (curState) {
+        case eTestCase3S1:
+            if (trigger == tTestCase3Execute)
+                FwSmTestCase3S1Do();
+            if (trigger == tTestCase3Go) {
+                if (FwSmTestCase3S1GoToS2Guard() == 1) {
+                    FwSmTestCase3S1GoToS2Action();
+                    curState = eTestCase3S2;
+                    FwSmTestCase3S2Entry();
+                    startS2();
+                    return;
+                }
+            }
+            if (trigger == tTestCase3Execute) {
+                if (FwSmTestCase3CPS1ToS2Guard() == 1) {
+                    curState = eTestCase3S2;
+                    FwSmTestCase3S2Entry();
+                    startS2();
+                } else {
+                    curState = eTestCase3Stopped;
+                }
+                return;
+            }
+            break;
+        case eTestCase3S2:
+            makeTransS2(trigger);
+            if (trigger == tTestCase3Reset) {
+                stopS2();
+                FwSmTestCase3S2Exit();
+                FwSmTestCase3S2ResetToS1Action();
+                curState = eTestCase3S1;
+                FwSmTestCase3S1Entry();
+                return;
+            }
+            break;
+        default:
+            break;
+    }
+}
+
+eTestCase3States_t FwSmTestCase3GetCurState() {
+    return curState;
+}
+
+static void startS2() {
+    if (curStateS2 != eTestCase3Stopped)
+        return;
+    curStateS2 = eTestCase3S21;
+    FwSmTestCase3S21Entry();
+}
+
+static void stopS2() {
+    switch (curStateS2) {
+        default:
+            break;
+    }
+    curStateS2 = eTestCase3Stopped;
+}
+
+static void makeTransS2(tTestCase3Triggers_t trigger) {
+    switch (curStateS2) {
+        case eTestCase3S21:
+            if (trigger == tTestCase3Execute)
+                FwSmTestCase3S21Do();
+            if (trigger == tTestCase3Next) {
+                curStateS2 = eTestCase3S22;
+                return;
+            }
+            break;
+        case eTestCase3S22:
+            if (trigger == tTestCase3Execute)
+                FwSmTestCase3S22Do();
+            if (trigger == tTestCase3Execute) {
+                if (FwSmTestCase3S22ExecuteToS2FinalGuard() == 1) {
+                    curStateS2 = eTestCase3Stopped;
+                    return;
+                }
+            }
+            break;
+        default:
+            break;
+    }
+}
+
+eTestCase3States_t FwSmTestCase3S2GetCurState() {
+    return curStateS2;
+}
+
+void FwSmTestCase3Start() {
+    start();
+}
+
+void FwSmTestCase3Stop() {
+    if (curState == eTestCase3Stopped)
+        return;
+    stop();
+}
+
+void FwSmTestCase3MakeTrans(tTestCase3Triggers_t trigger) {
+    makeTrans(trigger);
+}
+
+void FwSmTestCase3Execute() {
+    makeTrans(tTestCase3Execute);
+}
+
+unsigned int FwSmTestCase3IsStarted() {
+    return curState != eTestCase3Stopped;
+}
+
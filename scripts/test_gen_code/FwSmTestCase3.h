@@ -0,0 +1,68 @@
+/**                                          
+ * The functions declared in this file allow the user to control the operation
+ * of the FW Profile state machine TestCase3. The following operations can be
+ * performed on the state machine: (a) Start, stop and execute the state machine
+ * (b) Send transition commands to the state machine (c) Query the state machine
+ * for its start/stop state and for its current state  
+ *                                           
+ * @note This file was generated on  2026-10-17 02:33:34.087899
+ * @author Automatically generated by FW Profile Code Generator
+ * @copyright P&P Software GmbH
+ */                                          
+#ifndef FWSMTESTCASE3_H_
+#define FWSMTESTCASE3_H_
+
+/** Enumerated type for the state machine states */
+typedef enum {
+    eTestCase3Stopped = 0,
+    eTestCase3S1 = 1,
+    eTestCase3S2 = 2,
+    eTestCase3S21 = 3,
+    eTestCase3S22 = 4,
+} eTestCase3States_t;
+
+/** Enumerated type for the state machine transition triggers */
+typedef enum {
+    tTestCase3Execute = 0,
+    tTestCase3Go = 1,
+    tTestCase3Next = 2,
+    tTestCase3Reset = 3,
+} tTestCase3Triggers_t;
+
+/** Function to start state machine TestCase3 */
+void FwSmTestCase3Start();
+
+/** Function to stop state machine TestCase3 */
+void FwSmTestCase3Stop();
+
+/**
+ * Function to execute state machine TestCase3
+ * (this is equivalent to sending the Execute transition command)
+ */
+void FwSmTestCase3Execute();
+
+/**
+ * Function to send a transition command to state machine TestCase3
+ * @param trigger the transition trigger
+ */
+void FwSmTestCase3MakeTrans(tTestCase3Triggers_t trigger);
+
+/**
+ * Check the current state of state machine TestCase3
+ * @return 0 if the state machine is not started; 1 otherwise
+ */
+unsigned int FwSmTestCase3IsStarted();
+
+/**
+ * Get the current state of the state machine TestCase3
+ * @return the current state (eTestCase3Stopped if the state machine is stopped)
+ */
+eTestCase3States_t FwSmTestCase3GetCurState();
+
+/**
+ * Get the current state of the state machine embedded in state S2
+ * @return the current state (eTestCase3Stopped if the state machine is stopped)
+ */
+eTestCase3States_t FwSmTestCase3S2GetCurState();
+
+#endif /* FWSMTESTCASE3_H_ */
@@ -0,0 +1,91 @@
+/**                                          
+ * The functions in this file implement the actions and guards of the FW Profile
+ * state machine TestCase3. The user is responsible for providing a C body file
+ * which implements all the functions declared in this header file.  
+ *                                           
+ * @note This file was generated on  2026-10-17 02:33:34.086982
+ * @author Automatically generated by FW Profile Code Generator
+ * @copyright P&P Software GmbH
+ */                                          
+#ifndef FWSMTESTCASE3USER_H_
+#define FWSMTESTCASE3USER_H_
+
+/**
+ * Entry action of state S1
+ * Switch on LED
+ * The LED remains on while the sensor is polled
+ */
+void FwSmTestCase3S1Entry();
+
+/**
+ * Do action of state S1
+ * Poll the sensor
+ * The LED remains on while the sensor is polled
+ */
+void FwSmTestCase3S1Do();
+
+/**
+ * Entry action of state S2
+ * Start the timer
+ */
+void FwSmTestCase3S2Entry();
+
+/**
+ * Exit action of state S2
+ * Stop the timer
+ */
+void FwSmTestCase3S2Exit();
+
+/**
+ * Entry action of state S21
+ * Reset counter
+ */
+void FwSmTestCase3S21Entry();
+
+/**
+ * Do action of state S21
+ * Increment counter
+ */
+void FwSmTestCase3S21Do();
+
+/**
+ * Do action of state S22
+ * Check the counter against its limit
+ */
+void FwSmTestCase3S22Do();
+
+/**
+ * Action on the transition from S1 to S2
+ * Action on transition from S1 to S2
+ */
+void FwSmTestCase3S1GoToS2Action();
+
+/**
+ * Guard on the transition from S1 to S2
+ * Flag_1
+ * @return 1 if the guard is true; 0 otherwise
+ */
+int FwSmTestCase3S1GoToS2Guard();
+
+/**
+ * Guard on the transition from CPS1 to S2
+ * Flag_2
+ * @return 1 if the guard is true; 0 otherwise
+ */
+int FwSmTestCase3CPS1ToS2Guard();
+
+/**
+ * Guard on the transition from S22 to S2Final
+ * Counter has reached its limit
+ * @return 1 if the guard is true; 0 otherwise
+ */
+int FwSmTestCase3S22ExecuteToS2FinalGuard();
+
+/**
+ * Action on the transition from S2 to S1
+ * Clear the alarm
+ * The reset command is sent by the operator
+ */
+void FwSmTestCase3S2ResetToS1Action();
+
+#endif /* FWSMTESTCASE3USER_H_ */